@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from backend.metrics import TimedAuthenticationMixin
+
+from .tokens import CLAIM_FIELDS, VERSION_CLAIM, has_claims, token_state
+
+
+def user_from_claims(token, user_id):
+    """
+    A User as if loaded with .only(id, claim fields, token_version): usable
+    as a foreign key or filter value without a query. Other fields are
+    deferred, so e.g. `user.email` loads them on first access, and save()
+    writes only the loaded fields.
+    """
+    User = get_user_model()
+    loaded = {"id": user_id, "token_version": token[VERSION_CLAIM], **{f: token[f] for f in CLAIM_FIELDS}}
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in loaded]
+    return User.from_db(router.db_for_read(User), names, [loaded[name] for name in names])
+
+
+class ClaimsJWTAuthentication(TimedAuthenticationMixin, JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the token's claims
+    instead of a user query, once the token's version is confirmed current
+    (see tokens.py). Tokens without the claims fall back to the database.
+    """
+
+    def get_user(self, validated_token):
+        if not has_claims(validated_token):
+            return super().get_user(validated_token)
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        state = token_state(user_id)
+        if state is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not state.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if validated_token[VERSION_CLAIM] != state.version:
+            raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+        return user_from_claims(validated_token, user_id)
@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.base_user import BaseUserManager
 from django.conf import settings
 
+from .tokens import CLAIM_FIELDS
+
 # --- NEW: email-based manager ---
 class EmailUserManager(BaseUserManager):
     use_in_migrations = True
@@ -44,6 +48,12 @@ class User(AbstractUser):
         (ADMIN, "Admin"),
     ]
     role = models.CharField(max_length=32, choices=ROLE_CHOICES, default=CUSTOMER)
+    # Stamped into issued JWTs; bumping it revokes every token issued before (see tokens.py)
+    token_version = models.PositiveIntegerField(default=0)
+
+    # Changing any of these through save() revokes the user's tokens, since
+    # the claims-based authentication trusts the copies in the token.
+    TOKEN_CLAIM_FIELDS = (*CLAIM_FIELDS, "password")
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []  # no username required
@@ -53,6 +63,24 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_claims = {f: instance.__dict__[f] for f in cls.TOKEN_CLAIM_FIELDS if f in instance.__dict__}
+        return instance
+
+    def save(self, *args, **kwargs):
+        saved = getattr(self, "_saved_claims", {})
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            saved = {f: value for f, value in saved.items() if f in update_fields}
+        if any(self.__dict__.get(f, value) != value for f, value in saved.items()):
+            self.token_version += 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "token_version"}
+        super().save(*args, **kwargs)
+        self._saved_claims = {f: self.__dict__[f] for f in self.TOKEN_CLAIM_FIELDS if f in self.__dict__}
+
 class UserProfile(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -73,3 +101,11 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return f"Profile({self.user})"
+
+
+    # ---- Signals to drop cached token state (apps/accounts/tokens.py) ----
+
+@receiver(post_save, sender=User)
+def forget_token_state(sender, instance, **kwargs):
+    from .tokens import forget  # tokens loads users through this module
+    transaction.on_commit(lambda: forget(instance.pk))
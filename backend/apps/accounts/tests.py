@@ -1,3 +1,151 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.throttling import Bucket, InProcessBuckets, SQLiteBuckets, reset_throttles
+
+from . import tokens
+from .models import User
+
+
+@override_settings(SLOW_REQUEST_MS=None)  # logins hash a password, near the threshold
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        tokens.clear()
+        reset_throttles()
+        self.user = User.objects.create_user(email="diner@example.com", password="secret123")
+        self.client = APIClient()
+
+    def login(self):
+        self.client.credentials()
+        res = self.client.post("/api/accounts/login/", {"email": "diner@example.com", "password": "secret123"},
+                               format="json")
+        self.assertEqual(res.status_code, 200)
+        return res.data["access"]
+
+    def get_orders(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return self.client.get("/api/orders/")
+
+    def user_queries(self, ctx):
+        return [q["sql"] for q in ctx.captured_queries if '"accounts_user"' in q["sql"]]
+
+    def test_login_token_carries_claims(self):
+        token = AccessToken(self.login())
+        self.assertEqual(token["role"], User.CUSTOMER)
+        self.assertIs(token["is_active"], True)
+        self.assertEqual(token["ver"], 0)
+
+    def test_authenticates_without_loading_the_user(self):
+        access = self.login()
+        self.assertEqual(self.get_orders(access).status_code, 200)  # fills the token state cache
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.get_orders(access)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.user_queries(ctx), [])
+
+    def assert_revoked_by(self, change):
+        access = self.login()
+        self.assertEqual(self.get_orders(access).status_code, 200)
+
+        change(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_orders(access).status_code, 401)
+
+    def test_role_change_revokes_tokens(self):
+        self.assert_revoked_by(lambda user: setattr(user, "role", User.STAFF))
+
+    def test_deactivation_revokes_tokens(self):
+        self.assert_revoked_by(lambda user: setattr(user, "is_active", False))
+
+    def test_password_change_revokes_tokens(self):
+        self.assert_revoked_by(lambda user: user.set_password("another123"))
+
+    def test_unrelated_save_keeps_tokens(self):
+        access = self.login()
+        self.user.first_name = "Ada"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_orders(access).status_code, 200)
+
+    def test_token_without_claims_uses_database(self):
+        access = AccessToken.for_user(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.get_orders(access)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(self.user_queries(ctx)), 1)
+
+
+@override_settings(SLOW_REQUEST_MS=None)  # logins hash a password, near the threshold
+class ThrottleTests(TestCase):
+    def setUp(self):
+        reset_throttles()
+        User.objects.create_user(email="diner@example.com", password="secret123")
+        self.client = APIClient()
+
+    def login(self, password="secret123", ip="10.0.0.1", **headers):
+        return self.client.post("/api/accounts/login/", {"email": "diner@example.com", "password": password},
+                                format="json", REMOTE_ADDR=ip, **headers)
+
+    @override_settings(THROTTLE_RATES={"login": {"ip": "2/min"}})
+    def test_login_is_limited_per_ip_before_checking_the_password(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(password="wrong").status_code, 400)
+
+        with patch("django.contrib.auth.base_user.check_password") as check, \
+                CaptureQueriesContext(connection) as ctx:
+            res = self.login()
+        self.assertEqual(res.status_code, 429)
+        self.assertIn(res["Retry-After"], ("29", "30"))  # 2 per minute refill every 30s
+        check.assert_not_called()
+        self.assertEqual(ctx.captured_queries, [])
+
+        self.assertEqual(self.login(ip="10.0.0.2").status_code, 200)
+
+    @override_settings(THROTTLE_RATES={"login": {"ip": "2/min"}})
+    def test_client_supplied_forwarded_for_does_not_pick_the_bucket(self):
+        for spoofed in ("1.1.1.1", "2.2.2.2"):
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR=spoofed).status_code, 200)
+        self.assertEqual(self.login(HTTP_X_FORWARDED_FOR="3.3.3.3").status_code, 429)
+
+        # Behind one proxy only the address it appended counts.
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR="10.0.0.1, 10.0.0.9").status_code, 200)
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR="10.0.0.1, 10.0.0.9").status_code, 200)
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR="10.0.0.2, 10.0.0.9").status_code, 429)
+
+    @override_settings(THROTTLE_RATES={"login": {"ip": "5/min", "endpoint": "1/min"}})
+    def test_endpoint_bucket_is_shared(self):
+        self.assertEqual(self.login(ip="10.0.0.1").status_code, 200)
+        self.assertEqual(self.login(ip="10.0.0.2").status_code, 429)
+
+    def test_buckets_refill_and_take_all_or_nothing(self):
+        backend = InProcessBuckets()
+        user = Bucket("place:user:1", 2, 1.0)
+        endpoint = Bucket("place:endpoint:*", 1, 0.5)
+
+        self.assertEqual(backend.consume([user, endpoint], now=100.0), 0.0)
+        self.assertEqual(backend.consume([user, endpoint], now=100.0), 2.0)  # endpoint empty
+        self.assertEqual(backend.consume([user], now=100.0), 0.0)  # the rejection took nothing
+        self.assertEqual(backend.consume([user], now=100.0), 1.0)
+        self.assertEqual(backend.consume([user, endpoint], now=102.0), 0.0)
+
+    def test_sqlite_buckets_are_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "throttle.sqlite3"
+            first, second = SQLiteBuckets(path), SQLiteBuckets(path)  # e.g. two workers
+            bucket = Bucket("login:ip:10.0.0.1", 2, 1 / 60)
+
+            self.assertEqual(first.consume([bucket], now=100.0), 0.0)
+            self.assertEqual(second.consume([bucket], now=100.0), 0.0)
+            self.assertAlmostEqual(first.consume([bucket], now=100.0), 60.0)
+            self.assertEqual(second.consume([bucket], now=160.0), 0.0)
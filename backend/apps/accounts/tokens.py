@@ -0,0 +1,87 @@
+"""
+JWTs that carry enough claims to authenticate without loading the user.
+
+Tokens issued by issue_tokens() carry role, is_active, is_staff,
+is_superuser and the user's token_version ("ver"). ClaimsJWTAuthentication
+(authentication.py) builds the request user from those claims and only
+checks that the token is still current: the user's (token_version,
+is_active) comes from a small in-process TTL cache, so most requests need
+no query at all.
+
+Revocation: User.save() bumps token_version whenever a claim field or the
+password changes, which rejects every older token. This process forgets its
+cached state at once (post_save); other processes notice within
+JWT_CLAIMS_CACHE_TTL seconds. Bulk updates bypass save(), so they must bump
+token_version themselves, e.g. `.update(is_active=False,
+token_version=F("token_version") + 1)`.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import RefreshToken
+
+CLAIM_FIELDS = ("role", "is_active", "is_staff", "is_superuser")
+VERSION_CLAIM = "ver"
+
+
+class TokenState(NamedTuple):
+    version: int
+    is_active: bool
+
+
+_lock = threading.Lock()
+_states = OrderedDict()  # user id -> (expires at, TokenState or None)
+
+
+def _ttl():
+    return getattr(settings, "JWT_CLAIMS_CACHE_TTL", 30)
+
+
+def _max_users():
+    return getattr(settings, "JWT_CLAIMS_CACHE_SIZE", 10_000)
+
+
+def issue_tokens(user):
+    """Refresh token for `user` with the fast-path claims; its .access_token inherits them."""
+    refresh = RefreshToken.for_user(user)
+    for field in CLAIM_FIELDS:
+        refresh[field] = getattr(user, field)
+    refresh[VERSION_CLAIM] = user.token_version
+    return refresh
+
+
+def has_claims(token):
+    return VERSION_CLAIM in token and all(field in token for field in CLAIM_FIELDS)
+
+
+def token_state(user_id):
+    """Current TokenState of a user, or None if the user does not exist. Cached for JWT_CLAIMS_CACHE_TTL."""
+    now = time.monotonic()
+    with _lock:
+        cached = _states.get(user_id)
+        if cached is not None and cached[0] > now:
+            _states.move_to_end(user_id)
+            return cached[1]
+
+    row = get_user_model().objects.filter(pk=user_id).values_list("token_version", "is_active").first()
+    state = TokenState(*row) if row else None
+    with _lock:
+        _states[user_id] = (now + _ttl(), state)
+        _states.move_to_end(user_id)
+        while len(_states) > _max_users():
+            _states.popitem(last=False)
+    return state
+
+
+def forget(user_id):
+    with _lock:
+        _states.pop(user_id, None)
+
+
+def clear():
+    with _lock:
+        _states.clear()
@@ -1,22 +1,26 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.throttling import TokenBucketThrottle
 
 from .models import User
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from .tokens import issue_tokens
 
 # --- Registration API ---
 class RegisterAPIView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "register"
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        refresh = RefreshToken.for_user(user)
+        refresh = issue_tokens(user)
         return Response({
             'user': UserSerializer(user).data,
             'access': str(refresh.access_token),
@@ -28,13 +32,16 @@ class RegisterAPIView(generics.CreateAPIView):
 class LoginAPIView(generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = [AllowAny]
+    # Throttled before the password hash check runs
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "login"
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = issue_tokens(user)
 
         return Response({
             'user': UserSerializer(user).data,
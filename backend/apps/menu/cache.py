@@ -0,0 +1,214 @@
+"""
+Read-through cache for the public restaurant/menu endpoints.
+
+Views with validators (below) key their cached responses on the ETag, which
+is derived from Restaurant.updated_at: a restaurant or menu change moves it,
+so stale entries are never read again and simply age out of the backend,
+whichever worker made the change. Views without validators fall back to a
+version counter per scope (one per restaurant, plus one for the global
+listing) that edits bump. Those counters live in the cache itself, so they
+are only shared by all workers when MENU_CACHE_ALIAS is a shared backend
+(MENU_CACHE_BACKEND=file); with local memory another worker's bump is never
+seen here.
+
+The HTTP validators (ETag/Last-Modified) are not cached: a view describes
+its data with one cheap query on every GET (Restaurant.updated_at moves
+with every restaurant and menu change), and conditional GETs are answered
+with 304 before any serialization happens. Versions only live in this
+process when the backend is local memory, so a validator cached under one
+could confirm data another worker has already changed.
+
+Stored responses outlive the request and validators vouch for them, so
+both are always read from the primary database (backend/db_router.py): a
+replica that lags behind a write would otherwise get its old rows cached
+under the version the write just bumped. Responses that are not stored may
+be read from a replica; those go out without validators.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from backend.db_router import primary_reads, reads_replica
+
+LIST_SCOPE = "list"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_cache():
+    return caches[getattr(settings, "MENU_CACHE_ALIAS", "menu")]
+
+
+def is_process_local():
+    """True when the menu cache lives in this process only, so other workers never see its version bumps."""
+    return isinstance(get_cache(), LocMemCache)
+
+
+def restaurant_scope(restaurant_id):
+    return f"restaurant:{restaurant_id}"
+
+
+def _version_key(scope):
+    return f"menu:ver:{scope}"
+
+
+def get_version(scope):
+    cache = get_cache()
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter can never restart at a
+        # value that still has old entries stored under it.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope):
+    cache = get_cache()
+    key = _version_key(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def invalidate_restaurant(restaurant_id):
+    """Bump the restaurant's version and the listing version once the current transaction commits."""
+    def bump():
+        bump_version(restaurant_scope(restaurant_id))
+        bump_version(LIST_SCOPE)
+    transaction.on_commit(bump)
+
+
+def invalidate_restaurants(restaurant_ids):
+    """Like invalidate_restaurant for many at once, bumping the listing version only once."""
+    restaurant_ids = list(restaurant_ids)
+
+    def bump():
+        for restaurant_id in restaurant_ids:
+            bump_version(restaurant_scope(restaurant_id))
+        bump_version(LIST_SCOPE)
+    if restaurant_ids:
+        transaction.on_commit(bump)
+
+
+def _record(hit):
+    with _stats_lock:
+        _stats["hits" if hit else "misses"] += 1
+
+
+def stats():
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "backend": get_cache().__class__.__name__,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats["hits"] = _stats["misses"] = 0
+
+
+def response_key(scope, request, etag=None):
+    if etag is not None:
+        # Already covers the path and the rows' state.
+        digest = etag.strip('"')
+        return f"menu:resp:{scope}:etag:{digest}"
+    path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f"menu:resp:{scope}:{get_version(scope)}:{path}"
+
+
+class CachedResponseMixin:
+    """
+    Serve anonymous GETs from the menu cache, and answer conditional GETs.
+
+    Views declare which scope their payload depends on via `get_cache_scope`;
+    list/retrieve then cache `response.data` under that scope's current version.
+    Views that implement `get_validator_source` also emit ETag/Last-Modified
+    and return 304 for matching If-None-Match/If-Modified-Since.
+    """
+    cache_timeout = DEFAULT_TIMEOUT
+
+    def get_cache_scope(self):
+        raise NotImplementedError
+
+    def get_validator_source(self):
+        """(last_modified, token) for the rows behind this view, or None for no validators."""
+        return None
+
+    def should_cache(self, request):
+        return request.method == "GET" and not request.user.is_authenticated
+
+    def get_validators(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        with primary_reads():
+            source = self.get_validator_source()
+        if source is None:
+            return None
+        last_modified, token = source
+        # Different paths (page, ?fields=) and formats are different representations.
+        fmt = getattr(request.accepted_renderer, "format", "")
+        digest = hashlib.sha1(f"{token}|{request.get_full_path()}|{fmt}".encode()).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return quote_etag(digest), timestamp
+
+    def cached(self, request, build):
+        validators = self.get_validators(request)
+        if validators is None:
+            return self._cached(request, build)
+
+        etag, last_modified = validators
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if response is None:
+            if not self.should_cache(request) and reads_replica():
+                # The body may be older than the validators computed on the primary.
+                return build()
+            response = self._cached(request, build, etag)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def _cached(self, request, build, etag=None):
+        if not self.should_cache(request):
+            return build()
+
+        cache = get_cache()
+        key = response_key(self.get_cache_scope(), request, etag)
+        data = cache.get(key)
+        if data is not None:
+            _record(hit=True)
+            return Response(data)
+
+        _record(hit=False)
+        with primary_reads():
+            response = build()
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=self.cache_timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
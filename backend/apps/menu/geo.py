@@ -0,0 +1,92 @@
+"""
+Grid-bucketed spatial index for "nearest restaurants" queries.
+
+The globe is cut into CELL_DEG x CELL_DEG cells numbered row-major
+(row * COLS + col), and every Restaurant with coordinates stores its cell in
+the indexed `geo_cell` column. A radius query turns its bounding box into one
+contiguous `geo_cell` range per grid row, so the database only reads the
+restaurants in nearby cells; exact haversine distances are then computed for
+those candidates alone.
+"""
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180  # ~111.2 km
+
+CELL_DEG = 0.1  # ~11 km north-south; changing it requires recomputing geo_cell
+ROWS = int(180 / CELL_DEG)
+COLS = int(360 / CELL_DEG)
+
+
+def _row(lat):
+    return min(max(int((lat + 90) // CELL_DEG), 0), ROWS - 1)
+
+
+def _col(lon):
+    return int(((lon + 180) % 360) // CELL_DEG) % COLS
+
+
+def cell_for(lat, lon):
+    if lat is None or lon is None:
+        return None
+    return _row(float(lat)) * COLS + _col(float(lon))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cell_ranges(lat, lon, radius_km):
+    """Inclusive (low, high) geo_cell ranges covering the circle's bounding box."""
+    lat_delta = radius_km / KM_PER_DEG_LAT
+    row_lo, row_hi = _row(lat - lat_delta), _row(lat + lat_delta)
+
+    # Longitude degrees shrink towards the poles; widen by the worst row.
+    max_lat = min(abs(lat) + lat_delta, 89.9)
+    lon_delta = radius_km / (KM_PER_DEG_LAT * math.cos(math.radians(max_lat)))
+    if lon_delta >= 180:
+        col_spans = [(0, COLS - 1)]
+    else:
+        col_lo, col_hi = _col(lon - lon_delta), _col(lon + lon_delta)
+        if col_lo <= col_hi:
+            col_spans = [(col_lo, col_hi)]
+        else:  # wraps across the antimeridian
+            col_spans = [(col_lo, COLS - 1), (0, col_hi)]
+
+    return [
+        (row * COLS + lo, row * COLS + hi)
+        for row in range(row_lo, row_hi + 1)
+        for lo, hi in col_spans
+    ]
+
+
+def nearest(queryset, lat, lon, radius_km, limit):
+    """
+    The `limit` closest restaurants in `queryset` within `radius_km`, each with
+    a `distance_km` attribute, closest first.
+    """
+    cells = Q()
+    for low, high in cell_ranges(lat, lon, radius_km):
+        cells |= Q(geo_cell__range=(low, high))
+
+    candidates = queryset.filter(cells).values_list("id", "latitude", "longitude")
+    distances = []
+    for pk, r_lat, r_lon in candidates:
+        d = haversine_km(lat, lon, float(r_lat), float(r_lon))
+        if d <= radius_km:
+            distances.append((d, pk))
+    distances.sort()
+    distances = distances[:limit]
+
+    by_id = queryset.in_bulk([pk for _, pk in distances])
+    results = []
+    for d, pk in distances:
+        restaurant = by_id[pk]
+        restaurant.distance_km = round(d, 3)
+        results.append(restaurant)
+    return results
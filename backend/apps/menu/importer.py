@@ -0,0 +1,277 @@
+"""
+Streaming bulk import of restaurants and menu items (`manage.py import_menu`).
+
+Input is CSV or JSONL. Each record is one menu item plus the restaurant it
+belongs to, in flat columns:
+
+    restaurant          required; the restaurant's external_id
+    restaurant_name, cuisine_type, phone, email, address,
+    latitude, longitude, restaurant_image
+                        restaurant columns; restaurant_name is required the
+                        first time a restaurant is seen
+    name, price         required for a menu item (a record without `name`
+                        only upserts its restaurant)
+    description, category, is_available, image
+                        optional menu item columns
+
+Records are read lazily and written in batches: restaurants are upserted on
+external_id and menu items on uniq_menuitem_name_per_restaurant, each with
+one bulk_create(update_conflicts=True) per batch. Only the columns a record
+actually carries are updated on a conflict, so a price-only file does not
+blank out descriptions. Memory stays flat apart from the restaurant
+external_id -> pk map.
+
+bulk_create skips the post_save signals in models.py, so their side effects
+are done here instead: the search index is upserted per batch, and the menu
+cache versions and Restaurant.updated_at (the menus' Last-Modified) are
+bumped once per touched restaurant at the end of the import. The version
+bumps only reach the web workers through a shared menu cache
+(MENU_CACHE_BACKEND=file), so the command refuses to run against a
+process-local one unless told that nothing else is serving; checkout prices
+(price_index.py) follow Restaurant.updated_at and are correct either way.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import search
+from .cache import invalidate_restaurants
+from .models import MenuItem, Restaurant
+
+# Import column -> Restaurant field
+RESTAURANT_COLUMNS = {
+    "restaurant_name": "name",
+    "cuisine_type": "cuisine_type",
+    "phone": "phone",
+    "email": "email",
+    "address": "address",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "restaurant_image": "image",
+}
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_records(stream, fmt):
+    """Yield (line number, dict) from a CSV or JSONL text stream, one record at a time."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    raise ImportRowError(f"line {line_no}: invalid JSON ({exc})")
+                yield line_no, record
+    else:
+        raise ValueError(f"Unknown format {fmt!r}; use csv or jsonl.")
+
+
+def _present(record, column):
+    value = record.get(column)
+    return value is not None and value != ""
+
+
+def _text(value):
+    return str(value).strip()
+
+
+def _decimal(value, column):
+    try:
+        return Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ImportRowError(f"{column}: {value!r} is not a number")
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_restaurant(record):
+    """(external_id, {field: value}) for the restaurant columns the record carries."""
+    ref = _text(record.get("restaurant") or "")
+    if not ref:
+        raise ImportRowError("restaurant: missing")
+    fields = {}
+    for column, field in RESTAURANT_COLUMNS.items():
+        if _present(record, column):
+            value = record[column]
+            fields[field] = _decimal(value, column) if field in ("latitude", "longitude") else _text(value)
+    if ("latitude" in fields) != ("longitude" in fields):
+        raise ImportRowError("latitude/longitude: give both or neither")
+    return ref, fields
+
+
+def parse_item(record):
+    """{field: value} for the menu item columns the record carries, or None for a restaurant-only row."""
+    if not _present(record, "name"):
+        return None
+    if not _present(record, "price"):
+        raise ImportRowError("price: missing")
+    fields = {"name": _text(record["name"]), "price": _decimal(record["price"], "price")}
+    for column in ("description", "category", "image"):
+        if _present(record, column):
+            fields[column] = _text(record[column])
+    if _present(record, "is_available"):
+        fields["is_available"] = _bool(record["is_available"])
+    return fields
+
+
+def _upsert(model, objs, unique_fields, update_fields):
+    """bulk_create(update_conflicts=True); MySQL infers the conflict target itself."""
+    kwargs = {"update_conflicts": True, "update_fields": sorted(update_fields)}
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = unique_fields
+    model.objects.bulk_create(objs, **kwargs)
+
+
+def _grouped(rows):
+    """Group (key, fields) rows by the set of fields they carry: one upsert statement per group."""
+    groups = {}
+    for key, fields in rows:
+        groups.setdefault(frozenset(fields), []).append((key, fields))
+    return groups.values()
+
+
+class MenuImporter:
+    """
+    Feed records with add(); call finish() at the end. Counts are kept in
+    `stats`, row-level problems in `errors` (line, message).
+    """
+
+    def __init__(self, owner, batch_size=2000, max_errors=100):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.restaurant_ids = {}  # external_id -> pk
+        self.touched = set()  # restaurant pks whose menu changed
+        self.restaurants = {}  # pending external_id -> fields
+        self.items = {}  # pending (external_id, name) -> fields
+        self.errors = []
+        self.stats = {"records": 0, "restaurants": 0, "items": 0, "skipped": 0, "batches": 0}
+        self.started = time.perf_counter()
+
+    def add(self, line_no, record):
+        self.stats["records"] += 1
+        try:
+            ref, restaurant = parse_restaurant(record)
+            item = parse_item(record)
+        except ImportRowError as exc:
+            self.stats["skipped"] += 1
+            if len(self.errors) < self.max_errors:
+                self.errors.append((line_no, str(exc)))
+            return
+        if ref not in self.restaurant_ids:
+            # Restaurants already written in this import are not updated again;
+            # the columns are usually repeated on every row of their menu.
+            pending = self.restaurants.setdefault(ref, {})
+            for field, value in restaurant.items():
+                pending.setdefault(field, value)
+        if item is not None:
+            self.items[(ref, item["name"])] = item  # last row for an item wins
+        if len(self.items) >= self.batch_size or len(self.restaurants) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.restaurants and not self.items:
+            return
+        with transaction.atomic():
+            self._flush_restaurants()
+            self._flush_items()
+        self.stats["batches"] += 1
+        self.restaurants, self.items = {}, {}
+
+    def _flush_restaurants(self):
+        refs = set(self.restaurants) | {ref for ref, _ in self.items}
+        unknown = refs - self.restaurant_ids.keys()
+        if unknown:
+            self.restaurant_ids.update(
+                Restaurant.objects.filter(external_id__in=unknown).values_list("external_id", "id")
+            )
+
+        rows = []
+        for ref, fields in self.restaurants.items():
+            if ref not in self.restaurant_ids and "name" not in fields:
+                self._drop_restaurant(ref, "restaurant_name: required for a new restaurant")
+            elif fields:
+                rows.append((ref, fields))
+        for group in _grouped(rows):
+            objs = []
+            for ref, fields in group:
+                obj = Restaurant(owner_user=self.owner, external_id=ref, **fields)
+                obj.assign_geo_cell()  # bulk_create skips save()
+                objs.append(obj)
+            update_fields = {*group[0][1], "updated_at"}
+            if "latitude" in update_fields:
+                update_fields.add("geo_cell")
+            _upsert(Restaurant, objs, ["external_id"], update_fields)
+            self.stats["restaurants"] += len(objs)
+
+        if rows:
+            restaurants = list(Restaurant.objects.filter(external_id__in=[ref for ref, _ in rows]))
+            self.restaurant_ids.update((r.external_id, r.pk) for r in restaurants)
+            self.touched.update(r.pk for r in restaurants)
+            search.index_many(restaurants=restaurants)
+
+    def _drop_restaurant(self, ref, message):
+        dropped = [key for key in self.items if key[0] == ref]
+        for key in dropped:
+            del self.items[key]
+        self.stats["skipped"] += max(1, len(dropped))
+        if len(self.errors) < self.max_errors:
+            self.errors.append((None, f"restaurant {ref!r}: {message}"))
+
+    def _flush_items(self):
+        rows = [((self.restaurant_ids[ref], name), fields) for (ref, name), fields in self.items.items()
+                if ref in self.restaurant_ids]
+        saved = []
+        for group in _grouped(rows):
+            objs = [MenuItem(restaurant_id=restaurant_id, **fields) for (restaurant_id, _), fields in group]
+            update_fields = (set(group[0][1]) - {"name"}) | {"updated_at"}
+            _upsert(MenuItem, objs, ["restaurant", "name"], update_fields)
+            self.stats["items"] += len(objs)
+            saved += objs
+
+        if saved and search.uses_fts5():
+            if any(item.pk is None for item in saved):
+                # Backends that don't return pks from an upsert: reload the batch.
+                wanted = {(item.restaurant_id, item.name) for item in saved}
+                saved = [
+                    item for item in MenuItem.objects.filter(
+                        restaurant_id__in={r for r, _ in wanted}, name__in={n for _, n in wanted})
+                    if (item.restaurant_id, item.name) in wanted
+                ]
+            search.index_many(menu_items=saved)
+        self.touched.update(restaurant_id for (restaurant_id, _), _ in rows)
+
+    def finish(self):
+        """Write the last batch, then run the side effects deferred for the whole import."""
+        try:
+            self.flush()
+        finally:
+            self.invalidate()
+        return self.stats
+
+    def invalidate(self):
+        touched, self.touched = sorted(self.touched), set()
+        now = timezone.now()
+        for start in range(0, len(touched), 500):
+            Restaurant.objects.filter(pk__in=touched[start:start + 500]).update(updated_at=now)
+        invalidate_restaurants(touched)
+
+    @property
+    def rate(self):
+        return self.stats["records"] / max(time.perf_counter() - self.started, 1e-9)
@@ -0,0 +1,107 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.accounts.models import User
+from apps.menu.geo import cell_for, haversine_km, nearest
+from apps.menu.models import Restaurant
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed N synthetic restaurants inside a transaction, time nearest-restaurant "
+        "queries against the geo_cell index and a full-scan baseline, then roll back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--radius-km", type=float, default=5.0)
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+        # Roughly a metro area, so radius queries return realistic candidate counts.
+        parser.add_argument("--center", type=float, nargs=2, default=(45.5017, -73.5673),
+                            metavar=("LAT", "LON"))
+        parser.add_argument("--spread-deg", type=float, default=1.0)
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self.run(**opts)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Rolled back synthetic data.")
+
+    def seed(self, rng, count, center, spread):
+        owner = User.objects.create_user(email=f"geo-bench-{rng.random()}@example.com")
+        lat0, lon0 = center
+        batch = []
+        for i in range(count):
+            r = Restaurant(
+                owner_user=owner,
+                name=f"Bench {i}",
+                latitude=round(lat0 + rng.uniform(-spread, spread), 6),
+                longitude=round(lon0 + rng.uniform(-spread, spread), 6),
+            )
+            r.geo_cell = cell_for(r.latitude, r.longitude)  # bulk_create skips save()
+            batch.append(r)
+            if len(batch) == 5000:
+                Restaurant.objects.bulk_create(batch)
+                batch = []
+        Restaurant.objects.bulk_create(batch)
+
+    def run(self, restaurants, queries, radius_km, limit, seed, center, spread_deg, **_):
+        rng = random.Random(seed)
+        started = time.perf_counter()
+        self.seed(rng, restaurants, center, spread_deg)
+        self.stdout.write(f"Seeded {restaurants} restaurants in {time.perf_counter() - started:.1f}s")
+
+        points = [
+            (center[0] + rng.uniform(-spread_deg, spread_deg),
+             center[1] + rng.uniform(-spread_deg, spread_deg))
+            for _ in range(queries)
+        ]
+        queryset = Restaurant.objects.active()
+
+        indexed, found = [], []
+        for lat, lon in points:
+            t0 = time.perf_counter()
+            found.append(len(nearest(queryset, lat, lon, radius_km, limit)))
+            indexed.append((time.perf_counter() - t0) * 1000)
+
+        # Baseline: what clients effectively do today, distance over every row.
+        baseline = []
+        for lat, lon in points[: max(1, queries // 10)]:
+            t0 = time.perf_counter()
+            rows = queryset.exclude(latitude=None).values_list("id", "latitude", "longitude")
+            scored = sorted(
+                (haversine_km(lat, lon, float(a), float(b)), pk) for pk, a, b in rows
+            )
+            _ = [pk for d, pk in scored if d <= radius_km][:limit]
+            baseline.append((time.perf_counter() - t0) * 1000)
+
+        with CaptureQueriesContext(connection) as ctx:
+            nearest(queryset, *points[0], radius_km, limit)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"geo_cell index: p50 {self._pct(indexed, 50):.2f} ms, p95 {self._pct(indexed, 95):.2f} ms, "
+            f"p99 {self._pct(indexed, 99):.2f} ms over {queries} queries "
+            f"({len(ctx.captured_queries)} SQL queries each, avg {statistics.mean(found):.1f} results)"
+        ))
+        self.stdout.write(
+            f"full scan:      p50 {self._pct(baseline, 50):.2f} ms, p95 {self._pct(baseline, 95):.2f} ms "
+            f"over {len(baseline)} queries"
+        )
+
+    @staticmethod
+    def _pct(samples, pct):
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
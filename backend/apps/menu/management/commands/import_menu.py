@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import User
+from apps.menu.cache import is_process_local
+from apps.menu.importer import ImportRowError, MenuImporter, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream restaurants and menu items from a CSV or JSONL file (or - for stdin) "
+        "and upsert them in batches. See apps/menu/importer.py for the columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument("--format", choices=("csv", "jsonl"), default=None,
+                            help="Defaults to the file extension.")
+        parser.add_argument("--owner", required=True, metavar="EMAIL",
+                            help="Owner of restaurants created by the import.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--progress-every", type=int, default=100_000, metavar="RECORDS")
+        parser.add_argument("--local-cache-ok", action="store_true",
+                            help="Run even though the menu cache is process-local (no other worker serving).")
+
+    def handle(self, *args, path, format, owner, batch_size, progress_every, local_cache_ok, **options):
+        if is_process_local() and not local_cache_ok:
+            raise CommandError(
+                "The menu cache is process-local, so web workers would keep serving the menus cached "
+                "before this import for up to MENU_CACHE_TIMEOUT. Set MENU_CACHE_BACKEND=file (shared by "
+                "every worker), or pass --local-cache-ok if no other process serves the API."
+            )
+        fmt = format or Path(path).suffix.lstrip(".").lower()
+        if fmt not in ("csv", "jsonl"):
+            raise CommandError("Cannot tell the format from the file name; pass --format csv|jsonl.")
+        try:
+            owner_user = User.objects.get(email__iexact=owner)
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {owner!r}.")
+
+        importer = MenuImporter(owner_user, batch_size=batch_size)
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            for line_no, record in read_records(stream, fmt):
+                importer.add(line_no, record)
+                if progress_every and importer.stats["records"] % progress_every == 0:
+                    self.stdout.write(f"{importer.stats['records']} records ({importer.rate:.0f}/s)")
+        except ImportRowError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            stats = importer.finish()
+
+        for line_no, message in importer.errors:
+            self.stderr.write(f"line {line_no}: {message}" if line_no else message)
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['records']} records in {stats['batches']} batches ({importer.rate:.0f} records/s): "
+            f"{stats['restaurants']} restaurants and {stats['items']} menu items upserted, "
+            f"{stats['skipped']} skipped."
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.menu import search
+
+
+class Command(BaseCommand):
+    help = "Repopulate the restaurant/menu full-text index from the base tables (SQLite FTS5)."
+
+    def handle(self, *args, **options):
+        if not search.uses_fts5():
+            self.stdout.write("FULLTEXT indexes are maintained by the database; nothing to rebuild.")
+            return
+        with transaction.atomic():
+            search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
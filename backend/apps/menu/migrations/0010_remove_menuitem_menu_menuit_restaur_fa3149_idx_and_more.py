@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0009_alter_menuitem_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='menuitem',
+            name='menu_menuit_restaur_fa3149_idx',
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['restaurant', 'is_available', 'id'], name='menu_menuit_restaur_134984_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['is_active', 'id'], name='menu_restau_is_acti_d6538b_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS menu_search USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, restaurant_id UNINDEXED, "
+            "category UNINDEXED, title, body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO menu_search (rowid, kind, object_id, restaurant_id, category, title, body) "
+            "SELECT id * 2, 'restaurant', id, id, lower(cuisine_type), name, "
+            "cuisine_type || ' ' || address FROM menu_restaurant"
+        )
+        schema_editor.execute(
+            "INSERT INTO menu_search (rowid, kind, object_id, restaurant_id, category, title, body) "
+            "SELECT id * 2 + 1, 'item', id, restaurant_id, lower(category), name, "
+            "description || ' ' || category FROM menu_menuitem"
+        )
+    elif vendor == "mysql":
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX menu_restaurant_search_ft "
+            "ON menu_restaurant (name, cuisine_type, address)"
+        )
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX menu_menuitem_search_ft "
+            "ON menu_menuitem (name, description, category)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS menu_search")
+    elif vendor == "mysql":
+        schema_editor.execute("DROP INDEX menu_restaurant_search_ft ON menu_restaurant")
+        schema_editor.execute("DROP INDEX menu_menuitem_search_ft ON menu_menuitem")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0010_remove_menuitem_menu_menuit_restaur_fa3149_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
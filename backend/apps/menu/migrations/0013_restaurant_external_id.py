@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0012_restaurant_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
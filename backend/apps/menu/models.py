@@ -1,10 +1,23 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .cache import invalidate_restaurant
+from . import search
+from .geo import cell_for
 
 class RestaurantQuerySet(models.QuerySet):
     def active(self):
         return self.filter(is_active=True)
 
+    def with_menu(self):
+        # One extra query for every menu item of every restaurant in the page,
+        # instead of one per restaurant when the serializer builds `menu`.
+        return self.prefetch_related(
+            models.Prefetch("menu_items", queryset=MenuItem.objects.order_by("id"))
+        )
+
 class MenuItemQuerySet(models.QuerySet):
     def available(self):
         return self.filter(is_available=True)
@@ -30,14 +43,40 @@ class Restaurant(models.Model):
     deliveryFee = models.CharField(max_length=50, blank=True)
     offer = models.CharField(max_length=255, blank=True)
 
+    # Location; geo_cell is derived in save() (see apps/menu/geo.py)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    geo_cell = models.PositiveIntegerField(blank=True, null=True, editable=False)
+
+    # Caller-supplied key for bulk imports (`manage.py import_menu`)
+    external_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     objects = RestaurantQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # public listing keyset: WHERE is_active ORDER BY id
+            models.Index(fields=["is_active", "id"]),
+            # nearby search: WHERE is_active AND geo_cell BETWEEN ...
+            models.Index(fields=["is_active", "geo_cell"]),
+        ]
+
     def __str__(self):
         return self.name
 
+    def assign_geo_cell(self):
+        self.geo_cell = cell_for(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.assign_geo_cell()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geo_cell"}
+        super().save(*args, **kwargs)
+
 
 class MenuItem(models.Model):
     restaurant = models.ForeignKey(
@@ -64,8 +103,42 @@ class MenuItem(models.Model):
             )
         ]
         indexes = [
-            models.Index(fields=["restaurant", "is_available"]),
+            # menu keyset: WHERE restaurant = ? AND is_available ORDER BY id
+            models.Index(fields=["restaurant", "is_available", "id"]),
         ]
 
     def __str__(self):
         return f"{self.name} ({self.restaurant.name})"
+
+
+# ---- Signals to invalidate cached restaurant/menu responses ----
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_restaurant_cache(sender, instance, **kwargs):
+    invalidate_restaurant(instance.pk)
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_menu_cache(sender, instance, **kwargs):
+    invalidate_restaurant(instance.restaurant_id)
+    # Restaurant.updated_at doubles as "menu last changed" for ETag/Last-Modified.
+    Restaurant.objects.filter(pk=instance.restaurant_id).update(updated_at=timezone.now())
+
+# ---- Signals to keep the full-text search index in sync ----
+
+@receiver(post_save, sender=Restaurant)
+def index_restaurant(sender, instance, **kwargs):
+    search.index_restaurant(instance)
+
+@receiver(post_delete, sender=Restaurant)
+def unindex_restaurant(sender, instance, **kwargs):
+    search.remove(search.RESTAURANT, instance.pk)
+
+@receiver(post_save, sender=MenuItem)
+def index_menu_item(sender, instance, **kwargs):
+    search.index_menu_item(instance)
+
+@receiver(post_delete, sender=MenuItem)
+def unindex_menu_item(sender, instance, **kwargs):
+    search.remove(search.ITEM, instance.pk)
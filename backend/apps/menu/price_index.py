@@ -0,0 +1,79 @@
+"""
+In-process price index used to validate carts at order placement.
+
+For each restaurant we keep MenuItem id -> PriceEntry, tagged with the
+restaurant's updated_at. Every MenuItem or Restaurant change (save, delete,
+the importer) touches that column, so each lookup reads it with one
+primary-key query and rebuilds the index with one more when it moved. The
+freshness check lives in the database, not in the menu response cache,
+so changes made by other workers, the admin or management commands are
+seen at the next checkout whatever cache backend is configured.
+"""
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import MenuItem, Restaurant
+
+
+class PriceEntry(NamedTuple):
+    name: str
+    price: Decimal
+    is_available: bool
+    image: str
+
+
+_lock = threading.Lock()
+_indexes = OrderedDict()  # restaurant_id -> (updated_at, {menu_item_id: PriceEntry})
+
+
+def _max_restaurants():
+    return getattr(settings, "MENU_PRICE_INDEX_SIZE", 512)
+
+
+def _build(restaurant_id):
+    rows = (
+        MenuItem.objects
+        .filter(restaurant_id=restaurant_id, restaurant__is_active=True)
+        .values_list("id", "name", "price", "is_available", "image")
+    )
+    return {
+        pk: PriceEntry(name, price, is_available, image or "")
+        for pk, name, price, is_available, image in rows
+    }
+
+
+def get_price_index(restaurant_id):
+    """
+    Return {menu_item_id: PriceEntry} for an active restaurant's menu.
+    An empty dict means the restaurant is unknown, inactive or has no items.
+    """
+    version = (
+        Restaurant.objects.filter(pk=restaurant_id, is_active=True)
+        .values_list("updated_at", flat=True).first()
+    )
+    if version is None:
+        with _lock:
+            _indexes.pop(restaurant_id, None)
+        return {}
+    with _lock:
+        cached = _indexes.get(restaurant_id)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(restaurant_id)
+            return cached[1]
+
+    index = _build(restaurant_id)
+    with _lock:
+        _indexes[restaurant_id] = (version, index)
+        _indexes.move_to_end(restaurant_id)
+        while len(_indexes) > _max_restaurants():
+            _indexes.popitem(last=False)
+    return index
+
+
+def clear_price_index():
+    with _lock:
+        _indexes.clear()
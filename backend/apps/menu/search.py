@@ -0,0 +1,211 @@
+"""
+Full-text search over restaurants and menu items.
+
+SQLite keeps a single FTS5 table, `menu_search`, that the Restaurant/MenuItem
+signals in models.py upsert into. Its rowid encodes (kind, id) so an upsert or
+delete is a rowid lookup rather than a scan. On MySQL the FULLTEXT indexes
+added by migration 0011 are maintained by the server and queried with
+MATCH ... AGAINST. Other backends fall back to icontains filtering.
+
+Search only returns (kind, id, restaurant_id, score) rows ordered by
+relevance; the view hydrates them into serializer payloads. The queries run
+on the alias the router picks for MenuItem reads, so a view that opted into
+replica reads searches a replica. `category` is a menu item category:
+restaurants have none, so a category filter returns menu items only.
+"""
+import re
+
+from django.db import connection, connections, router
+
+RESTAURANT = "restaurant"
+ITEM = "item"
+KINDS = (RESTAURANT, ITEM)
+
+FTS_TABLE = "menu_search"
+_KIND_BIT = {RESTAURANT: 0, ITEM: 1}
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def uses_fts5():
+    return connection.vendor == "sqlite"
+
+
+def _rowid(kind, object_id):
+    return object_id * 2 + _KIND_BIT[kind]
+
+
+def _fts_query(text):
+    """Quote every word so user input can't inject FTS5 syntax; prefix-match the last one."""
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+# ----- Index maintenance (SQLite FTS5 only) -----
+
+def _restaurant_row(restaurant):
+    return (
+        _rowid(RESTAURANT, restaurant.pk), RESTAURANT, restaurant.pk, restaurant.pk, "",
+        restaurant.name,
+        f"{restaurant.cuisine_type} {restaurant.address}",
+    )
+
+
+def _menu_item_row(item):
+    return (
+        _rowid(ITEM, item.pk), ITEM, item.pk, item.restaurant_id,
+        (item.category or "").lower(),
+        item.name,
+        f"{item.description} {item.category}",
+    )
+
+
+def _upsert(rows):
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(r[0],) for r in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, kind, object_id, restaurant_id, category, title, body) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def index_restaurant(restaurant):
+    if uses_fts5():
+        _upsert([_restaurant_row(restaurant)])
+
+
+def index_menu_item(item):
+    if uses_fts5():
+        _upsert([_menu_item_row(item)])
+
+
+def index_many(restaurants=(), menu_items=()):
+    """Upsert a batch in two statements, e.g. after bulk_create."""
+    if uses_fts5():
+        rows = [_restaurant_row(r) for r in restaurants] + [_menu_item_row(i) for i in menu_items]
+        if rows:
+            _upsert(rows)
+
+
+def remove(kind, object_id):
+    if uses_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [_rowid(kind, object_id)])
+
+
+def rebuild_index():
+    """Repopulate the FTS5 table from the base tables in two INSERT ... SELECT statements."""
+    if not uses_fts5():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, kind, object_id, restaurant_id, category, title, body) "
+            "SELECT id * 2, 'restaurant', id, id, '', name, "
+            "cuisine_type || ' ' || address FROM menu_restaurant"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, kind, object_id, restaurant_id, category, title, body) "
+            "SELECT id * 2 + 1, 'item', id, restaurant_id, lower(category), name, "
+            "description || ' ' || category FROM menu_menuitem"
+        )
+
+
+# ----- Queries -----
+
+def _search_fts5(conn, text, category, kind, limit, offset):
+    match = _fts_query(text)
+    if match is None:
+        return []
+    # bm25 weights per column: only title (10x) and body count towards rank.
+    sql = [
+        f"SELECT s.kind, s.object_id, s.restaurant_id, -bm25({FTS_TABLE}, 0, 0, 0, 0, 10.0, 1.0) AS score",
+        f"FROM {FTS_TABLE} s",
+        "JOIN menu_restaurant r ON r.id = s.restaurant_id AND r.is_active",
+        "LEFT JOIN menu_menuitem m ON s.kind = 'item' AND m.id = s.object_id",
+        f"WHERE {FTS_TABLE} MATCH %s AND (s.kind = 'restaurant' OR m.is_available)",
+    ]
+    params = [match]
+    if category:
+        sql.append("AND s.kind = 'item' AND s.category = %s")
+        params.append(category.lower())
+    if kind:
+        sql.append("AND s.kind = %s")
+        params.append(kind)
+    sql.append("ORDER BY score DESC, s.rowid LIMIT %s OFFSET %s")
+    params += [limit, offset]
+    with conn.cursor() as cursor:
+        cursor.execute(" ".join(sql), params)
+        return cursor.fetchall()
+
+
+def _search_mysql(conn, text, category, kind, limit, offset):
+    parts, params = [], []
+    if kind in (None, RESTAURANT) and not category:
+        sql = (
+            "SELECT 'restaurant' AS kind, r.id AS object_id, r.id AS restaurant_id, "
+            "MATCH(r.name, r.cuisine_type, r.address) AGAINST (%s) AS score "
+            "FROM menu_restaurant r WHERE r.is_active "
+            "AND MATCH(r.name, r.cuisine_type, r.address) AGAINST (%s)"
+        )
+        params += [text, text]
+        parts.append(sql)
+    if kind in (None, ITEM):
+        sql = (
+            "SELECT 'item' AS kind, m.id AS object_id, m.restaurant_id, "
+            "MATCH(m.name, m.description, m.category) AGAINST (%s) AS score "
+            "FROM menu_menuitem m JOIN menu_restaurant r ON r.id = m.restaurant_id "
+            "WHERE r.is_active AND m.is_available "
+            "AND MATCH(m.name, m.description, m.category) AGAINST (%s)"
+        )
+        params += [text, text]
+        if category:
+            sql += " AND m.category = %s"
+            params.append(category)
+        parts.append(sql)
+    if not parts:
+        return []
+    sql = " UNION ALL ".join(parts) + " ORDER BY score DESC, kind, object_id LIMIT %s OFFSET %s"
+    params += [limit, offset]
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_fallback(text, category, kind, limit, offset):
+    from django.db.models import Q
+    from .models import Restaurant, MenuItem
+
+    rows = []
+    if kind in (None, RESTAURANT) and not category:
+        qs = Restaurant.objects.active().filter(
+            Q(name__icontains=text) | Q(cuisine_type__icontains=text) | Q(address__icontains=text)
+        )
+        rows += [(RESTAURANT, pk, pk, 1.0) for pk in qs.order_by("id").values_list("id", flat=True)[:offset + limit]]
+    if kind in (None, ITEM):
+        qs = MenuItem.objects.available().filter(restaurant__is_active=True).filter(
+            Q(name__icontains=text) | Q(description__icontains=text) | Q(category__icontains=text)
+        )
+        if category:
+            qs = qs.filter(category__iexact=category)
+        rows += [(ITEM, pk, rid, 1.0) for pk, rid in qs.order_by("id").values_list("id", "restaurant_id")[:offset + limit]]
+    return rows[offset:offset + limit]
+
+
+def search(text, category=None, kind=None, limit=20, offset=0):
+    """Ranked (kind, object_id, restaurant_id, score) rows, best first."""
+    from .models import MenuItem
+
+    text = (text or "").strip()
+    if not text:
+        return []
+    conn = connections[router.db_for_read(MenuItem)]
+    if conn.vendor == "sqlite":
+        return _search_fts5(conn, text, category, kind, limit, offset)
+    if conn.vendor == "mysql":
+        return _search_mysql(conn, text, category, kind, limit, offset)
+    return _search_fallback(text, category, kind, limit, offset)
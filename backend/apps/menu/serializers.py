@@ -1,14 +1,49 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from collections import defaultdict
+from backend.metrics import TimedSerializerMixin
 from .models import Restaurant, MenuItem
 
-class MenuItemSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """Field names from ?fields=a,b,c on a read, or None when the client wants everything."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.query_params.get("fields")
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(",") if name.strip()}
+
+
+class SparseFieldsetsMixin:
+    """
+    Let clients trim the payload with ?fields=a,b,c. Only the top-level
+    serializer of a request (the one built with context) is trimmed; nested
+    serializers keep their full field set.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self._context.get("request"))
+        if wanted is None:
+            return
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class MenuItemSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = MenuItem
         fields = ["id", "name", "description", "price", "image", "is_available", "category"]
 
-class RestaurantSerializer(serializers.ModelSerializer):
+class RestaurantSummarySerializer(serializers.ModelSerializer):
+    """Just enough to label a restaurant, e.g. on an order card."""
+    class Meta:
+        model = Restaurant
+        fields = ["id", "name", "image"]
+
+class RestaurantSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     menu = serializers.SerializerMethodField()  # SerializerMethodField to compute grouping
+    # Set by geo.nearest() when the listing is queried with ?lat=&lon=
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Restaurant
@@ -22,12 +57,26 @@ class RestaurantSerializer(serializers.ModelSerializer):
             "deliveryTime",
             "deliveryFee",
             "offer",
+            "latitude",
+            "longitude",
+            "distance_km",
             "menu",
         ]
 
+    def get_distance_km(self, obj):
+        return getattr(obj, "distance_km", None)
+
     def get_menu(self, obj):
+        # Reuse one item serializer for every restaurant in the listing rather
+        # than building a new serializer (and its bound fields) per menu item.
+        # Views should use Restaurant.objects.with_menu() so .all() hits the
+        # prefetch cache instead of the database.
+        item_serializer = getattr(self, "_menu_item_serializer", None)
+        if item_serializer is None:
+            item_serializer = self._menu_item_serializer = MenuItemSerializer()
+
+        to_representation = item_serializer.to_representation
         grouped = defaultdict(list)
         for item in obj.menu_items.all():
-            cat = item.category or "Uncategorized"
-            grouped[cat].append(MenuItemSerializer(item).data)
+            grouped[item.category or "Uncategorized"].append(to_representation(item))
         return grouped
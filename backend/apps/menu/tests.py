@@ -1,3 +1,404 @@
+import json
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from .models import Restaurant, MenuItem
+from . import cache as menu_cache, geo
+
+
+def make_restaurants(owner, count, items_per_restaurant=3, start=0):
+    restaurants = Restaurant.objects.bulk_create(
+        Restaurant(owner_user=owner, name=f"Restaurant {start + i}") for i in range(count)
+    )
+    MenuItem.objects.bulk_create(
+        MenuItem(
+            restaurant=r,
+            name=f"Item {j}",
+            price=Decimal("5.00") + j,
+            category="Mains" if j % 2 else "",
+        )
+        for r in restaurants
+        for j in range(items_per_restaurant)
+    )
+    return restaurants
+
+
+class RestaurantListingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw123456")
+        menu_cache.get_cache().clear()
+
+    def list_query_count(self):
+        # bulk_create skips the invalidation signals, so measure the uncached path
+        menu_cache.get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/menu/restaurants/")
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_listing_query_count_is_constant(self):
+        make_restaurants(self.owner, 2)
+        small, _ = self.list_query_count()
+
+        make_restaurants(self.owner, 25, items_per_restaurant=6, start=2)
+        large, response = self.list_query_count()
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.json()["results"]), 27)
+
+    def test_listing_groups_menu_by_category(self):
+        make_restaurants(self.owner, 1)
+        # validator aggregate + restaurants + prefetched menu items
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/menu/restaurants/")
+
+        menu = response.json()["results"][0]["menu"]
+        self.assertEqual(sorted(menu), ["Mains", "Uncategorized"])
+        self.assertEqual([i["name"] for i in menu["Uncategorized"]], ["Item 0", "Item 2"])
+        self.assertEqual(menu["Mains"][0]["price"], "6.00")
+
+    def test_detail_prefetches_menu(self):
+        restaurant = make_restaurants(self.owner, 1, items_per_restaurant=5)[0]
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/menu/restaurants/{restaurant.pk}/")
+        self.assertEqual(sum(len(v) for v in response.json()["menu"].values()), 5)
+
+
+class MenuResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw123456")
+        self.first, self.second = make_restaurants(self.owner, 2)
+        menu_cache.get_cache().clear()
+        menu_cache.reset_stats()
+
+    def test_repeat_anonymous_get_is_served_from_cache(self):
+        url = f"/api/menu/restaurants/{self.first.pk}/"
+        first = self.client.get(url)
+        with self.assertNumQueries(1):  # the validator source
+            second = self.client.get(url)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(menu_cache.stats()["hits"], 1)
+        self.assertEqual(menu_cache.stats()["misses"], 1)
+
+    def test_menu_item_edit_invalidates_only_its_restaurant_and_listing(self):
+        urls = [
+            "/api/menu/restaurants/",
+            f"/api/menu/restaurants/{self.first.pk}/",
+            f"/api/menu/restaurants/{self.first.pk}/menu/",
+            f"/api/menu/restaurants/{self.second.pk}/",
+        ]
+        for url in urls:
+            self.client.get(url)
+
+        item = self.first.menu_items.first()
+        item.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+
+        menu_cache.reset_stats()
+        for url in urls:
+            self.client.get(url)
+        self.assertEqual(menu_cache.stats()["misses"], 3)
+        self.assertEqual(menu_cache.stats()["hits"], 1)
+
+        names = [i["name"] for i in self.client.get(urls[2]).json()["results"]]
+        self.assertIn("Renamed", names)
+
+    def test_edit_bumped_in_another_workers_cache_is_not_served_stale(self):
+        urls = {
+            "menu": f"/api/menu/restaurants/{self.first.pk}/menu/",
+            "detail": f"/api/menu/restaurants/{self.first.pk}/",
+            "search": "/api/menu/search/?q=renamed",
+        }
+        for url in urls.values():
+            self.client.get(url)
+
+        other_worker = LocMemCache("other-worker", {})
+        item = self.first.menu_items.first()
+        item.name = "Renamed"
+        with patch.object(menu_cache, "get_cache", return_value=other_worker), \
+                self.captureOnCommitCallbacks(execute=True):
+            item.save()
+
+        self.assertIn("Renamed", [i["name"] for i in self.client.get(urls["menu"]).json()["results"]])
+        detail = self.client.get(urls["detail"]).json()["menu"]
+        self.assertIn("Renamed", [i["name"] for items in detail.values() for i in items])
+        self.assertEqual([r["id"] for r in self.client.get(urls["search"]).json()["results"]], [item.pk])
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_authenticate(self.owner)
+        self.client.get("/api/menu/restaurants/")
+        self.client.get("/api/menu/restaurants/")
+        self.assertEqual(menu_cache.stats()["hits"] + menu_cache.stats()["misses"], 0)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        owner = User.objects.create_user(email="owner@example.com", password="pw123456")
+        self.restaurant = make_restaurants(owner, 3)[0]
+        menu_cache.get_cache().clear()
+
+    def test_listing_without_menu_skips_prefetch(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/menu/restaurants/?fields=id,name")
+        self.assertEqual(set(response.json()["results"][0]), {"id", "name"})
+
+    def test_menu_item_fields(self):
+        response = self.client.get(f"/api/menu/restaurants/{self.restaurant.pk}/menu/?fields=id,price")
+        self.assertEqual(set(response.json()["results"][0]), {"id", "price"})
+
+
+class MenuSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        owner = User.objects.create_user(email="owner@example.com", password="pw123456")
+        self.pho = Restaurant.objects.create(
+            owner_user=owner, name="Pho Saigon", cuisine_type="Vietnamese", address="12 Rue Ontario"
+        )
+        self.tacos = Restaurant.objects.create(owner_user=owner, name="Taco Loco", cuisine_type="Mexican")
+        self.soup = MenuItem.objects.create(
+            restaurant=self.pho, name="Pho Tai", description="Rare beef noodle soup",
+            price=Decimal("14.00"), category="Soups",
+        )
+        MenuItem.objects.create(
+            restaurant=self.tacos, name="Birria", description="Beef tacos with consomme soup",
+            price=Decimal("12.00"), category="Tacos",
+        )
+        menu_cache.get_cache().clear()
+
+    def search(self, **params):
+        response = self.client.get("/api/menu/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_results_across_restaurants_and_items(self):
+        results = self.search(q="pho")["results"]
+        self.assertEqual({(r["type"], r["id"]) for r in results},
+                         {("restaurant", self.pho.pk), ("item", self.soup.pk)})
+        self.assertGreaterEqual(results[0]["score"], results[-1]["score"])
+
+    def test_prefix_category_and_type_filters(self):
+        self.assertEqual(len(self.search(q="noodl")["results"]), 1)
+        results = self.search(q="soup", category="soups")["results"]
+        self.assertEqual([r["name"] for r in results], ["Pho Tai"])
+        # Restaurants have no menu category; their cuisine is not one.
+        self.assertEqual(self.search(q="pho", category="vietnamese")["results"], [])
+        results = self.search(q="beef", type="restaurant")["results"]
+        self.assertEqual(results, [])
+
+    def test_index_follows_edits_deletes_and_visibility(self):
+        # on_commit callbacks bump the response cache versions
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soup.name = "Bun Bo Hue"
+            self.soup.save()
+        self.assertEqual(self.search(q="bun")["results"][0]["id"], self.soup.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soup.is_available = False
+            self.soup.save()
+        self.assertEqual(self.search(q="bun")["results"], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soup.delete()
+            self.tacos.is_active = False
+            self.tacos.save()
+        self.assertEqual(self.search(q="beef")["results"], [])
+
+    def test_pagination_and_validation(self):
+        for i in range(3):
+            MenuItem.objects.create(restaurant=self.pho, name=f"Pho Special {i}", price=Decimal("10.00"))
+        first = self.search(q="pho", page_size=2)
+        self.assertEqual(len(first["results"]), 2)
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(len({r["id"] for r in first["results"] + second["results"]}), 4)
+        self.assertEqual(self.client.get("/api/menu/search/").status_code, 400)
+        # FTS syntax in user input is treated as plain words
+        self.assertEqual(self.search(q='pho" *')["results"][0]["name"].split()[0], "Pho")
+
+
+class NearbyRestaurantTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        owner = User.objects.create_user(email="owner@example.com", password="pw123456")
+        places = {
+            "Old Port": (45.5075, -73.5540),
+            "Plateau": (45.5225, -73.5800),
+            "Laval": (45.6066, -73.7124),
+            "Quebec City": (46.8139, -71.2080),
+        }
+        self.restaurants = {
+            name: Restaurant.objects.create(owner_user=owner, name=name, latitude=lat, longitude=lon)
+            for name, (lat, lon) in places.items()
+        }
+        Restaurant.objects.create(owner_user=owner, name="No location")
+        menu_cache.get_cache().clear()
+
+    def test_nearest_within_radius_sorted_by_distance(self):
+        response = self.client.get(
+            "/api/menu/restaurants/", {"lat": 45.5017, "lon": -73.5673, "radius_km": 20}
+        )
+        results = response.json()["results"]
+        self.assertEqual([r["name"] for r in results], ["Old Port", "Plateau", "Laval"])
+        self.assertLess(results[0]["distance_km"], results[1]["distance_km"])
+        self.assertAlmostEqual(results[0]["distance_km"], 1.2, delta=0.3)
+
+    def test_limit_and_validation(self):
+        response = self.client.get(
+            "/api/menu/restaurants/", {"lat": 45.5017, "lon": -73.5673, "radius_km": 500, "limit": 1}
+        )
+        self.assertEqual(len(response.json()["results"]), 1)
+        response = self.client.get("/api/menu/restaurants/", {"lat": 95, "lon": 0})
+        self.assertEqual(response.status_code, 400)
+        for bad in ({"radius_km": "nan"}, {"lat": "nan"}, {"lon": "inf"}, {"radius_km": "-inf"}):
+            response = self.client.get("/api/menu/restaurants/", {"lat": 1, "lon": 1, **bad})
+            self.assertEqual(response.status_code, 400, bad)
+
+    def test_geo_cell_follows_coordinate_updates(self):
+        restaurant = self.restaurants["Quebec City"]
+        restaurant.latitude, restaurant.longitude = 45.5100, -73.5600
+        restaurant.save(update_fields=["latitude", "longitude"])
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.geo_cell, geo.cell_for(45.51, -73.56))
+
+    def test_cell_ranges_wrap_the_antimeridian(self):
+        ranges = geo.cell_ranges(0.0, 179.99, 20)
+        self.assertTrue(any(low % geo.COLS == 0 for low, _ in ranges))
+        self.assertTrue(any(high % geo.COLS == geo.COLS - 1 for _, high in ranges))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        owner = User.objects.create_user(email="owner@example.com", password="pw123456")
+        self.restaurant = Restaurant.objects.create(owner_user=owner, name="Pho House")
+        self.item = MenuItem.objects.create(restaurant=self.restaurant, name="Pho", price=Decimal("12.00"))
+        menu_cache.get_cache().clear()
+        self.urls = [
+            "/api/menu/restaurants/",
+            f"/api/menu/restaurants/{self.restaurant.pk}/",
+            f"/api/menu/restaurants/{self.restaurant.pk}/menu/",
+        ]
+
+    def test_matching_etag_returns_304_after_one_query(self):
+        for url in self.urls:
+            first = self.client.get(url)
+            self.assertIn("ETag", first)
+            self.assertIn("Last-Modified", first)
+            with self.assertNumQueries(1):  # the validator source
+                second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(second.status_code, 304)
+            self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_if_modified_since(self):
+        url = self.urls[1]
+        first = self.client.get(url)
+        second = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(second.status_code, 304)
+
+    def test_menu_edit_changes_validators(self):
+        before = {url: self.client.get(url)["ETag"] for url in self.urls}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.price = Decimal("13.00")
+            self.item.save()
+        for url in self.urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=before[url])
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], before[url])
+
+    def test_edit_bumped_in_another_workers_cache_changes_validators(self):
+        self.client.force_authenticate(self.restaurant.owner_user)
+        before = {url: self.client.get(url)["ETag"] for url in self.urls}
+        other_worker = LocMemCache("other-worker", {})
+        with patch.object(menu_cache, "get_cache", return_value=other_worker), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.item.price = Decimal("13.00")
+            self.item.save()
+        for url in self.urls:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=before[url]).status_code, 200)
+
+    def test_fieldsets_get_distinct_etags(self):
+        full = self.client.get(self.urls[1])["ETag"]
+        sparse = self.client.get(self.urls[1] + "?fields=id,name")["ETag"]
+        self.assertNotEqual(full, sparse)
+
+
+class ImportMenuTests(TestCase):
+    CSV = (
+        "restaurant,restaurant_name,cuisine_type,latitude,longitude,name,description,price,category\n"
+        "pho-1,Pho Saigon,Vietnamese,45.5,-73.56,Pho Tai,Rare beef noodle soup,14.00,Soups\n"
+        "pho-1,Pho Saigon,Vietnamese,45.5,-73.56,Spring Rolls,,6.50,Starters\n"
+        "taco-1,Taco Loco,Mexican,,,Birria,Beef tacos,12.00,Tacos\n"
+        "taco-1,,,,,Horchata,,not-a-price,Drinks\n"
+        "ghost-1,,,,,Mystery,,5.00,\n"
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="chain@example.com", password="pw123456")
+        menu_cache.get_cache().clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def run_import(self, name, content, *args):
+        path = Path(self.tmp.name, name)
+        path.write_text(content)
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_menu", str(path), "--owner", "chain@example.com", "--batch-size", "2",
+                         "--local-cache-ok", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_refuses_a_process_local_menu_cache_unless_told_otherwise(self):
+        path = Path(self.tmp.name, "menu.csv")
+        path.write_text(self.CSV)
+        with self.assertRaisesMessage(CommandError, "MENU_CACHE_BACKEND=file"):
+            call_command("import_menu", str(path), "--owner", "chain@example.com", stdout=StringIO())
+        self.assertFalse(Restaurant.objects.exists())
+
+    def test_csv_import_creates_restaurants_items_and_index(self):
+        out, err = self.run_import("menu.csv", self.CSV)
+        self.assertIn("2 restaurants and 3 menu items upserted, 2 skipped", out)
+        self.assertIn("line 5: price", err)
+        self.assertIn("'ghost-1'", err)
+
+        pho = Restaurant.objects.get(external_id="pho-1")
+        self.assertEqual(pho.owner_user, self.owner)
+        self.assertEqual(pho.geo_cell, geo.cell_for(pho.latitude, pho.longitude))
+        self.assertEqual(sorted(pho.menu_items.values_list("name", flat=True)), ["Pho Tai", "Spring Rolls"])
+        results = self.client.get("/api/menu/search/", {"q": "birria"}).json()["results"]
+        self.assertEqual([r["name"] for r in results], ["Birria"])
+
+    def test_reimport_updates_only_given_columns_and_invalidates_cache(self):
+        self.run_import("menu.csv", self.CSV)
+        url = f"/api/menu/restaurants/{Restaurant.objects.get(external_id='pho-1').pk}/menu/"
+        etag = self.client.get(url)["ETag"]
+
+        lines = [{"restaurant": "pho-1", "name": "Pho Tai", "price": "15.50", "is_available": "false"},
+                 {"restaurant": "pho-1", "name": "Banh Mi", "price": "9", "category": "Mains"}]
+        out, _ = self.run_import("prices.jsonl", "\n".join(json.dumps(line) for line in lines))
+        self.assertIn("0 restaurants and 2 menu items upserted", out)
+
+        pho_tai = MenuItem.objects.get(restaurant__external_id="pho-1", name="Pho Tai")
+        self.assertEqual(pho_tai.price, Decimal("15.50"))
+        self.assertFalse(pho_tai.is_available)
+        self.assertEqual(pho_tai.description, "Rare beef noodle soup")
+        self.assertEqual(Restaurant.objects.get(external_id="pho-1").name, "Pho Saigon")
+        self.assertEqual(MenuItem.objects.filter(restaurant__external_id="pho-1").count(), 3)
 
-# Create your tests here.
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Banh Mi", [item["name"] for item in response.json()["results"]])
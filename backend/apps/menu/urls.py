@@ -1,13 +1,23 @@
 from django.urls import path
-from .views import RestaurantListCreateAPIView, RestaurantDetailAPIView, MenuItemListCreateAPIView
+from .views import (
+    RestaurantListCreateAPIView,
+    RestaurantDetailAPIView,
+    MenuItemListCreateAPIView,
+    MenuCacheStatsAPIView,
+    MenuSearchAPIView,
+)
 
 urlpatterns = [
     # List & search restaurants
     path("restaurants/", RestaurantListCreateAPIView.as_view(), name="restaurants-list"),
+    path("search/", MenuSearchAPIView.as_view(), name="menu-search"),
 
     # Restaurant detail
     path("restaurants/<int:pk>/", RestaurantDetailAPIView.as_view(), name="restaurant-detail"),
 
     # Menu items for a restaurant
     path("restaurants/<int:restaurant_id>/menu/", MenuItemListCreateAPIView.as_view(), name="restaurant-menu"),
+
+    # Response cache hit/miss counters (admin only)
+    path("cache/stats/", MenuCacheStatsAPIView.as_view(), name="menu-cache-stats"),
 ]
@@ -1,14 +1,87 @@
+import math
+
 from rest_framework import generics
+from rest_framework.views import APIView
+from rest_framework.response import Response
 from .models import Restaurant, MenuItem
-from .serializers import RestaurantSerializer, MenuItemSerializer
-from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
-from rest_framework.exceptions import PermissionDenied
+from .serializers import (
+    RestaurantSerializer,
+    RestaurantSummarySerializer,
+    MenuItemSerializer,
+    requested_fields,
+)
+from . import search
+from .geo import nearest
+from .cache import CachedResponseMixin, LIST_SCOPE, restaurant_scope, stats
+from django.db.models import Count, Max, Q
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.utils.http import urlencode
+from backend.db_router import ReplicaReadMixin
+
+def restaurant_validator_source(restaurant_id):
+    # MenuItem edits touch Restaurant.updated_at, so one row covers the menu too.
+    updated_at = (
+        Restaurant.objects.active().filter(pk=restaurant_id)
+        .values_list("updated_at", flat=True).first()
+    )
+    if updated_at is None:
+        return None
+    return updated_at, f"restaurant:{restaurant_id}:{updated_at.isoformat()}"
+
+def listing_validator_source():
+    # Max over all restaurants so deactivations also move Last-Modified;
+    # the active count catches deletions.
+    agg = Restaurant.objects.aggregate(
+        last=Max("updated_at"), active=Count("id", filter=Q(is_active=True))
+    )
+    last = agg["last"]
+    return last, f"list:{last.isoformat() if last else '-'}:{agg['active']}"
+
+class RestaurantQuerysetMixin:
+    def get_queryset(self):
+        queryset = Restaurant.objects.active()
+        # Skip the menu prefetch when ?fields= leaves the menu out.
+        wanted = requested_fields(self.request)
+        if wanted is None or "menu" in wanted:
+            queryset = queryset.with_menu()
+        return queryset
 
-class RestaurantListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Restaurant.objects.active()
+class RestaurantListCreateAPIView(ReplicaReadMixin, CachedResponseMixin, RestaurantQuerysetMixin, generics.ListCreateAPIView):
     serializer_class = RestaurantSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_cache_scope(self):
+        return LIST_SCOPE
+
+    def get_validator_source(self):
+        return listing_validator_source()
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        if "lat" not in params and "lon" not in params:
+            return super().list(request, *args, **kwargs)
+
+        # Nearby mode: N closest active restaurants within radius_km, not cached
+        # (every coordinate would be its own cache entry).
+        try:
+            lat, lon, radius_km = float(params["lat"]), float(params["lon"]), float(params.get("radius_km", 10))
+            if not all(map(math.isfinite, (lat, lon, radius_km))):  # nan/inf would slip past the range checks
+                raise ValueError
+            radius_km = min(radius_km, 100.0)
+            limit = min(int(params.get("limit", 20)), 100)
+        except (KeyError, ValueError):
+            raise ValidationError("lat and lon must be numbers; radius_km and limit are optional.")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius_km <= 0 or limit < 1:
+            raise ValidationError("Coordinates, radius_km or limit out of range.")
+
+        restaurants = nearest(self.get_queryset(), lat, lon, radius_km, limit)
+        return Response({
+            "next": None,
+            "previous": None,
+            "results": self.get_serializer(restaurants, many=True).data,
+        })
+
     def get_permissions(self):
         # Public can read (list)
         if self.request.method in ("GET", "HEAD", "OPTIONS"):
@@ -23,15 +96,26 @@ class RestaurantListCreateAPIView(generics.ListCreateAPIView):
             raise PermissionDenied("Only staff/admin can create restaurants.")
         serializer.save(owner_user=self.request.user)
 
-class RestaurantDetailAPIView(generics.RetrieveAPIView):
-    queryset = Restaurant.objects.active()
+class RestaurantDetailAPIView(ReplicaReadMixin, CachedResponseMixin, RestaurantQuerysetMixin, generics.RetrieveAPIView):
     serializer_class = RestaurantSerializer
     permission_classes = [AllowAny]  # public can view details
 
-class MenuItemListCreateAPIView(generics.ListCreateAPIView):
+    def get_cache_scope(self):
+        return restaurant_scope(self.kwargs["pk"])
+
+    def get_validator_source(self):
+        return restaurant_validator_source(self.kwargs["pk"])
+
+class MenuItemListCreateAPIView(ReplicaReadMixin, CachedResponseMixin, generics.ListCreateAPIView):
     serializer_class = MenuItemSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_cache_scope(self):
+        return restaurant_scope(self.kwargs["restaurant_id"])
+
+    def get_validator_source(self):
+        return restaurant_validator_source(self.kwargs["restaurant_id"])
+
     def get_queryset(self):
         restaurant_id = self.kwargs["restaurant_id"]
         return MenuItem.objects.filter(restaurant_id=restaurant_id, is_available=True)
@@ -46,3 +130,90 @@ class MenuItemListCreateAPIView(generics.ListCreateAPIView):
         if role not in ("staff", "admin"):
             raise PermissionDenied("Only staff/admin can add menu items.")
         serializer.save()
+
+class MenuCacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(stats())
+
+class MenuSearchAPIView(ReplicaReadMixin, CachedResponseMixin, APIView):
+    """
+    GET /api/menu/search/?q=pho&category=Soups&type=item&page=2&page_size=20
+
+    Ranked full-text matches over active restaurants and available menu items.
+    `category` is a menu item category, so it narrows the results to items.
+    """
+    permission_classes = [AllowAny]
+    default_page_size = 20
+    max_page_size = 50
+    max_offset = 1000  # ranked results: deep pages are not useful, cap the scan
+
+    def get_cache_scope(self):
+        return LIST_SCOPE
+
+    def get_validator_source(self):
+        # Menu item edits touch their restaurant, so the listing covers every hit.
+        return listing_validator_source()
+
+    def get(self, request):
+        return self.cached(request, lambda: self.search(request))
+
+    def _int_param(self, name, default, minimum=1, maximum=None):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: "Must be an integer."})
+        value = max(value, minimum)
+        return min(value, maximum) if maximum else value
+
+    def search(self, request):
+        params = request.query_params
+        query = params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This parameter is required."})
+        kind = params.get("type") or None
+        if kind not in (None, *search.KINDS):
+            raise ValidationError({"type": f"Must be one of {', '.join(search.KINDS)}."})
+
+        page_size = self._int_param("page_size", self.default_page_size, maximum=self.max_page_size)
+        page = self._int_param("page", 1)
+        offset = (page - 1) * page_size
+        if offset > self.max_offset:
+            raise ValidationError({"page": "Refine the query instead of paging this deep."})
+
+        rows = search.search(query, category=params.get("category"), kind=kind,
+                             limit=page_size + 1, offset=offset)
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        return Response({
+            "next": self._page_url(request, page + 1) if has_next else None,
+            "previous": self._page_url(request, page - 1) if page > 1 else None,
+            "results": self._hydrate(rows),
+        })
+
+    def _page_url(self, request, page):
+        params = request.query_params.copy()
+        params["page"] = page
+        return request.build_absolute_uri(f"{request.path}?{urlencode(params, doseq=True)}")
+
+    def _hydrate(self, rows):
+        # Two bulk lookups for the whole page, then restore rank order.
+        restaurant_ids = [pk for kind, pk, _, _ in rows if kind == search.RESTAURANT]
+        item_ids = [pk for kind, pk, _, _ in rows if kind == search.ITEM]
+        restaurants = Restaurant.objects.in_bulk(restaurant_ids) if restaurant_ids else {}
+        items = MenuItem.objects.in_bulk(item_ids) if item_ids else {}
+
+        results = []
+        for kind, pk, restaurant_id, score in rows:
+            if kind == search.RESTAURANT and pk in restaurants:
+                data = RestaurantSummarySerializer(restaurants[pk]).data
+                data["cuisine_type"] = restaurants[pk].cuisine_type
+            elif kind == search.ITEM and pk in items:
+                data = MenuItemSerializer(items[pk]).data
+            else:
+                continue
+            data.update(type=kind, restaurant_id=restaurant_id, score=round(float(score), 4))
+            results.append(data)
+        return results
@@ -1,6 +1,6 @@
-from django.contrib import admin
-from django.utils import timezone
-from .models import Order, OrderItem, Payment
+from django.contrib import admin, messages
+from .models import Order, OrderItem, Payment, IdempotencyKey, OutboxEvent, PaymentWebhookEvent
+from .services import transition_orders
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -15,23 +15,42 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ("id", "user__email", "restaurant__name", "pickup_code")
     date_hierarchy = "placed_at"
     inlines = [OrderItemInline]
-    readonly_fields = ("subtotal", "tax", "total_amount", "pickup_code",
+    # status only moves through the actions below (transition_orders)
+    readonly_fields = ("status", "subtotal", "tax", "total_amount", "pickup_code",
                        "placed_at", "updated_at", "ready_at", "picked_up_at")
 
-    actions = ["mark_preparing", "mark_ready_for_pickup", "mark_picked_up"]
+    actions = ["mark_preparing", "mark_ready_for_pickup", "mark_picked_up", "mark_cancelled"]
+
+    def _transition(self, request, queryset, to_status):
+        # Same legal-transition rules (and status events) as the staff API
+        ids = list(queryset.values_list("pk", flat=True))
+        moved = transition_orders(ids, to_status)
+        if len(moved) == len(ids):
+            self.message_user(request, f"{len(moved)} orders moved to {to_status}.", messages.SUCCESS)
+        else:
+            self.message_user(
+                request,
+                f"{len(moved)} of {len(ids)} orders moved to {to_status}; "
+                "the others cannot make that move from their current status.",
+                messages.WARNING,
+            )
 
     def mark_preparing(self, request, queryset):
-        queryset.update(status="PREPARING", updated_at=timezone.now())
+        self._transition(request, queryset, Order.Status.PREPARING)
     mark_preparing.short_description = "Set status to PREPARING"
 
     def mark_ready_for_pickup(self, request, queryset):
-        queryset.update(status="READY_FOR_PICKUP", ready_at=timezone.now(), updated_at=timezone.now())
+        self._transition(request, queryset, Order.Status.READY_FOR_PICKUP)
     mark_ready_for_pickup.short_description = "Set status to READY_FOR_PICKUP + set ready_at"
 
     def mark_picked_up(self, request, queryset):
-        queryset.update(status="PICKED_UP", picked_up_at=timezone.now(), updated_at=timezone.now())
+        self._transition(request, queryset, Order.Status.PICKED_UP)
     mark_picked_up.short_description = "Set status to PICKED_UP + set picked_up_at"
 
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, Order.Status.CANCELLED)
+    mark_cancelled.short_description = "Set status to CANCELLED"
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ("id", "order", "item_name", "quantity", "line_total")
@@ -42,3 +61,28 @@ class PaymentAdmin(admin.ModelAdmin):
     list_display = ("id", "order", "provider", "status", "amount", "created_at")
     list_filter = ("provider", "status")
     search_fields = ("transaction_id", "order__id")
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "endpoint", "key", "status", "response_status", "expires_at")
+    list_filter = ("endpoint", "status")
+    search_fields = ("key", "user__email")
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "status", "attempts", "available_at", "created_at", "delivered_at")
+    list_filter = ("topic", "status")
+    search_fields = ("id", "last_error")
+
+@admin.register(PaymentWebhookEvent)
+class PaymentWebhookEventAdmin(admin.ModelAdmin):
+    # Append-only record of what providers sent; never edited here.
+    list_display = ("id", "provider", "event_type", "event_id", "transaction_id", "occurred_at", "received_at")
+    list_filter = ("provider", "event_type")
+    search_fields = ("event_id", "transaction_id")
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
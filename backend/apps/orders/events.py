@@ -0,0 +1,145 @@
+"""
+Order status events: an in-process pub/sub that feeds the SSE streams.
+
+Publishers (model signals, bulk status transitions) call `publish_order_status`
+from ordinary sync code; subscribers are asyncio consumers running in the ASGI
+event loop. The broker is chosen with settings.ORDER_EVENTS_BROKER so a
+Redis/NATS-backed implementation with the same publish/subscribe surface can
+replace InProcessBroker without touching publishers or the stream views.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def restaurant_channel(restaurant_id):
+    return f"restaurant:{restaurant_id}"
+
+
+class Subscription:
+    """One consumer's mailbox, bound to the event loop that created it."""
+
+    def __init__(self, broker, channels, maxsize):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, message):
+        # May be called from any thread (e.g. a sync view's on_commit hook).
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # loop already closed; the stream is gone
+            self.close()
+
+    def _put(self, message):
+        if self.queue.full():
+            # Slow consumer: keep the newest state, drop the oldest delta.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Next message, or None if `timeout` seconds pass first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Fan-out within one process: publishers and streams must share the worker
+    (e.g. the whole API served by one ASGI worker). Swap in a broker-backed
+    implementation to fan out across processes.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, *channels):
+        subscription = Subscription(self, channels, self.queue_size)
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subs in self._subscribers.values() for s in subs})
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "ORDER_EVENTS_BROKER", "apps.orders.events.InProcessBroker")
+                _broker = import_string(path)()
+    return _broker
+
+
+STATUS_FIELDS = ("id", "user_id", "restaurant_id", "status", "ready_at", "picked_up_at", "updated_at")
+
+
+def _delta(order):
+    if isinstance(order, dict):
+        return {name: order.get(name) for name in STATUS_FIELDS}
+    return {name: getattr(order, name) for name in STATUS_FIELDS}
+
+
+def publish_order_status(orders):
+    """
+    Publish status deltas for `orders` (Order instances, or dicts with
+    STATUS_FIELDS) once the current transaction commits, so subscribers never
+    see a status that is later rolled back.
+    """
+    deltas = [_delta(o) for o in orders]
+    if not deltas:
+        return
+
+    def send():
+        broker = get_broker()
+        for delta in deltas:
+            user_id = delta.pop("user_id")
+            # The small delta pushed to clients: enough to update a card without refetching.
+            payload = json.dumps(delta, cls=DjangoJSONEncoder)
+            broker.publish(user_channel(user_id), payload)
+            broker.publish(restaurant_channel(delta["restaurant_id"]), payload)
+    transaction.on_commit(send)
@@ -0,0 +1,109 @@
+"""
+Streaming export of a restaurant's order history (CSV or JSONL).
+
+Orders are read in keyset pages on (placed_at, id), backed by the
+(restaurant, placed_at, id) index: every page is one short autocommit
+query, so an export of millions of rows never holds a transaction open and
+never slows down as it goes deeper. The line items of a page come from one
+more query read with QuerySet.iterator(). Rows are encoded as they are
+produced and handed to a StreamingHttpResponse, so memory stays at about
+one page whatever the size of the export.
+
+CSV has one row per line item with the order columns repeated (orders
+without items get a single row with empty item columns); JSONL has one
+order per line with its items nested.
+"""
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import Order, OrderItem
+
+ORDER_FIELDS = (
+    "id", "placed_at", "status", "pickup_code", "pickup_name",
+    "subtotal", "tax", "total_amount", "ready_at", "picked_up_at",
+)
+ITEM_FIELDS = ("id", "menu_item_id", "item_name", "unit_price", "quantity", "line_total")
+CSV_HEADER = [f"order_{f}" if f == "id" else f for f in ORDER_FIELDS] + \
+             [f"item_{f}" if f == "id" else f for f in ITEM_FIELDS]
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def _chunk_size():
+    return getattr(settings, "ORDER_EXPORT_CHUNK_SIZE", 1000)
+
+
+def iter_orders(restaurant_id, start, end, chunk_size=None):
+    """Yield (order values, [item values, ...]) for orders placed in [start, end), oldest first."""
+    chunk_size = chunk_size or _chunk_size()
+    base = Order.objects.filter(restaurant_id=restaurant_id, placed_at__gte=start, placed_at__lt=end)
+    cursor = None
+    while True:
+        page = base
+        if cursor is not None:
+            placed_at, pk = cursor
+            page = page.filter(Q(placed_at__gt=placed_at) | Q(placed_at=placed_at, pk__gt=pk))
+        orders = list(page.order_by("placed_at", "id").values_list(*ORDER_FIELDS)[:chunk_size])
+        if not orders:
+            return
+
+        items = {}
+        rows = (
+            OrderItem.objects.filter(order_id__in=[order[0] for order in orders])
+            .order_by("order_id", "id")
+            .values_list("order_id", *ITEM_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+        for order_id, *item in rows:
+            items.setdefault(order_id, []).append(item)
+        for order in orders:
+            yield order, items.get(order[0], ())
+
+        if len(orders) < chunk_size:
+            return
+        cursor = (orders[-1][1], orders[-1][0])
+
+
+def _format(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def csv_rows(orders):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    empty = [""] * len(ITEM_FIELDS)
+    for order, items in orders:
+        head = [_format(v) for v in order]
+        if not items:
+            yield writer.writerow(head + empty)
+        for item in items:
+            yield writer.writerow(head + [_format(v) for v in item])
+
+
+def jsonl_rows(orders):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for order, items in orders:
+        record = dict(zip(ORDER_FIELDS, order))
+        record["items"] = [dict(zip(ITEM_FIELDS, item)) for item in items]
+        yield encoder.encode(record) + "\n"
+
+
+def export_rows(file_format, restaurant_id, start, end, chunk_size=None):
+    rows = csv_rows if file_format == "csv" else jsonl_rows
+    return rows(iter_orders(restaurant_id, start, end, chunk_size))
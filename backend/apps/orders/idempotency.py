@@ -0,0 +1,165 @@
+"""
+Idempotency-Key support for non-idempotent POST endpoints.
+
+The first request with a given key claims an IdempotencyKey row (a committed
+INSERT guarded by a unique constraint), runs the handler, and stores the
+response in the same transaction as the handler's writes. Retries with the
+same key and body get the stored response back; concurrent duplicates wait
+for the first execution to finish instead of running the work again.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def _ttl():
+    return timedelta(hours=getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
+
+def _wait_seconds():
+    return getattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 10)
+
+
+def _lock_timeout():
+    # A claim older than this belongs to a worker that died mid-request.
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", 60))
+
+
+def fingerprint(request, endpoint):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f"{endpoint}\n{body}".encode()).hexdigest()
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    response[REPLAY_HEADER] = "true"
+    return response
+
+
+def _claim(user, key, endpoint, request_hash, attempts=3):
+    """
+    Return (record, owned). `owned` is False when another request got there
+    first; record is None if that request's key kept vanishing (it failed
+    and released the key) before it could be read.
+    """
+    for _ in range(attempts):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, endpoint=endpoint, request_hash=request_hash,
+                    locked_at=now, expires_at=now + _ttl(),
+                )
+            return record, True
+        except IntegrityError:
+            pass
+        try:
+            record = IdempotencyKey.objects.get(user=user, key=key, endpoint=endpoint)
+            break
+        except IdempotencyKey.DoesNotExist:
+            continue  # released between our INSERT and this read; claim again
+    else:
+        return None, False
+
+    if record.status == IdempotencyKey.Status.IN_PROGRESS and record.locked_at < now - _lock_timeout():
+        # Take over an abandoned claim; the conditional UPDATE lets only one retry win.
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, status=IdempotencyKey.Status.IN_PROGRESS, locked_at=record.locked_at,
+        ).update(locked_at=now, request_hash=request_hash)
+        if taken:
+            record.locked_at, record.request_hash = now, request_hash
+            return record, True
+    return record, False
+
+
+def _in_progress():
+    response = Response({"detail": "A request with this key is still in progress."},
+                        status=status.HTTP_409_CONFLICT)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _wait_for(record):
+    deadline = time.monotonic() + _wait_seconds()
+    delay = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        try:
+            record.refresh_from_db()
+        except IdempotencyKey.DoesNotExist:
+            return None  # the first request failed and released the key
+        if record.status == IdempotencyKey.Status.COMPLETED:
+            return record
+    return None
+
+
+def idempotent(request, endpoint, handler):
+    """
+    Run `handler() -> Response` at most once per (user, endpoint, Idempotency-Key).
+    Requests without the header run the handler directly.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    request_hash = fingerprint(request, endpoint)
+    record, owned = _claim(request.user, key, endpoint, request_hash)
+
+    if record is None:
+        return _in_progress()
+    if not owned:
+        if record.request_hash != request_hash:
+            return Response({"detail": f"{HEADER} was already used with a different request."},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record.status != IdempotencyKey.Status.COMPLETED:
+            record = _wait_for(record)
+            if record is None:
+                return _in_progress()
+        return _replay(record)
+
+    try:
+        with transaction.atomic():
+            response = handler()
+            # Stored in the handler's transaction: the order and its replayable
+            # response commit (or roll back) together.
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status=IdempotencyKey.Status.COMPLETED,
+                response_status=response.status_code,
+                response_body=response.data,
+            )
+    except Exception:
+        IdempotencyKey.objects.filter(pk=record.pk, status=IdempotencyKey.Status.IN_PROGRESS).delete()
+        raise
+    return response
+
+
+def sweep_expired(batch_size=1000, now=None):
+    """Delete expired keys in id batches; yields the number removed per batch."""
+    now = now or timezone.now()
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lt=now)
+            .order_by("expires_at").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        deleted, _ = IdempotencyKey.objects.filter(pk__in=ids).delete()
+        yield deleted
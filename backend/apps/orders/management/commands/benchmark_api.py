@@ -0,0 +1,266 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.accounts.tokens import issue_tokens
+from apps.menu import search
+from apps.menu.cache import get_cache as get_menu_cache
+from apps.menu.geo import cell_for
+from apps.menu.models import MenuItem, Restaurant
+from apps.menu.price_index import clear_price_index
+from apps.orders.models import Order, OrderItem, Payment
+
+WORDS = ("pho", "taco", "ramen", "curry", "pizza", "burger", "salad", "sushi", "noodle", "dumpling",
+         "spicy", "grilled", "crispy", "vegan", "classic", "house", "garlic", "lemon", "smoky", "sweet")
+CATEGORIES = ("Mains", "Starters", "Drinks", "Desserts", "Sides")
+CENTER = (45.5017, -73.5673)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic restaurants, menus, users and order history in bulk, drive "
+        "the real URLconf through the test client, and report p50/p95/p99 latency, "
+        "throughput and SQL queries per endpoint. All data is rolled back. "
+        "Writes JSON that can be diffed (or --compare'd) between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=200)
+        parser.add_argument("--items", type=int, default=30, help="Menu items per restaurant.")
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--orders", type=int, default=20_000, help="Historical orders.")
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per endpoint.")
+        parser.add_argument("--only", nargs="*", default=None, metavar="ENDPOINT",
+                            help="Run only these endpoint names.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="benchmark-results.json")
+        parser.add_argument("--compare", default=None, metavar="PREVIOUS_JSON",
+                            help="Print p50/p99/query deltas against an earlier results file.")
+
+    def handle(self, *args, **opts):
+        previous = None
+        if opts["compare"]:
+            try:
+                previous = json.loads(Path(opts["compare"]).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {opts['compare']}: {exc}")
+
+        results = None
+        try:
+            # The test client runs in this thread, so it sees the uncommitted seed.
+            # Throttling is off: the benchmark measures handlers, not 429s.
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=["testserver"], THROTTLE_RATES={}):
+                results = self.run(**opts)
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            # Nothing seeded may outlive the rollback in process-level caches.
+            get_menu_cache().clear()
+            clear_price_index()
+
+        Path(opts["output"]).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        self.stdout.write(f"Wrote {opts['output']} (seed data rolled back).")
+        if previous:
+            self.compare(previous, results)
+
+    # ---- Seeding ----
+
+    def seed(self, rng, restaurants, items, users, orders):
+        now = timezone.now()
+        User.objects.bulk_create(
+            User(email=f"bench-user-{i}@example.com", password="!", role=User.CUSTOMER) for i in range(users)
+        )
+        User.objects.bulk_create(
+            User(email=f"bench-owner-{i}@example.com", password="!", role=User.STAFF)
+            for i in range(max(1, restaurants // 10))
+        )
+        diners = list(User.objects.filter(email__startswith="bench-user-"))
+        owners = list(User.objects.filter(email__startswith="bench-owner-"))
+
+        batch = []
+        for i in range(restaurants):
+            lat = round(CENTER[0] + rng.uniform(-0.5, 0.5), 6)
+            lon = round(CENTER[1] + rng.uniform(-0.5, 0.5), 6)
+            batch.append(Restaurant(
+                owner_user=owners[i % len(owners)], name=f"{rng.choice(WORDS).title()} Bench {i}",
+                cuisine_type=rng.choice(WORDS), latitude=lat, longitude=lon,
+                geo_cell=cell_for(lat, lon),  # bulk_create skips save()
+            ))
+        Restaurant.objects.bulk_create(batch, batch_size=1000)
+        venues = list(Restaurant.objects.filter(name__contains=" Bench ").order_by("id"))
+
+        MenuItem.objects.bulk_create(
+            (MenuItem(restaurant=r, name=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {n}",
+                      description=" ".join(rng.choices(WORDS, k=6)), category=rng.choice(CATEGORIES),
+                      price=Decimal(rng.randrange(300, 3000)) / 100)
+             for r in venues for n in range(items)),
+            batch_size=2000,
+        )
+        menu = {}
+        for item in MenuItem.objects.filter(restaurant__in=venues).order_by("id"):
+            menu.setdefault(item.restaurant_id, []).append(item)
+        search.index_many(venues, [item for items_ in menu.values() for item in items_])
+
+        statuses = [s for s, _ in Order.Status.choices]
+        history = Order.objects.bulk_create(
+            (Order(user=rng.choice(diners), restaurant=rng.choice(venues), status=rng.choice(statuses),
+                   subtotal=Decimal("20.00"), total_amount=Decimal("20.00"), pickup_code=f"B{i}")
+             for i in range(orders)),
+            batch_size=2000,
+        )
+        if not history or history[0].pk is None:  # backends that don't return pks
+            history = list(Order.objects.filter(pickup_code__startswith="B", restaurant__in=venues))
+        lines = []
+        for order in history:
+            for item in rng.sample(menu[order.restaurant_id], k=min(2, len(menu[order.restaurant_id]))):
+                lines.append(OrderItem(order=order, menu_item=item, item_name=item.name,
+                                       unit_price=item.price, quantity=1, line_total=item.price))
+        OrderItem.objects.bulk_create(lines, batch_size=5000)
+        Payment.objects.bulk_create((Payment(order=o, amount=o.total_amount) for o in history), batch_size=5000)
+        self.stdout.write(
+            f"Seeded {len(venues)} restaurants, {sum(map(len, menu.values()))} menu items, "
+            f"{len(diners)} users, {len(history)} orders in {(timezone.now() - now).total_seconds():.1f}s"
+        )
+        return diners, owners, venues, menu
+
+    # ---- Scenarios ----
+
+    def scenarios(self, rng, diners, venues, menu):
+        def auth(user):
+            return {"HTTP_AUTHORIZATION": f"Bearer {issue_tokens(user).access_token}"}
+
+        diner_auth = [auth(u) for u in diners[:50]]
+        owner_auth = {r.owner_user_id: auth(r.owner_user) for r in venues}
+
+        def place():
+            venue = rng.choice(venues)
+            item = rng.choice(menu[venue.pk])
+            body = {"restaurant_id": venue.pk, "items": [{"menu_item_id": item.pk, "quantity": 2}]}
+            return "post", "/api/orders/place/", {"data": json.dumps(body), "content_type": "application/json",
+                                                  **rng.choice(diner_auth)}
+
+        return {
+            # The listing embeds every restaurant's menu; ?fields= without "menu" skips it.
+            "menu.restaurants.list": lambda: ("get", "/api/menu/restaurants/", {}),
+            "menu.restaurants.list_sparse": lambda: (
+                "get", "/api/menu/restaurants/?page_size=20&fields=id,name,cuisine_type,rating", {}),
+            "menu.restaurants.nearby": lambda: (
+                "get", f"/api/menu/restaurants/?lat={CENTER[0] + rng.uniform(-0.3, 0.3):.5f}"
+                       f"&lon={CENTER[1] + rng.uniform(-0.3, 0.3):.5f}&radius_km=5", {}),
+            "menu.restaurants.detail": lambda: ("get", f"/api/menu/restaurants/{rng.choice(venues).pk}/", {}),
+            "menu.items.list": lambda: ("get", f"/api/menu/restaurants/{rng.choice(venues).pk}/menu/", {}),
+            "menu.search": lambda: ("get", f"/api/menu/search/?q={rng.choice(WORDS)}", {}),
+            "orders.list": lambda: ("get", "/api/orders/", rng.choice(diner_auth)),
+            "orders.list_sparse": lambda: ("get", "/api/orders/?fields=id,status,total_amount",
+                                           rng.choice(diner_auth)),
+            "orders.place": place,
+            "orders.restaurant_feed": lambda: (
+                lambda venue: ("get", f"/api/orders/feed/restaurant/{venue.pk}/", owner_auth[venue.owner_user_id])
+            )(rng.choice(venues)),
+        }
+
+    def measure(self, client, make_request, count, warmup):
+        for _ in range(warmup):
+            method, path, extra = make_request()
+            getattr(client, method)(path, **extra)
+
+        latencies, queries, statuses = [], [], {}
+        started = time.perf_counter()
+        for _ in range(count):
+            method, path, extra = make_request()
+            reset_queries()
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                response = getattr(client, method)(path, **extra)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            queries.append(len(ctx.captured_queries))
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        elapsed = time.perf_counter() - started
+
+        ordered = sorted(latencies)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3)
+
+        return {
+            "requests": count,
+            "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99),
+            "mean_ms": round(statistics.mean(latencies), 3),
+            "throughput_rps": round(count / elapsed, 1),
+            "queries": {"min": min(queries), "max": max(queries), "mean": round(statistics.mean(queries), 2)},
+            "status_codes": statuses,
+        }
+
+    def run(self, restaurants, items, users, orders, requests, warmup, only, seed, **_):
+        rng = random.Random(seed)
+        diners, owners, venues, menu = self.seed(rng, restaurants, items, users, orders)
+        get_menu_cache().clear()
+        clear_price_index()
+
+        client = Client()
+        endpoints = {}
+        for name, make_request in self.scenarios(rng, diners, venues, menu).items():
+            if only and name not in only:
+                continue
+            endpoints[name] = result = self.measure(client, make_request, requests, warmup)
+            self.stdout.write(
+                f"{name:34} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f}  "
+                f"p99 {result['p99_ms']:8.2f}  {result['throughput_rps']:8.1f} req/s  "
+                f"queries {result['queries']['mean']:5.1f}  {result['status_codes']}"
+            )
+
+        return {
+            "meta": {
+                "commit": self.commit(),
+                "timestamp": timezone.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "debug": settings.DEBUG,
+                "scale": {"restaurants": restaurants, "items_per_restaurant": items, "users": users,
+                          "orders": orders, "requests": requests, "seed": seed},
+            },
+            "endpoints": endpoints,
+        }
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, cwd=settings.BASE_DIR, timeout=5).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def compare(self, previous, current):
+        self.stdout.write(f"\nvs {previous['meta'].get('commit')} ({previous['meta'].get('timestamp')}):")
+        for name, now in current["endpoints"].items():
+            before = previous.get("endpoints", {}).get(name)
+            if not before:
+                self.stdout.write(f"{name:34} (new)")
+                continue
+            deltas = []
+            for key in ("p50_ms", "p99_ms"):
+                change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+                deltas.append(f"{key[:-3]} {before[key]:.2f} -> {now[key]:.2f} ms ({change:+.0f}%)")
+            deltas.append(f"queries {before['queries']['mean']} -> {now['queries']['mean']}")
+            self.stdout.write(f"{name:34} " + ", ".join(deltas))
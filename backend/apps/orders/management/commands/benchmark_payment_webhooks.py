@@ -0,0 +1,164 @@
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from apps.accounts.models import User
+from apps.menu.models import Restaurant
+from apps.orders.models import Order, Payment, PaymentWebhookEvent
+from apps.orders.webhooks import apply_webhook_events, payment_webhook, sign
+
+SECRET = "whsec_benchmark"
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Push N signed webhook events (shuffled, with redeliveries) through the "
+        "receiver, apply them with the batch consumer, replay everything, check "
+        "the final payment states, then roll back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=10_000)
+        parser.add_argument("--payments", type=int, default=2_000)
+        parser.add_argument("--duplicate-rate", type=float, default=0.2)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic(), override_settings(PAYMENT_WEBHOOK_SECRETS={"STRIPE": SECRET}):
+                self.run(**opts)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Rolled back benchmark data.")
+
+    def seed_payments(self, count):
+        user = User.objects.create_user(email=f"webhook-bench-{time.time_ns()}@example.com")
+        restaurant = Restaurant.objects.create(owner_user=user, name="Webhook benchmark")
+        Order.objects.bulk_create(
+            Order(user=user, restaurant=restaurant, total_amount=Decimal("10.00"), pickup_code=f"WB{i}")
+            for i in range(count)
+        )
+        order_ids = Order.objects.filter(restaurant=restaurant).values_list("id", flat=True)
+        Payment.objects.bulk_create(
+            Payment(order_id=pk, amount=Decimal("10.00"), transaction_id=f"pi_bench_{pk}")
+            for pk in order_ids
+        )
+        return list(Payment.objects.filter(order__restaurant=restaurant))
+
+    def lifecycle(self, rng, payment, clock):
+        """Realistic per-payment history with increasing provider timestamps."""
+        steps = []
+        if rng.random() < 0.1:
+            steps.append("payment_intent.payment_failed")
+        steps.append("payment_intent.succeeded")
+        if rng.random() < 0.1:
+            steps.append("charge.refunded")
+        events = []
+        for i, kind in enumerate(steps):
+            obj = ({"object": "charge", "id": f"ch_{payment.pk}", "payment_intent": payment.transaction_id}
+                   if kind == "charge.refunded" else
+                   {"object": "payment_intent", "id": payment.transaction_id,
+                    "metadata": {"payment_id": payment.pk}})
+            events.append({"id": f"evt_{payment.pk}_{i}", "type": kind, "created": clock + i * 5,
+                           "data": {"object": obj}})
+        expected = {"payment_intent.payment_failed": "FAILED", "payment_intent.succeeded": "PAID",
+                    "charge.refunded": "REFUNDED"}[steps[-1]]
+        return events, expected
+
+    def run(self, events, payments, duplicate_rate, batch_size, seed, **_):
+        rng = random.Random(seed)
+        seeded = self.seed_payments(payments)
+        clock = int(time.time()) - 3600
+
+        unique, expected = [], {}
+        for payment in seeded:
+            history, expected[payment.pk] = self.lifecycle(rng, payment, clock)
+            unique += history
+        # Redeliveries of random events, then everything shuffled (out of order).
+        deliveries = unique + [rng.choice(unique) for _ in range(int(len(unique) * duplicate_rate))]
+        rng.shuffle(deliveries)
+        deliveries = (deliveries * (events // len(deliveries) + 1))[:events]
+        bodies = [json.dumps(e).encode() for e in deliveries]
+
+        factory = RequestFactory()
+        stamp = int(time.time())
+
+        def push(all_bodies):
+            latencies = []
+            for body in all_bodies:
+                request = factory.post("/api/orders/payments/webhook/stripe/", body,
+                                       content_type="application/json",
+                                       headers={"Stripe-Signature": sign(body, SECRET, stamp)})
+                t0 = time.perf_counter()
+                response = payment_webhook(request, "stripe")
+                latencies.append((time.perf_counter() - t0) * 1000)
+                assert response.status_code == 200, response.content
+            return latencies
+
+        t0 = time.perf_counter()
+        latencies = push(bodies)
+        ingest_secs = time.perf_counter() - t0
+        stored = PaymentWebhookEvent.objects.filter(event_id__startswith="evt_").count()
+        self.stdout.write(
+            f"ingest: {len(bodies)} deliveries in {ingest_secs:.2f}s ({len(bodies) / ingest_secs:.0f}/s), "
+            f"p50 {self._pct(latencies, 50):.2f} ms, p99 {self._pct(latencies, 99):.2f} ms; "
+            f"{stored} unique events stored"
+        )
+
+        def consume():
+            applied = updated = batches = 0
+            queries = []
+            started = time.perf_counter()
+            while True:
+                reset_queries()  # keep the capped debug query log from wrapping
+                with CaptureQueriesContext(connection) as ctx:
+                    result = apply_webhook_events(batch_size)
+                if not result["events"] and not result["unmatched"]:
+                    break
+                batches += 1
+                applied += result["events"]
+                updated += result["updated"]
+                queries.append(len(ctx.captured_queries))
+            return applied, updated, batches, queries, time.perf_counter() - started
+
+        applied, updated, batches, queries, secs = consume()
+        self.stdout.write(
+            f"consume: {applied} events in {batches} batches, {secs:.2f}s ({applied / max(secs, 1e-9):.0f}/s), "
+            f"{updated} payment updates, {statistics.mean(queries):.1f} queries per batch"
+        )
+
+        # Replay: every delivery again (all duplicates), then re-apply from the start.
+        push(bodies)
+        PaymentWebhookEvent.objects.filter(event_id__startswith="evt_").update(applied_at=None)
+        replayed, changed, *_ = consume()
+
+        final = dict(Payment.objects.filter(pk__in=expected).values_list("pk", "status"))
+        mismatches = sum(final[pk] != status for pk, status in expected.items())
+        # No history cancels its intent, so every order must still be open.
+        failed_orders = Order.objects.filter(
+            pk__in=[p.order_id for p in seeded], status=Order.Status.FAILED,
+        ).count()
+        style = self.style.SUCCESS if mismatches == failed_orders == changed == 0 else self.style.ERROR
+        self.stdout.write(style(
+            f"replay: {PaymentWebhookEvent.objects.filter(event_id__startswith='evt_').count() - stored} "
+            f"new rows from {len(bodies)} redeliveries, {replayed} events re-applied changing "
+            f"{changed} payments; {mismatches} of {len(expected)} payments differ from the expected final state, "
+            f"{failed_orders} orders wrongly FAILED"
+        ))
+
+    @staticmethod
+    def _pct(samples, pct):
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
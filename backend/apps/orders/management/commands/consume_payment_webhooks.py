@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.orders.models import PaymentWebhookEvent
+from apps.orders.webhooks import apply_webhook_events
+
+
+class Command(BaseCommand):
+    help = "Apply stored payment webhook events to Payment rows in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once caught up instead of polling forever.")
+        parser.add_argument("--rewind-to", type=int, default=None, metavar="EVENT_ID",
+                            help="Re-apply stored events after this id (safe: application is idempotent).")
+
+    def handle(self, *args, batch_size, poll_interval, once, rewind_to, **options):
+        if rewind_to is not None:
+            PaymentWebhookEvent.objects.filter(pk__gt=rewind_to).update(applied_at=None, retry_at=None)
+        totals = {"events": 0, "updated": 0, "unmatched": 0}
+        try:
+            while True:
+                result = apply_webhook_events(batch_size)
+                for key in totals:
+                    totals[key] += result[key]
+                if result["events"] or result["unmatched"]:
+                    continue
+                if once:
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied {totals['events']} events: {totals['updated']} payments updated, "
+            f"{totals['unmatched']} times an event named a payment not known yet (retried later)."
+        ))
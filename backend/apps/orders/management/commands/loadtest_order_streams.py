@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.accounts.models import User
+from apps.orders.events import get_broker, user_channel
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return float("nan")
+
+
+class _Client:
+    """Drives one SSE request against the ASGI app without a network socket."""
+
+    def __init__(self, app, path, token):
+        self.app = app
+        self.scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": f"token={token}".encode(), "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"accept", b"text/event-stream")],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        self.sent_request = False
+        self.disconnect = asyncio.Event()
+        self.connected = asyncio.Event()
+        self.events = 0
+        self.got_event = asyncio.Event()
+        self.status = None
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            if self.status != 200:
+                self.connected.set()  # rejected; don't wait for the stream
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            if body.startswith(b"retry:"):
+                self.connected.set()
+            elif b"event: order.status" in body:
+                self.events += 1
+                self.got_event.set()
+
+    async def run(self):
+        await self.app(self.scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = (
+        "Open N idle SSE order streams against the ASGI app in one event loop, "
+        "report memory per connection and broadcast fan-out latency, then disconnect."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=5000)
+        parser.add_argument("--broadcasts", type=int, default=5)
+
+    def handle(self, *args, connections, broadcasts, **options):
+        user = User.objects.create_user(email=f"sse-loadtest-{time.time_ns()}@example.com")
+        try:
+            token = str(AccessToken.for_user(user))
+            asyncio.run(self.run(user.pk, token, connections, broadcasts))
+        finally:
+            user.delete()
+
+    async def run(self, user_id, token, connections, broadcasts):
+        app = get_asgi_application()
+        broker = get_broker()
+        rss_before = _rss_mb()
+
+        clients = [_Client(app, "/api/orders/stream/", token) for _ in range(connections)]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(c.run()) for c in clients]
+        await asyncio.wait_for(asyncio.gather(*(c.connected.wait() for c in clients)), timeout=600)
+        open_secs = time.perf_counter() - started
+        rejected = [c.status for c in clients if c.status != 200]
+        if rejected:
+            for c in clients:
+                c.disconnect.set()
+            await asyncio.wait(tasks, timeout=60)
+            raise CommandError(
+                f"{len(rejected)} streams were rejected with HTTP {rejected[0]} "
+                "(is 'localhost' in ALLOWED_HOSTS?)"
+            )
+        rss_open = _rss_mb()
+        self.stdout.write(
+            f"{connections} streams open in {open_secs:.1f}s; "
+            f"{broker.subscriber_count()} subscribers; RSS {rss_before:.0f} -> {rss_open:.0f} MB "
+            f"(~{(rss_open - rss_before) * 1024 / connections:.1f} KB per idle connection)"
+        )
+
+        # Idle: nothing happens until the keepalive interval.
+        await asyncio.sleep(1)
+
+        latencies = []
+        for i in range(broadcasts):
+            for c in clients:
+                c.got_event.clear()
+            t0 = time.perf_counter()
+            delivered = broker.publish(user_channel(user_id), f'{{"id": {i}, "status": "PREPARING"}}')
+            await asyncio.gather(*(c.got_event.wait() for c in clients))
+            latencies.append((time.perf_counter() - t0) * 1000)
+            self.stdout.write(f"broadcast {i + 1}: {delivered} deliveries in {latencies[-1]:.1f} ms")
+
+        for c in clients:
+            c.disconnect.set()
+        await asyncio.wait(tasks, timeout=60)
+        self.stdout.write(self.style.SUCCESS(
+            f"Fan-out to {connections} idle streams: best {min(latencies):.1f} ms, "
+            f"worst {max(latencies):.1f} ms; {broker.subscriber_count()} subscribers left after disconnect."
+        ))
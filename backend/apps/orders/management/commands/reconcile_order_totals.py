@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.orders.models import Order, ORDER_TAX_RATE
+
+CENT = Decimal("0.01")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Order subtotal/tax/total from OrderItem line totals in batches "
+        "and report orders whose stored totals have drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--fix", action="store_true",
+                            help="Write recomputed totals for drifted orders.")
+        parser.add_argument("--verbose-drift", action="store_true",
+                            help="Print every drifted order, not just the summary.")
+
+    def handle(self, *args, batch_size, fix, verbose_drift, **options):
+        scanned = drifted = 0
+        drift_sum = Decimal("0.00")
+        last_id = 0
+
+        while True:
+            # Keyset scan on id so each batch costs the same regardless of depth.
+            batch = list(
+                Order.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .annotate(items_subtotal=Coalesce(
+                    Sum("items__line_total"),
+                    Value(Decimal("0.00")),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ))
+                .only("id", "subtotal", "tax", "total_amount")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            scanned += len(batch)
+
+            to_fix = []
+            for order in batch:
+                subtotal = Decimal(order.items_subtotal).quantize(CENT)
+                tax = (subtotal * ORDER_TAX_RATE).quantize(CENT)
+                total = (subtotal + tax).quantize(CENT)
+                if (order.subtotal, order.tax, order.total_amount) == (subtotal, tax, total):
+                    continue
+                drifted += 1
+                drift_sum += abs(order.total_amount - total)
+                if verbose_drift:
+                    self.stdout.write(
+                        f"Order #{order.pk}: stored total {order.total_amount}, expected {total}"
+                    )
+                order.subtotal, order.tax, order.total_amount = subtotal, tax, total
+                to_fix.append(order)
+
+            if fix and to_fix:
+                with transaction.atomic():
+                    Order.objects.bulk_update(to_fix, ["subtotal", "tax", "total_amount"])
+
+        verb = "fixed" if fix else "found"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} orders; {verb} {drifted} with drifted totals "
+            f"(absolute drift {drift_sum})."
+        ))
@@ -0,0 +1,74 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.orders import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver outbox events (order/payment side effects) in batches on a thread pool, "
+        "retrying failures with backoff, and report throughput and lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="Seconds to sleep when no event is due.")
+        parser.add_argument("--lease-seconds", type=int, default=60,
+                            help="How long a claimed batch is reserved before another worker may retry it.")
+        parser.add_argument("--stats-every", type=float, default=30.0,
+                            help="Seconds between metrics lines.")
+        parser.add_argument("--retain-hours", type=float, default=24.0,
+                            help="Delete delivered events older than this while idle.")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once no event is due instead of polling forever.")
+
+    def handle(self, *args, batch_size, threads, poll_interval, lease_seconds, stats_every,
+               retain_hours, once, **options):
+        worker_id = outbox.new_worker_id()
+        totals = {"delivered": 0, "failed": 0}
+        window = {"delivered": 0, "failed": 0, "lags": [], "started": time.monotonic()}
+
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="outbox") as executor:
+            try:
+                while True:
+                    result = outbox.process_batch(worker_id, executor, batch_size, lease_seconds)
+                    for key in ("delivered", "failed"):
+                        totals[key] += result[key]
+                        window[key] += result[key]
+                    window["lags"] += result["lags"]
+
+                    if time.monotonic() - window["started"] >= stats_every:
+                        self.report(window)
+                        window = {"delivered": 0, "failed": 0, "lags": [], "started": time.monotonic()}
+
+                    if not result["claimed"]:
+                        if once:
+                            break
+                        outbox.purge_delivered(timedelta(hours=retain_hours))
+                        time.sleep(poll_interval)
+            except KeyboardInterrupt:
+                pass
+
+        if window["delivered"] or window["failed"]:
+            self.report(window)
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker {worker_id[:8]} delivered {totals['delivered']} events, "
+            f"{totals['failed']} attempts failed."
+        ))
+
+    def report(self, window):
+        elapsed = max(time.monotonic() - window["started"], 1e-9)
+        lags = sorted(window["lags"])
+        lag = (f"lag p50 {statistics.median(lags):.2f}s max {lags[-1]:.2f}s" if lags else "lag n/a")
+        backlog = outbox.stats()
+        self.stdout.write(
+            f"{window['delivered'] / elapsed:.1f} events/s, {window['failed']} failed, {lag}; "
+            f"backlog {backlog['pending']} pending (oldest {backlog['oldest_pending_age_seconds']:.1f}s), "
+            f"{backlog['failed']} dead"
+        )
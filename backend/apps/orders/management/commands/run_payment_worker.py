@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apps.orders import outbox
+from apps.orders.payments import ProviderPool, process_payment_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Create provider payment intents for PENDING payments in batches, "
+        "with per-provider concurrency limits (settings.PAYMENT_PROVIDERS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--threads", type=int, default=16,
+                            help="Pool size; each provider is further capped by its CONCURRENCY.")
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument("--lease-seconds", type=int, default=120)
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once no payment is due instead of polling forever.")
+
+    def handle(self, *args, batch_size, threads, poll_interval, lease_seconds, once, **options):
+        pool = ProviderPool()
+        worker_id = outbox.new_worker_id()
+        totals = {"claimed": 0, "created": 0, "retrying": 0, "failed": 0}
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="payments") as executor:
+            try:
+                while True:
+                    result = process_payment_batch(pool, executor, worker_id, batch_size, lease_seconds)
+                    for key in totals:
+                        totals[key] += result[key]
+                    if result["claimed"]:
+                        self.stdout.write(
+                            f"batch of {result['claimed']}: {result['created']} intents, "
+                            f"{result['retrying']} retrying, {result['failed']} failed"
+                        )
+                    elif once:
+                        break
+                    else:
+                        time.sleep(poll_interval)
+            except KeyboardInterrupt:
+                pass
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['created']} intents created, {totals['retrying']} retries scheduled, "
+            f"{totals['failed']} payments failed in {elapsed:.1f}s "
+            f"({totals['claimed'] / max(elapsed, 1e-9):.1f} payments/s)."
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.orders.idempotency import sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key records in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.0,
+                            help="Seconds to sleep between batches to limit lock pressure.")
+
+    def handle(self, *args, batch_size, pause, **options):
+        total = batches = 0
+        for deleted in sweep_expired(batch_size=batch_size):
+            total += deleted
+            batches += 1
+            if pause:
+                time.sleep(pause)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} expired keys in {batches} batches."))
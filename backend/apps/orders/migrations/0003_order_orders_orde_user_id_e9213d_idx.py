@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0010_remove_menuitem_menu_menuit_restaur_fa3149_idx_and_more'),
+        ('orders', '0002_orderitem_image_url'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-placed_at', '-id'], name='orders_orde_user_id_e9213d_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0012_restaurant_location'),
+        ('orders', '0004_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'updated_at', 'id'], name='orders_orde_restaur_d86235_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=36),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='intent_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'transaction_id', 'id'], name='orders_paym_status_f1b359_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:07
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_payment_claimed_by_payment_intent_attempts_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='status_event_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='PaymentWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=24)),
+                ('event_id', models.CharField(max_length=255)),
+                ('event_type', models.CharField(max_length=64)),
+                ('transaction_id', models.CharField(blank=True, max_length=255)),
+                ('occurred_at', models.DateTimeField()),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'event_id'), name='uniq_webhook_event_per_provider')],
+            },
+        ),
+    ]
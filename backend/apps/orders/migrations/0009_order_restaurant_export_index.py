@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0013_restaurant_external_id'),
+        ('orders', '0008_webhookcheckpoint_payment_status_event_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'placed_at', 'id'], name='orders_orde_restaur_f40360_idx'),
+        ),
+    ]
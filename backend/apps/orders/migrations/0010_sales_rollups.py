@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:25
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0013_restaurant_external_id'),
+        ('orders', '0009_order_restaurant_export_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='menu.menuitem')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_sales', to='menu.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['restaurant', 'day'], name='orders_menu_restaur_e281c0_idx')],
+                'constraints': [models.UniqueConstraint(fields=('menu_item', 'day'), name='uniq_daily_sales_per_menu_item')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RestaurantHourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('prepared', models.PositiveIntegerField(default=0)),
+                ('prep_seconds', models.FloatField(default=0)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_sales', to='menu.restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'hour'), name='uniq_hourly_sales_per_restaurant')],
+            },
+        ),
+    ]
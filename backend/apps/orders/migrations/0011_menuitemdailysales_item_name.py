@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_item_names(apps, schema_editor):
+    MenuItem = apps.get_model("menu", "MenuItem")
+    MenuItemDailySales = apps.get_model("orders", "MenuItemDailySales")
+    MenuItemDailySales.objects.update(item_name=models.Subquery(
+        MenuItem.objects.filter(pk=models.OuterRef("menu_item_id")).values("name")[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0013_restaurant_external_id'),
+        ('orders', '0010_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitemdailysales',
+            name='item_name',
+            field=models.CharField(default='', max_length=180),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_item_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='menuitemdailysales',
+            name='menu_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_sales', to='menu.menuitem'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+def mark_finished_orders(apps, schema_editor):
+    # Finished orders are already in the rollups (or will be by backfill_sales_rollups).
+    Order = apps.get_model("orders", "Order")
+    Order.objects.filter(status__in=["PICKED_UP", "CANCELLED"]).update(rolled_up=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_menuitemdailysales_item_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='rolled_up',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_finished_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:36
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_checkpointed_events(apps, schema_editor):
+    # Events up to the old "payments" checkpoint were applied already.
+    WebhookCheckpoint = apps.get_model("orders", "WebhookCheckpoint")
+    PaymentWebhookEvent = apps.get_model("orders", "PaymentWebhookEvent")
+    last = WebhookCheckpoint.objects.filter(name="payments").values_list("last_event_id", flat=True).first()
+    if last:
+        PaymentWebhookEvent.objects.filter(pk__lte=last).update(applied_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_order_rolled_up'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentwebhookevent',
+            name='applied_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymentwebhookevent',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='paymentwebhookevent',
+            index=models.Index(fields=['applied_at', 'id'], name='orders_paym_applied_ef240b_idx'),
+        ),
+        migrations.RunPython(mark_checkpointed_events, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='WebhookCheckpoint',
+        ),
+    ]
@@ -1,10 +1,19 @@
-from django.db import models
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from apps.menu.models import Restaurant, MenuItem
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 from decimal import Decimal
+from .events import publish_order_status, STATUS_FIELDS
+
+# Applied by the incremental totals receiver, place_order and reconcile_order_totals.
+ORDER_TAX_RATE = Decimal("0.00")
 
 class Order(models.Model):
     class Status(models.TextChoices):
@@ -15,6 +24,20 @@ class Order(models.Model):
         CANCELLED = "CANCELLED", "Cancelled"
         FAILED = "FAILED", "Failed"
 
+    # Legal status moves: target -> source states it may be reached from.
+    TRANSITIONS = {
+        Status.PREPARING: (Status.PENDING,),
+        Status.READY_FOR_PICKUP: (Status.PREPARING,),
+        Status.PICKED_UP: (Status.READY_FOR_PICKUP,),
+        Status.CANCELLED: (Status.PENDING, Status.PREPARING),
+        Status.FAILED: (Status.PENDING,),  # payment could not be set up
+    }
+    # Timestamp stamped when an order enters the status.
+    TRANSITION_TIMESTAMPS = {
+        Status.READY_FOR_PICKUP: "ready_at",
+        Status.PICKED_UP: "picked_up_at",
+    }
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.RESTRICT,
                              related_name="orders")
@@ -37,6 +60,18 @@ class Order(models.Model):
 
     placed_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the order is first added to the sales rollups (apps/orders/rollups.py)
+    rolled_up = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            # order history keyset: WHERE user = ? ORDER BY placed_at DESC, id DESC
+            models.Index(fields=["user", "-placed_at", "-id"]),
+            # restaurant feed keyset: WHERE restaurant = ? AND (updated_at, id) > cursor
+            models.Index(fields=["restaurant", "updated_at", "id"]),
+            # restaurant export keyset: WHERE restaurant = ? AND placed_at range AND (placed_at, id) > cursor
+            models.Index(fields=["restaurant", "placed_at", "id"]),
+        ]
 
     def __str__(self):
         return f"Order #{self.pk} - {self.restaurant.name}"
@@ -47,7 +82,7 @@ class Order(models.Model):
         if not self.pickup_code:
             self.pickup_code = get_random_string(8).upper()
 
-    def recalc_totals(self, tax_rate: Decimal = Decimal("0.00")):
+    def recalc_totals(self, tax_rate: Decimal = ORDER_TAX_RATE):
         """
         Recompute subtotal/tax/total from line items.
         Adjust tax_rate as you wish, e.g. Decimal('0.14975') for QC.
@@ -57,9 +92,34 @@ class Order(models.Model):
         total = (subtotal + tax).quantize(Decimal("0.01"))
         self.subtotal, self.tax, self.total_amount = subtotal, tax, total
 
+    @classmethod
+    def apply_totals_delta(cls, order_id, delta: Decimal, tax_rate: Decimal = ORDER_TAX_RATE):
+        """
+        Shift subtotal/tax/total by one line's change in a single atomic UPDATE.
+        Tax is rounded per delta, so with a non-zero rate totals can drift by
+        cents; `manage.py reconcile_order_totals` corrects that.
+        """
+        if not delta:
+            return
+        tax_delta = (delta * tax_rate).quantize(Decimal("0.01"))
+        cls.objects.filter(pk=order_id).update(
+            subtotal=F("subtotal") + delta,
+            tax=F("tax") + tax_delta,
+            total_amount=F("total_amount") + delta + tax_delta,
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get("status")
+        return instance
+
     def save(self, *args, **kwargs):
         self.ensure_pickup_code()
-        super().save(*args, **kwargs)
+        # Outbox rows written by post_save commit (or roll back) with the order.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order,
@@ -79,6 +139,18 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.item_name} x{self.quantity}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_totals_state()
+        return instance
+
+    def _remember_totals_state(self):
+        # What this row currently contributes to its order's totals, so a
+        # later save/delete can apply just the difference.
+        self._saved_order_id = self.__dict__.get("order_id")
+        self._saved_line_total = self.__dict__.get("line_total")
     
     def save(self, *args, **kwargs):
         # 1) same-restaurant guard (when menu_item provided)
@@ -106,18 +178,258 @@ class Payment(models.Model):
     status = models.CharField(max_length=24, choices=Status.choices, default=Status.PENDING)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, default="USD")
-    transaction_id = models.CharField(max_length=255, blank=True)
+    transaction_id = models.CharField(max_length=255, blank=True, db_index=True)  # webhook lookups
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # provider time of the webhook event that set `status`; older events are ignored
+    status_event_at = models.DateTimeField(null=True, blank=True)
+
+    # payment-intent worker bookkeeping (apps/orders/payments.py)
+    intent_attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=36, blank=True)
+
+    class Meta:
+        indexes = [
+            # worker claim: WHERE status = PENDING AND transaction_id = '' ORDER BY id
+            models.Index(fields=["status", "transaction_id", "id"]),
+        ]
 
     def __str__(self):
         return f"Payment for Order #{self.order_id} ({self.status})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+class OutboxEvent(models.Model):
+    """
+    A side effect of an Order/Payment change (receipt, notification, kitchen
+    printer...), written in the same transaction as the change and delivered
+    at least once by `manage.py run_outbox_worker`. Handlers must tolerate
+    seeing the same event id twice.
+    """
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        DELIVERED = "DELIVERED", "Delivered"
+        FAILED = "FAILED", "Failed"  # gave up after OUTBOX_MAX_ATTEMPTS
+
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)  # next attempt not before
+    locked_until = models.DateTimeField(null=True, blank=True)  # worker lease
+    claimed_by = models.CharField(max_length=36, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # worker claim: WHERE status = PENDING AND available_at <= now ORDER BY id
+            models.Index(fields=["status", "available_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.status})"
+
+    @classmethod
+    def order_payload(cls, order, **extra):
+        values = order if isinstance(order, dict) else {name: getattr(order, name) for name in STATUS_FIELDS}
+        return {name: values[name] for name in STATUS_FIELDS} | extra
+
+    @classmethod
+    def enqueue(cls, topic, payload):
+        """Record an event in the caller's transaction."""
+        return cls.objects.create(topic=topic, payload=payload)
     
+class PaymentWebhookEvent(models.Model):
+    """
+    A provider webhook event as received; the consumer (apps/orders/webhooks.py)
+    only stamps applied_at/retry_at. Redeliveries are dropped by the unique
+    (provider, event_id) constraint.
+    """
+    provider = models.CharField(max_length=24)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=64)
+    transaction_id = models.CharField(max_length=255, blank=True)
+    occurred_at = models.DateTimeField()  # provider's clock, orders late deliveries
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    received_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)  # NULL until the consumer is done with it
+    retry_at = models.DateTimeField(null=True, blank=True)  # set while its payment is unknown
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "event_id"], name="uniq_webhook_event_per_provider"),
+        ]
+        indexes = [
+            # consumer: WHERE applied_at IS NULL ORDER BY id
+            models.Index(fields=["applied_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id}"
+
+class IdempotencyKey(models.Model):
+    """
+    One client-supplied Idempotency-Key per user and endpoint. Holds the request
+    fingerprint and, once the first execution finishes, the response to replay.
+    """
+    class Status(models.TextChoices):
+        IN_PROGRESS = "IN_PROGRESS", "In progress"
+        COMPLETED = "COMPLETED", "Completed"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.IN_PROGRESS)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "endpoint", "key"],
+                name="uniq_idempotency_key_per_user_endpoint",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"]),  # batched sweeps
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} ({self.status})"
+
+class RestaurantHourlySales(models.Model):
+    """
+    Finished orders of one restaurant, bucketed by the hour they were placed.
+    Maintained by apps/orders/rollups.py; average prep time is
+    prep_seconds / prepared.
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="hourly_sales")
+    hour = models.DateTimeField()
+    orders = models.PositiveIntegerField(default=0)  # picked up
+    cancelled = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    prepared = models.PositiveIntegerField(default=0)  # picked-up orders with a ready_at
+    prep_seconds = models.FloatField(default=0)  # sum of ready_at - placed_at
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["restaurant", "hour"], name="uniq_hourly_sales_per_restaurant"),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant_id} @ {self.hour:%Y-%m-%d %H:00}"
+
+class MenuItemDailySales(models.Model):
+    """
+    Quantity and revenue of one menu item across picked-up orders placed on one
+    day. Deleting the item keeps its history: menu_item becomes NULL and the row
+    is identified by the item_name snapshot, as on OrderItem.
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="item_sales")
+    menu_item = models.ForeignKey(MenuItem, null=True, blank=True, on_delete=models.SET_NULL,
+                                  related_name="daily_sales")
+    item_name = models.CharField(max_length=180)  # snapshot
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["menu_item", "day"], name="uniq_daily_sales_per_menu_item"),
+        ]
+        indexes = [
+            # top items: WHERE restaurant = ? AND day BETWEEN ... GROUP BY menu_item
+            models.Index(fields=["restaurant", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.item_name} @ {self.day}"
+
+    # ---- Signals to push status changes to live streams and the outbox ----
+
+@receiver(post_save, sender=Order)
+def publish_status_change(sender, instance, created, **kwargs):
+    if created or getattr(instance, "_saved_status", None) != instance.status:
+        publish_order_status([instance])
+        if created:
+            OutboxEvent.enqueue("order.placed", OutboxEvent.order_payload(
+                instance, total_amount=instance.total_amount))
+        else:
+            OutboxEvent.enqueue("order.status_changed", OutboxEvent.order_payload(instance))
+            if instance.status in (Order.Status.PICKED_UP, Order.Status.CANCELLED):
+                from .rollups import record_orders  # rollups imports this module
+                record_orders([instance.pk])
+    instance._saved_status = instance.status
+
+@receiver(post_save, sender=Payment)
+def record_payment_status_change(sender, instance, created, **kwargs):
+    # A new payment is part of "order.placed"; later status moves are their own event.
+    if not created and getattr(instance, "_saved_status", None) != instance.status:
+        OutboxEvent.enqueue("payment.status_changed", {
+            "id": instance.pk, "order_id": instance.order_id, "status": instance.status,
+            "amount": instance.amount, "currency": instance.currency,
+            "transaction_id": instance.transaction_id,
+        })
+    instance._saved_status = instance.status
+
     # ---- Signals to keep Order totals in sync ----
 
+_totals_suppressed = ContextVar("orders_totals_suppressed", default=False)
+
+@contextmanager
+def suppress_total_updates():
+    """
+    Skip the per-line totals receiver inside the block. Callers that write
+    many lines at once are responsible for setting the Order totals themselves.
+    """
+    token = _totals_suppressed.set(True)
+    try:
+        yield
+    finally:
+        _totals_suppressed.reset(token)
+
 @receiver(post_save, sender=OrderItem)
+def apply_order_item_saved(sender, instance, created, **kwargs):
+    if _totals_suppressed.get():
+        return
+    old_order_id = None if created else getattr(instance, "_saved_order_id", None)
+    old_total = getattr(instance, "_saved_line_total", None) if old_order_id else None
+    if not created and old_total is None:
+        # Loaded with line_total deferred: fall back to a full recompute.
+        order = instance.order
+        order.recalc_totals()
+        order.save(update_fields=["subtotal", "tax", "total_amount", "updated_at"])
+    elif old_order_id == instance.order_id:
+        Order.apply_totals_delta(instance.order_id, instance.line_total - old_total)
+    else:
+        if old_order_id:
+            Order.apply_totals_delta(old_order_id, -old_total)
+        Order.apply_totals_delta(instance.order_id, instance.line_total)
+    instance._remember_totals_state()
+
 @receiver(post_delete, sender=OrderItem)
-def update_order_totals(sender, instance, **kwargs):
-    order = instance.order
-    order.recalc_totals(tax_rate=Decimal("0.00"))  # adjust if you want tax now
-    order.save(update_fields=["subtotal", "tax", "total_amount", "updated_at"])
+def apply_order_item_deleted(sender, instance, origin=None, **kwargs):
+    if _totals_suppressed.get():
+        return
+    # Cascading from the order itself: nothing left to keep in sync.
+    if isinstance(origin, Order) or getattr(origin, "model", None) is Order:
+        return
+    Order.apply_totals_delta(instance.order_id, -instance.line_total)
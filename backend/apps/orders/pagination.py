@@ -0,0 +1,56 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.pagination import IdCursorPagination
+
+
+class OrderCursorPagination(IdCursorPagination):
+    # Newest first; id breaks ties between orders placed in the same instant.
+    # Backed by the (user, placed_at, id) index on Order.
+    ordering = ("-placed_at", "-id")
+
+
+# ---- Restaurant order feed: tail orders by (updated_at, id) ----
+
+def encode_feed_cursor(updated_at, pk):
+    raw = f"{updated_at.isoformat()}|{pk}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_feed_cursor(cursor):
+    """Return (updated_at, id) or raise ValueError for a malformed cursor."""
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        stamp, pk = raw.split("|")
+        updated_at = datetime.fromisoformat(stamp)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("Invalid cursor.")
+    if timezone.is_naive(updated_at):
+        raise ValueError("Invalid cursor.")
+    return updated_at, pk
+
+
+def orders_changed_since(queryset, cursor, limit, settled_before=None):
+    """
+    Orders of `queryset` changed after `cursor` ((updated_at, id) or None),
+    oldest change first. A keyset range on the (restaurant, updated_at, id)
+    index, so every poll costs the same no matter how busy the day was.
+
+    updated_at is stamped before the writing transaction commits, so a
+    change can become visible after a later one was served. Changes newer
+    than `settled_before` are left for the next poll, which keeps the
+    cursor from moving past one that is still committing.
+    """
+    if cursor is not None:
+        updated_at, pk = cursor
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk)
+        )
+    if settled_before is not None:
+        queryset = queryset.filter(updated_at__lte=settled_before)
+    return list(queryset.order_by("updated_at", "id")[:limit])
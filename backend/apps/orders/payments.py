@@ -0,0 +1,236 @@
+"""
+Payment-intent creation off the request path.
+
+place_order only writes a PENDING Payment. `manage.py run_payment_worker`
+claims batches of PENDING payments that have no transaction_id yet, calls
+the provider from a thread pool (at most CONCURRENCY calls in flight per
+provider), then writes transaction ids, retry schedules and failures back
+with one bulk_update per batch. Provider calls use an idempotency key derived
+from the payment id, so re-running a batch whose lease expired never creates
+a second intent.
+
+Providers are configured with settings.PAYMENT_PROVIDERS:
+
+    {"STRIPE": {"BACKEND": "apps.orders.payments.StripeProvider",
+                "CONCURRENCY": 8, "OPTIONS": {"api_key": "sk_..."}}}
+
+FakeProvider answers locally with configurable latency and failure rate,
+so the whole pipeline can be exercised and load-tested offline.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Order, OutboxEvent, Payment
+from .services import transition_orders
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDERS = {
+    "STRIPE": {"BACKEND": "apps.orders.payments.FakeProvider", "CONCURRENCY": 8},
+}
+
+
+class ProviderError(Exception):
+    """A provider call failed. `retryable=False` means retrying cannot help."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Intent(NamedTuple):
+    transaction_id: str
+
+
+def amount_in_minor_units(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal("1")))
+
+
+class FakeProvider:
+    """Local stand-in for a card processor: sleeps, then returns a fake intent id."""
+
+    def __init__(self, latency_ms=50, jitter_ms=20, failure_rate=0.0, decline_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create_intent(self, payment, idempotency_key):
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+            roll = self._random.random()
+        time.sleep(delay / 1000)
+        if roll < self.decline_rate:
+            raise ProviderError("card_declined", retryable=False)
+        if roll < self.decline_rate + self.failure_rate:
+            raise ProviderError("provider timeout")
+        return Intent(f"pi_fake_{uuid.uuid5(uuid.NAMESPACE_URL, idempotency_key).hex[:24]}")
+
+
+class StripeProvider:
+    """Creates Stripe PaymentIntents; needs the `stripe` package and an API key."""
+
+    def __init__(self, api_key="", timeout=10):
+        try:
+            import stripe
+        except ImportError:
+            raise ImproperlyConfigured("StripeProvider requires the 'stripe' package.")
+        if not api_key:
+            raise ImproperlyConfigured("StripeProvider requires OPTIONS['api_key'].")
+        self.client = stripe.StripeClient(api_key, http_client=stripe.RequestsClient(timeout=timeout))
+        self.errors = stripe
+
+    def create_intent(self, payment, idempotency_key):
+        try:
+            intent = self.client.payment_intents.create(
+                params={
+                    "amount": amount_in_minor_units(payment.amount),
+                    "currency": payment.currency.lower(),
+                    "metadata": {"order_id": payment.order_id, "payment_id": payment.pk},
+                },
+                options={"idempotency_key": idempotency_key},
+            )
+        except self.errors.CardError as exc:
+            raise ProviderError(exc.user_message or "card_declined", retryable=False)
+        except self.errors.InvalidRequestError as exc:
+            raise ProviderError(str(exc), retryable=False)
+        except self.errors.StripeError as exc:
+            raise ProviderError(str(exc))
+        return Intent(intent.id)
+
+
+class ProviderPool:
+    """Provider instances plus a semaphore per provider capping in-flight calls."""
+
+    def __init__(self, config=None):
+        self.config = config if config is not None else getattr(settings, "PAYMENT_PROVIDERS", DEFAULT_PROVIDERS)
+        self._providers = {}
+        self._limits = {}
+        for name, entry in self.config.items():
+            self._providers[name] = import_string(entry["BACKEND"])(**entry.get("OPTIONS", {}))
+            self._limits[name] = threading.BoundedSemaphore(entry.get("CONCURRENCY", 4))
+
+    def create_intent(self, payment):
+        provider = self._providers.get(payment.provider)
+        if provider is None:
+            return ProviderError(f"No provider configured for {payment.provider}.", retryable=False)
+        with self._limits[payment.provider]:
+            try:
+                return provider.create_intent(payment, idempotency_key=f"payment-intent-{payment.pk}")
+            except ProviderError as exc:
+                return exc
+            except Exception as exc:  # unexpected client errors are retried
+                logger.exception("payment %s: provider call crashed", payment.pk)
+                return ProviderError(repr(exc))
+
+
+def _backoff(attempts):
+    base = getattr(settings, "PAYMENT_RETRY_BASE_SECONDS", 5)
+    cap = getattr(settings, "PAYMENT_RETRY_MAX_SECONDS", 300)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)) * random.uniform(0.5, 1.0))
+
+
+def claim_payments(worker_id, batch_size, lease_seconds=120, now=None):
+    """
+    Lease a batch of PENDING payments that still need an intent. The
+    conditional UPDATE repeats the due predicate, so a payment another worker
+    leased or recorded an intent for since the SELECT is not called twice.
+    """
+    now = now or timezone.now()
+    free = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    due = Payment.objects.filter(
+        free, Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+        status=Payment.Status.PENDING, transaction_id="",
+    )
+    ids = list(due.order_by("id").values_list("id", flat=True)[:batch_size])
+    if not ids:
+        return []
+    lease = now + timedelta(seconds=lease_seconds)
+    due.filter(pk__in=ids).update(claimed_by=worker_id, locked_until=lease)
+    return list(Payment.objects.filter(pk__in=ids, claimed_by=worker_id, locked_until=lease).order_by("id"))
+
+
+@transaction.atomic
+def record_intents(results, now=None):
+    """
+    Write one batch back: a single bulk_update for every payment touched, a
+    conditional UPDATE for the ones that failed, an outbox row per created
+    intent or failed payment, and the orders of failed payments moved to
+    FAILED. A payment a webhook settled in the meantime is not failed, and
+    gets no event. Returns (created, retrying, failed) counts.
+    """
+    now = now or timezone.now()
+    max_attempts = getattr(settings, "PAYMENT_MAX_ATTEMPTS", 5)
+    events, failures = [], {}
+    counts = {"created": 0, "retrying": 0, "failed": 0}
+    for payment, outcome in results:
+        payment.locked_until = None
+        payment.intent_attempts += 1
+        if isinstance(outcome, Intent):
+            payment.transaction_id = outcome.transaction_id
+            payment.next_attempt_at = None
+            counts["created"] += 1
+            events.append(OutboxEvent(topic="payment.intent_created", payload={
+                "id": payment.pk, "order_id": payment.order_id,
+                "transaction_id": payment.transaction_id, "amount": payment.amount,
+            }))
+        elif outcome.retryable and payment.intent_attempts < max_attempts:
+            payment.next_attempt_at = now + _backoff(payment.intent_attempts)
+            counts["retrying"] += 1
+        else:
+            failures[payment.pk] = (payment, outcome)
+
+    # `status` is left out of the bulk write: a webhook may already have
+    # settled a payment whose intent we are only now recording.
+    Payment.objects.bulk_update(
+        [payment for payment, _ in results],
+        ["transaction_id", "intent_attempts", "next_attempt_at", "locked_until", "updated_at"],
+    )
+    # Only payments still PENDING under our row lock are failed; the rest
+    # were settled by a webhook and keep their status, order and events.
+    failed = list(Payment.objects.select_for_update().filter(
+        pk__in=failures, status=Payment.Status.PENDING,
+    ).order_by("id").values_list("id", flat=True))
+    Payment.objects.filter(pk__in=failed).update(status=Payment.Status.FAILED, updated_at=now)
+    failed_orders = []
+    for pk in failed:
+        payment, outcome = failures[pk]
+        payment.status = Payment.Status.FAILED
+        counts["failed"] += 1
+        failed_orders.append(payment.order_id)
+        events.append(OutboxEvent(topic="payment.status_changed", payload={
+            "id": payment.pk, "order_id": payment.order_id, "status": payment.status,
+            "amount": payment.amount, "currency": payment.currency, "error": str(outcome),
+        }))
+    OutboxEvent.objects.bulk_create(events)
+    if failed_orders:
+        transition_orders(failed_orders, Order.Status.FAILED)
+    return counts["created"], counts["retrying"], counts["failed"]
+
+
+def process_payment_batch(pool, executor, worker_id, batch_size=50, lease_seconds=120):
+    """Claim, call providers concurrently, record. Returns per-batch counts."""
+    payments = claim_payments(worker_id, batch_size, lease_seconds)
+    if not payments:
+        return {"claimed": 0, "created": 0, "retrying": 0, "failed": 0}
+    outcomes = list(executor.map(pool.create_intent, payments))
+    now = timezone.now()
+    for payment in payments:
+        payment.updated_at = now
+    created, retrying, failed = record_intents(list(zip(payments, outcomes)), now=now)
+    return {"claimed": len(payments), "created": created, "retrying": retrying, "failed": failed}
@@ -0,0 +1,166 @@
+"""
+Pre-aggregated sales rollups for the analytics API.
+
+RestaurantHourlySales keeps revenue, order and cancellation counts and prep
+time per restaurant per hour of placement; MenuItemDailySales keeps quantity
+and revenue per menu item per day, or per item name for lines whose menu
+item was deleted. Both only count finished orders (PICKED_UP, or CANCELLED
+for the cancellation count). record_orders() runs in the same transaction
+as the status change that finishes an order (transition_orders and the
+Order post_save receiver) and adds it exactly once: it claims the order by
+setting Order.rolled_up, so an order moved out of a finished state (e.g. in
+the admin) and back is not counted again.
+
+`manage.py backfill_sales_rollups` rebuilds any date range from Order and
+OrderItem in parallel day-aligned chunks, e.g. after the first deploy or a
+manual data fix. Buckets use the current time zone (TIME_ZONE).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DurationField, ExpressionWrapper, F, Max, Q, Sum, When
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import MenuItemDailySales, Order, OrderItem, RestaurantHourlySales
+
+FINISHED = (Order.Status.PICKED_UP, Order.Status.CANCELLED)
+
+
+def hour_of(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _increment(model, key, deltas, defaults=None):
+    """Add `deltas` to the row for `key`, creating it (with `defaults`) on first use."""
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **(defaults or {}), **deltas)
+    except IntegrityError:  # a concurrent transaction created it first
+        model.objects.filter(**key).update(**changes)
+
+
+def record_orders(order_ids):
+    """Add newly finished orders to the rollups. Call inside the transaction that finished them."""
+    # The row locks make a concurrent call wait here and then skip the orders we claim.
+    claimed = list(
+        Order.objects.select_for_update().filter(pk__in=order_ids, status__in=FINISHED, rolled_up=False)
+        .values_list("id", flat=True)
+    )
+    if not claimed:
+        return
+    Order.objects.filter(pk__in=claimed).update(rolled_up=True)
+    rows = list(
+        Order.objects.filter(pk__in=claimed)
+        .values_list("id", "restaurant_id", "status", "placed_at", "ready_at", "total_amount")
+    )
+    hourly, placed = {}, {}
+    for pk, restaurant_id, status, placed_at, ready_at, total in rows:
+        bucket = hourly.setdefault((restaurant_id, hour_of(placed_at)), {
+            "orders": 0, "cancelled": 0, "revenue": Decimal("0.00"), "prepared": 0, "prep_seconds": 0.0,
+        })
+        if status == Order.Status.CANCELLED:
+            bucket["cancelled"] += 1
+            continue
+        bucket["orders"] += 1
+        bucket["revenue"] += total
+        if ready_at is not None:
+            bucket["prepared"] += 1
+            bucket["prep_seconds"] += (ready_at - placed_at).total_seconds()
+        placed[pk] = (restaurant_id, timezone.localtime(placed_at).date())
+
+    items, names = {}, {}
+    lines = (
+        OrderItem.objects.filter(order_id__in=placed)
+        .values_list("order_id", "menu_item_id", "item_name", "quantity", "line_total")
+    )
+    for order_id, menu_item_id, item_name, quantity, line_total in lines:
+        restaurant_id, day = placed[order_id]
+        # Lines of a deleted menu item are keyed by their name snapshot.
+        key = (restaurant_id, menu_item_id, None if menu_item_id else item_name, day)
+        bucket = items.setdefault(key, {"quantity": 0, "revenue": Decimal("0.00")})
+        bucket["quantity"] += quantity
+        bucket["revenue"] += line_total
+        names[key] = item_name
+
+    for (restaurant_id, hour), deltas in hourly.items():
+        _increment(RestaurantHourlySales, {"restaurant_id": restaurant_id, "hour": hour},
+                   {k: v for k, v in deltas.items() if v})
+    for key, deltas in items.items():
+        restaurant_id, menu_item_id, deleted_name, day = key
+        lookup = {"restaurant_id": restaurant_id, "menu_item_id": menu_item_id, "day": day}
+        if deleted_name is not None:
+            lookup["item_name"] = deleted_name
+        _increment(MenuItemDailySales, lookup, deltas, defaults={"item_name": names[key]})
+
+
+@transaction.atomic
+def rebuild(first_day, last_day):
+    """
+    Recompute the rollups for days first_day..last_day (inclusive) from the
+    order tables: one grouped query per table, replacing what was there.
+    Returns (hourly rows, item rows) written.
+    """
+    start, end = day_start(first_day), day_start(last_day + timedelta(days=1))
+    RestaurantHourlySales.objects.filter(hour__gte=start, hour__lt=end).delete()
+    MenuItemDailySales.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+    Order.objects.filter(placed_at__gte=start, placed_at__lt=end, status__in=FINISHED,
+                         rolled_up=False).update(rolled_up=True)
+
+    picked_up = Q(status=Order.Status.PICKED_UP)
+    hourly = (
+        Order.objects.filter(placed_at__gte=start, placed_at__lt=end, status__in=FINISHED)
+        .annotate(bucket=TruncHour("placed_at"))
+        .values("restaurant_id", "bucket")
+        .annotate(
+            picked_up=Count("id", filter=picked_up),
+            cancelled=Count("id", filter=Q(status=Order.Status.CANCELLED)),
+            revenue=Sum("total_amount", filter=picked_up),
+            prepared=Count("id", filter=picked_up & Q(ready_at__isnull=False)),
+            prep=Sum(ExpressionWrapper(F("ready_at") - F("placed_at"), output_field=DurationField()),
+                     filter=picked_up & Q(ready_at__isnull=False)),
+        )
+        .order_by()
+    )
+    hourly_rows = RestaurantHourlySales.objects.bulk_create(
+        (RestaurantHourlySales(
+            restaurant_id=row["restaurant_id"], hour=row["bucket"], orders=row["picked_up"],
+            cancelled=row["cancelled"], revenue=row["revenue"] or Decimal("0.00"), prepared=row["prepared"],
+            prep_seconds=row["prep"].total_seconds() if row["prep"] else 0.0,
+        ) for row in hourly),
+        batch_size=1000,
+    )
+
+    daily = (
+        OrderItem.objects.filter(order__placed_at__gte=start, order__placed_at__lt=end,
+                                 order__status=Order.Status.PICKED_UP)
+        .annotate(day=TruncDate("order__placed_at"),
+                  deleted_name=Case(When(menu_item__isnull=True, then=F("item_name"))))
+        .values("order__restaurant_id", "menu_item_id", "deleted_name", "day")
+        .annotate(total_quantity=Sum("quantity"), total_revenue=Sum("line_total"), name=Max("item_name"))
+        .order_by()
+    )
+    item_rows = MenuItemDailySales.objects.bulk_create(
+        (MenuItemDailySales(
+            restaurant_id=row["order__restaurant_id"], menu_item_id=row["menu_item_id"], item_name=row["name"],
+            day=row["day"], quantity=row["total_quantity"], revenue=row["total_revenue"],
+        ) for row in daily),
+        batch_size=1000,
+    )
+    return len(hourly_rows), len(item_rows)
+
+
+def chunks(first_day, last_day, days):
+    """Split first_day..last_day into inclusive (start, end) ranges of `days` days."""
+    while first_day <= last_day:
+        end = min(first_day + timedelta(days=days - 1), last_day)
+        yield first_day, end
+        first_day = end + timedelta(days=1)
@@ -1,20 +1,24 @@
 from rest_framework import serializers
+from backend.metrics import TimedSerializerMixin
 from .models import Order, OrderItem, Payment
-from apps.menu.serializers import RestaurantSerializer
+from apps.menu.serializers import RestaurantSummarySerializer, SparseFieldsetsMixin
 
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = '__all__'
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
-    restaurant = RestaurantSerializer(read_only=True)
+    # id/name/image only; the full menu belongs to the menu endpoints
+    restaurant = RestaurantSummarySerializer(read_only=True)
     class Meta:
         model = Order
-        fields = '__all__'
+        exclude = ("rolled_up",)
+        # Status moves go through services.transition_orders (legal moves, timestamps, events).
+        read_only_fields = ("status", "ready_at", "picked_up_at")
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
@@ -0,0 +1,172 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.menu.models import Restaurant
+from apps.menu.price_index import get_price_index
+from .events import publish_order_status, STATUS_FIELDS
+from .models import Order, OrderItem, Payment, OutboxEvent, ORDER_TAX_RATE, suppress_total_updates
+from . import rollups
+
+CENT = Decimal("0.01")
+
+
+class OrderPlacementError(Exception):
+    """Raised when a cart cannot be turned into an order; the message is safe to show to clients."""
+
+
+class OrderTransitionError(Exception):
+    """Raised for a status that orders cannot be moved to; safe to show to clients."""
+
+
+def is_order_admin(user):
+    return user.is_staff or user.role == User.ADMIN
+
+
+def can_manage_restaurant(user, restaurant_id):
+    """Admins manage every restaurant's orders; staff only their own restaurants'."""
+    restaurants = Restaurant.objects.filter(pk=restaurant_id)
+    if not is_order_admin(user):
+        restaurants = restaurants.filter(owner_user=user)
+    return restaurants.exists()
+
+
+def _parse_lines(items):
+    lines = []
+    for it in items:
+        try:
+            menu_item_id = int(it["menu_item_id"])
+            quantity = int(it.get("quantity", 1))
+            # Optional: the price the client displayed, checked against the index.
+            unit_price = it.get("unit_price")
+            unit_price = None if unit_price in (None, "") else Decimal(str(unit_price)).quantize(CENT)
+        except (AttributeError, KeyError, TypeError, ValueError, InvalidOperation):
+            raise OrderPlacementError("Each item needs a menu_item_id and an integer quantity.")
+        if quantity < 1:
+            raise OrderPlacementError("Item quantity must be positive.")
+        lines.append({"menu_item_id": menu_item_id, "quantity": quantity, "client_price": unit_price})
+    return lines
+
+
+def _snapshot_lines(restaurant_id, lines):
+    """Fill name/price/image for every line from the restaurant's price index."""
+    index = get_price_index(restaurant_id)
+    if not index:
+        raise OrderPlacementError("Restaurant not found.")
+
+    for line in lines:
+        entry = index.get(line["menu_item_id"])
+        if entry is None:
+            raise OrderPlacementError(
+                f"Menu item {line['menu_item_id']} does not belong to this restaurant."
+            )
+        if not entry.is_available:
+            raise OrderPlacementError(f"{entry.name} is currently unavailable.")
+        client_price = line.pop("client_price")
+        if client_price is not None and client_price != entry.price:
+            raise OrderPlacementError(
+                f"The price of {entry.name} has changed to {entry.price}; please review your cart."
+            )
+        line.update(item_name=entry.name, unit_price=entry.price, image_url=entry.image)
+
+
+@transaction.atomic
+def place_order(user, restaurant_id, items, pickup_name="", pickup_instructions="",
+                tax_rate=ORDER_TAX_RATE):
+    """
+    Create an Order, its OrderItems and a pending Payment in a fixed number of queries.
+
+    The cart is validated and snapshotted (name, price, image) from the
+    in-process price index, which costs no query when warm and one when the
+    menu changed. Lines are inserted with a single bulk_create, and totals are
+    computed once in Python so the Order and Payment rows are written with
+    their final amounts.
+    """
+    try:
+        restaurant_id = int(restaurant_id)
+    except (TypeError, ValueError):
+        raise OrderPlacementError("Restaurant not found.")
+    lines = _parse_lines(items)
+    _snapshot_lines(restaurant_id, lines)
+
+    for line in lines:
+        line["line_total"] = (line["unit_price"] * line["quantity"]).quantize(CENT)
+    subtotal = sum((line["line_total"] for line in lines), Decimal("0.00"))
+    tax = (subtotal * tax_rate).quantize(CENT)
+    total = (subtotal + tax).quantize(CENT)
+
+    order = Order.objects.create(
+        user=user,
+        restaurant_id=restaurant_id,
+        pickup_name=pickup_name,
+        pickup_instructions=pickup_instructions,
+        subtotal=subtotal,
+        tax=tax,
+        total_amount=total,
+    )
+
+    with suppress_total_updates():
+        order_items = OrderItem.objects.bulk_create(
+            OrderItem(order=order, **line) for line in lines
+        )
+
+    Payment.objects.create(
+        order=order,
+        amount=total,
+        status=Payment.Status.PENDING,
+    )
+
+    # Serializers read order.items.all(); hand them the rows we just inserted
+    # when the backend returned their primary keys (MySQL does not).
+    if connection.features.can_return_rows_from_bulk_insert:
+        items_qs = order.items.all()
+        items_qs._result_cache = order_items
+        items_qs._prefetch_done = True
+        order._prefetched_objects_cache = {"items": items_qs}
+    return order
+
+
+@transaction.atomic
+def transition_orders(order_ids, to_status, queryset=None):
+    """
+    Move the given orders to `to_status` where the move is legal and return
+    the ids that actually moved, in ascending order.
+
+    One conditional UPDATE per legal source state (WHERE status = source), so
+    orders already moved by someone else, or in a state that cannot reach
+    `to_status`, are left alone without reading them first. Every moved row
+    is stamped with the same updated_at, which identifies the moved ids in
+    one follow-up SELECT; those rows are locked by our UPDATE until commit.
+    `queryset` narrows which orders may be touched (e.g. a staff member's
+    restaurants). Status events are published on commit; finished orders
+    are added to the sales rollups in the same transaction.
+    """
+    if to_status not in Order.TRANSITIONS:
+        raise OrderTransitionError(f"Orders cannot be moved to {to_status}.")
+    order_ids = {int(pk) for pk in order_ids}
+    if not order_ids:
+        return []
+
+    now = timezone.now()
+    changes = {"status": to_status, "updated_at": now}
+    stamp = Order.TRANSITION_TIMESTAMPS.get(to_status)
+    if stamp:
+        changes[stamp] = now
+
+    scope = (queryset if queryset is not None else Order.objects.all()).filter(pk__in=order_ids)
+    moved = 0
+    for source in Order.TRANSITIONS[to_status]:
+        moved += scope.filter(status=source).update(**changes)
+    if not moved:
+        return []
+
+    rows = list(scope.filter(status=to_status, updated_at=now).order_by("pk").values(*STATUS_FIELDS))
+    publish_order_status(rows)
+    OutboxEvent.objects.bulk_create(
+        OutboxEvent(topic="order.status_changed", payload=OutboxEvent.order_payload(row)) for row in rows
+    )
+    if to_status in rollups.FINISHED:
+        rollups.record_orders([row["id"] for row in rows])
+    return [row["id"] for row in rows]
@@ -0,0 +1,82 @@
+"""
+Server-Sent Events streams of order status changes.
+
+These are plain async Django views (DRF has no async support), so they only
+stream efficiently when the project is served through backend/asgi.py, e.g.
+`uvicorn backend.asgi:application`. An idle connection costs one suspended
+coroutine and an empty queue; a keepalive comment is sent periodically so
+proxies don't cut the connection.
+
+EventSource cannot set headers, so the JWT may also be passed as ?token=.
+Tokens are checked by the same ClaimsJWTAuthentication as the REST API, so
+a revoked token cannot open a stream and a current one costs no user query.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from apps.accounts.authentication import ClaimsJWTAuthentication
+
+from .events import get_broker, user_channel, restaurant_channel
+from .services import can_manage_restaurant
+
+
+def _keepalive_seconds():
+    return getattr(settings, "ORDER_STREAM_KEEPALIVE_SECONDS", 15)
+
+
+def _authenticate(request):
+    auth = ClaimsJWTAuthentication()
+    raw = None
+    header = auth.get_header(request)
+    if header is not None:
+        raw = auth.get_raw_token(header)
+    if raw is None:
+        raw = request.GET.get("token")
+    if not raw:
+        return None
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def _event_stream(channel):
+    subscription = get_broker().subscribe(channel)
+    try:
+        # Tell EventSource how long to wait before reconnecting.
+        yield "retry: 3000\n\n"
+        while True:
+            message = await subscription.get(timeout=_keepalive_seconds())
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: order.status\ndata: {message}\n\n"
+    finally:
+        subscription.close()
+
+
+def _stream_response(channel):
+    response = StreamingHttpResponse(_event_stream(channel), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # disable proxy buffering (nginx)
+    return response
+
+
+async def user_order_stream(request):
+    """GET /api/orders/stream/ - status changes of the caller's own orders."""
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    return _stream_response(user_channel(user.pk))
+
+
+async def restaurant_order_stream(request, restaurant_id):
+    """GET /api/orders/stream/restaurant/<id>/ - every order of a restaurant, for its staff."""
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    if not await sync_to_async(can_manage_restaurant)(user, restaurant_id):
+        return JsonResponse({"detail": "You do not have access to this restaurant."}, status=403)
+    return _stream_response(restaurant_channel(restaurant_id))
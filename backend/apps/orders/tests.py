@@ -1,3 +1,1027 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db.models import F, QuerySet
+from django.db import IntegrityError, connection
+from datetime import timedelta
+
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.accounts import tokens
+from apps.accounts.models import User
+from apps.accounts.tokens import issue_tokens
+from backend.throttling import reset_throttles
+from apps.menu.cache import get_cache as get_menu_cache
+from apps.menu.models import Restaurant, MenuItem
+from apps.menu.price_index import get_price_index, clear_price_index
+from .models import (
+    Order, OrderItem, Payment, IdempotencyKey, OutboxEvent, PaymentWebhookEvent,
+    RestaurantHourlySales, MenuItemDailySales,
+)
+from .idempotency import fingerprint
+from .services import transition_orders
+from .payments import (
+    FakeProvider, Intent, ProviderError, ProviderPool, claim_payments, process_payment_batch, record_intents,
+)
+from . import events, outbox, streams, webhooks
+
+
+class OrderTestMixin:
+    def setUp(self):
+        get_menu_cache().clear()
+        clear_price_index()
+        reset_throttles()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="diner@example.com", password="pw123456")
+        self.owner = User.objects.create_user(email="owner@example.com", password="pw123456")
+        self.restaurant = Restaurant.objects.create(owner_user=self.owner, name="Pho House")
+        self.other = Restaurant.objects.create(owner_user=self.owner, name="Taco Stand")
+        self.menu = MenuItem.objects.bulk_create(
+            MenuItem(restaurant=self.restaurant, name=f"Dish {i}", price=Decimal("4.50") + i)
+            for i in range(20)
+        )
+        self.foreign_item = MenuItem.objects.create(
+            restaurant=self.other, name="Taco", price=Decimal("3.00")
+        )
+        self.client.force_authenticate(self.user)
+
+    def cart(self, count, quantity=2):
+        return [
+            {
+                "menu_item_id": item.pk,
+                "name": item.name,
+                "unit_price": str(item.price),
+                "quantity": quantity,
+                "image": "",
+            }
+            for item in self.menu[:count]
+        ]
+
+    def place(self, items, restaurant=None, **headers):
+        return self.client.post(
+            "/api/orders/place/",
+            {"restaurant_id": (restaurant or self.restaurant).pk, "items": items},
+            format="json",
+            headers=headers,
+        )
+
+
+class PlaceOrderTests(OrderTestMixin, TestCase):
+    def test_place_writes_order_lines_and_payment_with_final_totals(self):
+        response = self.place(self.cart(3))
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(pk=response.json()["id"])
+        # (4.50 + 5.50 + 6.50) * 2
+        self.assertEqual(order.subtotal, Decimal("33.00"))
+        self.assertEqual(order.total_amount, Decimal("33.00"))
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(Payment.objects.get(order=order).amount, Decimal("33.00"))
+        self.assertEqual(len(response.json()["items"]), 3)
+
+    def test_place_query_count_does_not_grow_with_cart_size(self):
+        self.place(self.cart(1))  # warm the price index
+        counts = []
+        for size in (1, 20):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.place(self.cart(size))
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_place_rejects_items_from_another_restaurant(self):
+        items = self.cart(1) + [{
+            "menu_item_id": self.foreign_item.pk,
+            "name": "Taco",
+            "unit_price": "3.00",
+        }]
+        response = self.place(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_place_rejects_malformed_lines(self):
+        response = self.place([{"name": "Dish 0", "unit_price": "4.50", "quantity": 1}])
+        self.assertEqual(response.status_code, 400)
+        response = self.place([{"menu_item_id": self.menu[0].pk, "quantity": "lots"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_place_snapshots_server_prices_not_client_values(self):
+        items = [{"menu_item_id": self.menu[1].pk, "name": "Free lunch", "quantity": 2}]
+        response = self.place(items)
+        self.assertEqual(response.status_code, 201)
+        line = OrderItem.objects.get()
+        self.assertEqual((line.item_name, line.unit_price), ("Dish 1", Decimal("5.50")))
+        self.assertEqual(Order.objects.get().total_amount, Decimal("11.00"))
+
+    def test_place_rejects_stale_price_and_unavailable_items(self):
+        items = self.cart(1)
+        items[0]["unit_price"] = "0.01"
+        self.assertEqual(self.place(items).status_code, 400)
+
+        unavailable = self.menu[2]
+        unavailable.is_available = False
+        with self.captureOnCommitCallbacks(execute=True):
+            unavailable.save()
+        response = self.place([{"menu_item_id": unavailable.pk, "quantity": 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    @override_settings(THROTTLE_RATES={"orders.place": {"user": "1/min"}})
+    def test_place_is_throttled_per_user(self):
+        self.assertEqual(self.place(self.cart(1)).status_code, 201)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.place(self.cart(1))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(ctx.captured_queries, [])
+
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.place(self.cart(1)).status_code, 201)
+
+
+class PriceIndexTests(OrderTestMixin, TestCase):
+    def test_warm_index_costs_one_query_and_rebuilds_after_menu_edit(self):
+        with self.assertNumQueries(2):
+            get_price_index(self.restaurant.pk)
+        with self.assertNumQueries(1):
+            index = get_price_index(self.restaurant.pk)
+        self.assertEqual(index[self.menu[0].pk].price, Decimal("4.50"))
+
+        item = self.menu[0]
+        item.price = Decimal("9.99")
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        with self.assertNumQueries(2):
+            index = get_price_index(self.restaurant.pk)
+        self.assertEqual(index[item.pk].price, Decimal("9.99"))
+
+    def test_edit_is_seen_without_a_menu_cache_version_bump(self):
+        get_price_index(self.restaurant.pk)
+        # As another worker would: no signal bumps this process's menu cache version.
+        MenuItem.objects.filter(pk=self.menu[0].pk).update(price=Decimal("9.99"))
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(updated_at=timezone.now())
+        self.assertEqual(get_price_index(self.restaurant.pk)[self.menu[0].pk].price, Decimal("9.99"))
+
+    def test_inactive_restaurant_has_empty_index(self):
+        self.restaurant.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.save()
+        self.assertEqual(get_price_index(self.restaurant.pk), {})
+
+
+class IncrementalTotalsTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(user=self.user, restaurant=self.restaurant)
+
+    def add_line(self, order, price, quantity=1):
+        return OrderItem.objects.create(
+            order=order, item_name="Line", unit_price=Decimal(price),
+            quantity=quantity, line_total="0.00",
+        )
+
+    def test_insert_update_delete_apply_line_deltas(self):
+        first = self.add_line(self.order, "4.00", 2)
+        self.add_line(self.order, "1.25")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("9.25"))
+
+        first.quantity = 3
+        first.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.subtotal, Decimal("13.25"))
+
+        reloaded = OrderItem.objects.get(pk=first.pk)
+        reloaded.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("1.25"))
+
+    def test_update_is_a_single_totals_query(self):
+        line = self.add_line(self.order, "2.00")
+        line.quantity = 5
+        # line UPDATE + order totals UPDATE, no re-read of the other lines
+        with self.assertNumQueries(2):
+            line.save()
+
+    def test_moving_a_line_updates_both_orders(self):
+        other = Order.objects.create(user=self.user, restaurant=self.restaurant)
+        line = self.add_line(self.order, "3.00")
+        line.order = other
+        line.save()
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("0.00"))
+        self.assertEqual(other.total_amount, Decimal("3.00"))
+
+    def test_reconcile_command_reports_and_fixes_drift(self):
+        self.add_line(self.order, "6.00")
+        Order.objects.filter(pk=self.order.pk).update(subtotal="1.00", total_amount="1.00")
+
+        out = StringIO()
+        call_command("reconcile_order_totals", stdout=out)
+        self.assertIn("found 1", out.getvalue())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("1.00"))
+
+        out = StringIO()
+        call_command("reconcile_order_totals", "--fix", stdout=out)
+        self.assertIn("fixed 1", out.getvalue())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("6.00"))
+
+
+class OrderRepresentationTests(OrderTestMixin, TestCase):
+    def test_order_list_carries_restaurant_summary_not_menu(self):
+        for _ in range(3):
+            self.place(self.cart(2))
+        # orders + prefetched items; no per-order restaurant or menu queries
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/orders/")
+        restaurant = response.json()["results"][0]["restaurant"]
+        self.assertEqual(set(restaurant), {"id", "name", "image"})
+
+    def test_order_sparse_fields(self):
+        self.place(self.cart(1))
+        response = self.client.get("/api/orders/?fields=id,status,total_amount")
+        self.assertEqual(set(response.json()["results"][0]), {"id", "status", "total_amount"})
+
+
+class PaginationTests(OrderTestMixin, TestCase):
+    def test_order_history_walks_pages_newest_first(self):
+        placed = [self.place(self.cart(1)).json()["id"] for _ in range(5)]
+
+        seen, url = [], "/api/orders/?page_size=2"
+        while url:
+            with self.assertNumQueries(2):
+                page = self.client.get(url).json()
+            seen += [o["id"] for o in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, placed[::-1])
+
+    def test_order_items_and_payments_are_paginated(self):
+        for _ in range(3):
+            self.place(self.cart(2))
+        page = self.client.get("/api/orders/items/?page_size=4").json()
+        self.assertEqual(len(page["results"]), 4)
+        self.assertIsNotNone(page["next"])
+        page = self.client.get("/api/orders/payments/").json()
+        self.assertEqual(len(page["results"]), 3)
+
+
+class IdempotencyKeyTests(OrderTestMixin, TestCase):
+    def test_retry_with_same_key_replays_without_new_rows(self):
+        first = self.place(self.cart(2), **{"Idempotency-Key": "cart-1"})
+        retry = self.place(self.cart(2), **{"Idempotency-Key": "cart-1"})
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reuse_with_different_body_is_rejected(self):
+        self.place(self.cart(2), **{"Idempotency-Key": "cart-1"})
+        response = self.place(self.cart(3), **{"Idempotency-Key": "cart-1"})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.place(self.cart(1), **{"Idempotency-Key": "same"})
+        other = User.objects.create_user(email="other@example.com", password="pw123456")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.place(self.cart(1), **{"Idempotency-Key": "same"}).status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0.1)
+    def test_in_flight_duplicate_gets_conflict_and_stale_claims_are_taken_over(self):
+        class Req:
+            data = {"restaurant_id": self.restaurant.pk, "items": self.cart(1)}
+
+        record = IdempotencyKey.objects.create(
+            user=self.user, key="busy", endpoint="orders.place",
+            request_hash=fingerprint(Req, "orders.place"),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        response = self.place(self.cart(1), **{"Idempotency-Key": "busy"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            locked_at=timezone.now() - timedelta(minutes=5)
+        )
+        self.assertEqual(self.place(self.cart(1), **{"Idempotency-Key": "busy"}).status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status, IdempotencyKey.Status.COMPLETED)
+
+    def test_key_released_by_a_failed_first_request_is_claimed_again(self):
+        create = IdempotencyKey.objects.create
+
+        def lose_then_create(**kwargs):
+            if not lost:
+                lost.append(kwargs)  # the winner inserted first, then failed and deleted its key
+                raise IntegrityError("duplicate key")
+            return create(**kwargs)
+
+        lost = []
+        with patch.object(IdempotencyKey.objects, "create", side_effect=lose_then_create):
+            response = self.place(self.cart(1), **{"Idempotency-Key": "flaky"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status, IdempotencyKey.Status.COMPLETED)
+
+    def test_sweep_deletes_only_expired_keys_in_batches(self):
+        now = timezone.now()
+        IdempotencyKey.objects.bulk_create(
+            IdempotencyKey(user=self.user, key=f"k{i}", endpoint="orders.place", request_hash="x",
+                           expires_at=now + timedelta(hours=-1 if i < 5 else 1))
+            for i in range(7)
+        )
+        out = StringIO()
+        call_command("sweep_idempotency_keys", "--batch-size", "2", stdout=out)
+        self.assertIn("Deleted 5 expired keys in 3 batches", out.getvalue())
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+
+class RecordingBroker(events.InProcessBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+        return super().publish(channel, message)
+
+
+class OrderStatusEventTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = events._broker = RecordingBroker()
+        self.addCleanup(setattr, events, "_broker", None)
+
+    def test_broker_delivers_across_threads_and_drops_oldest_when_full(self):
+        async def scenario():
+            broker = events.InProcessBroker(queue_size=2)
+            sub = broker.subscribe("user:1")
+            self.assertIsNone(await sub.get(timeout=0.01))  # keepalive tick
+            thread = threading.Thread(target=lambda: [broker.publish("user:1", m) for m in "abc"])
+            thread.start()
+            thread.join()
+            received = [await sub.get(timeout=1), await sub.get(timeout=1)]
+            sub.close()
+            return received, sub.dropped, broker.subscriber_count()
+
+        self.assertEqual(asyncio.run(scenario()), (["b", "c"], 1, 0))
+
+    def test_status_changes_publish_after_commit_to_user_and_restaurant(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.place(self.cart(1)).status_code, 201)
+        order = Order.objects.get()
+        self.broker.published.clear()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            order.pickup_name = "Sam"
+            order.save()  # no status change, nothing to push
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            order.status = "PREPARING"
+            order.save()
+        self.assertEqual(self.broker.published, [])  # not before commit
+        callbacks[0]()
+        channels = [channel for channel, _ in self.broker.published]
+        self.assertEqual(channels, [f"user:{self.user.pk}", f"restaurant:{self.restaurant.pk}"])
+        payload = self.broker.published[0][1]
+        self.assertEqual((payload["id"], payload["status"]), (order.pk, "PREPARING"))
+        self.assertNotIn("user_id", payload)
+
+    def test_bulk_transition_publishes_each_moved_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place(self.cart(1))
+            self.place(self.cart(2))
+        self.broker.published.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders(Order.objects.values_list("pk", flat=True), Order.Status.PREPARING)
+        statuses = [p["status"] for _, p in self.broker.published]
+        self.assertEqual(statuses, ["PREPARING"] * 4)
+
+    async def test_user_stream_requires_token_and_pushes_events(self):
+        client = AsyncClient()
+        response = await client.get("/api/orders/stream/")
+        self.assertEqual(response.status_code, 401)
+
+        token = str(AccessToken.for_user(self.user))
+        response = await client.get("/api/orders/stream/", {"token": token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        self.broker.publish(events.user_channel(self.user.pk), '{"id": 1, "status": "PREPARING"}')
+        self.assertEqual(await anext(stream),
+                         b'event: order.status\ndata: {"id": 1, "status": "PREPARING"}\n\n')
+        await stream.aclose()
+
+    def test_stream_authentication_uses_claims_and_honours_revocation(self):
+        tokens.clear()
+        access = str(issue_tokens(self.user).access_token)
+        request = RequestFactory().get("/api/orders/stream/", {"token": access})
+        self.assertEqual(streams._authenticate(request).pk, self.user.pk)  # caches the token state
+        with self.assertNumQueries(0):
+            self.assertEqual(streams._authenticate(request).pk, self.user.pk)
+
+        self.user.set_password("another123")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertIsNone(streams._authenticate(request))
+
+    async def test_restaurant_stream_is_limited_to_its_owner(self):
+        client = AsyncClient()
+        url = f"/api/orders/stream/restaurant/{self.restaurant.pk}/"
+        diner = await client.get(url, {"token": str(AccessToken.for_user(self.user))})
+        self.assertEqual(diner.status_code, 403)
+        owner = await client.get(url, {"token": str(AccessToken.for_user(self.owner))})
+        self.assertEqual(owner.status_code, 200)
+        await owner.streaming_content.aclose()
+
+
+class OrderTransitionTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner.role = User.STAFF
+        self.owner.save()
+        self.orders = [
+            Order.objects.create(user=self.user, restaurant=self.restaurant) for _ in range(4)
+        ]
+        self.foreign = Order.objects.create(user=self.user, restaurant=self.other_owned())
+
+    def other_owned(self):
+        stranger = User.objects.create_user(email="stranger@example.com")
+        return Restaurant.objects.create(owner_user=stranger, name="Elsewhere")
+
+    def transition(self, ids, to_status, user=None):
+        self.client.force_authenticate(user or self.owner)
+        return self.client.post("/api/orders/transition/",
+                                {"order_ids": ids, "status": to_status}, format="json")
+
+    def test_moves_only_legal_sources_with_one_update_per_source_state(self):
+        first, second, third, fourth = self.orders
+        Order.objects.filter(pk=third.pk).update(status=Order.Status.READY_FOR_PICKUP)
+        ids = [o.pk for o in self.orders]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.transition(ids, "CANCELLED")
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "orders_order" SET "status"')]
+        self.assertEqual(len(updates), 2)  # PENDING and PREPARING sources
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["moved"], [first.pk, second.pk, fourth.pk])
+        self.assertEqual(response.data["skipped"], [third.pk])
+
+    def test_order_update_cannot_change_the_status(self):
+        order = self.orders[0]
+        self.client.force_authenticate(self.user)
+        res = self.client.patch(f"/api/orders/{order.pk}/",
+                                {"status": "PICKED_UP", "picked_up_at": timezone.now().isoformat(),
+                                 "pickup_name": "Sam"}, format="json")
+        self.assertEqual(res.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.picked_up_at, order.pickup_name), (Order.Status.PENDING, None, "Sam"))
+
+    def test_transition_stamps_timestamps_and_is_not_repeated(self):
+        ids = [o.pk for o in self.orders[:2]]
+        self.assertEqual(self.transition(ids, "PREPARING").data["moved"], ids)
+        ready = self.transition(ids, "READY_FOR_PICKUP")
+        self.assertEqual(ready.data["moved"], ids)
+        again = self.transition(ids, "READY_FOR_PICKUP")
+        self.assertEqual((again.data["moved"], again.data["skipped"]), ([], ids))
+
+        picked = self.transition(ids, "PICKED_UP")
+        self.assertEqual(picked.data["moved"], ids)
+        for order in Order.objects.filter(pk__in=ids):
+            self.assertIsNotNone(order.ready_at)
+            self.assertIsNotNone(order.picked_up_at)
+            self.assertEqual(order.status, "PICKED_UP")
+
+    def test_staff_cannot_touch_other_restaurants_and_customers_are_refused(self):
+        response = self.transition([self.foreign.pk, self.orders[0].pk], "PREPARING")
+        self.assertEqual(response.data["moved"], [self.orders[0].pk])
+        self.assertEqual(response.data["skipped"], [self.foreign.pk])
+
+        self.assertEqual(self.transition([self.foreign.pk], "PREPARING", user=self.user).status_code, 403)
+        admin = User.objects.create_user(email="ops@example.com", role=User.ADMIN)
+        self.assertEqual(self.transition([self.foreign.pk], "PREPARING", user=admin).data["moved"],
+                         [self.foreign.pk])
+
+    def test_rejects_unknown_status_and_bad_ids(self):
+        self.assertEqual(self.transition([self.orders[0].pk], "PENDING").status_code, 400)
+        self.assertEqual(self.transition("1,2", "PREPARING").status_code, 400)
+        self.assertEqual(self.transition([], "PREPARING").status_code, 400)
+
+
+@override_settings(ORDER_FEED_SETTLE_SECONDS=0)
+class RestaurantFeedTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner.role = User.STAFF
+        self.owner.save()
+        for count in (1, 2, 3):
+            self.place(self.cart(count))
+        self.client.force_authenticate(self.owner)
+        self.url = f"/api/orders/feed/restaurant/{self.restaurant.pk}/"
+
+    def test_polls_return_only_orders_changed_since_the_cursor(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        ids = [o["id"] for o in first.data["results"]]
+        self.assertEqual(ids, list(Order.objects.order_by("updated_at", "id").values_list("id", flat=True)))
+        self.assertFalse(first.data["has_more"])
+
+        idle = self.client.get(self.url, {"since": first.data["cursor"]})
+        self.assertEqual((idle.data["results"], idle.data["cursor"]), ([], first.data["cursor"]))
+
+        transition_orders([ids[1]], Order.Status.PREPARING)
+        with CaptureQueriesContext(connection) as ctx:
+            changed = self.client.get(self.url, {"since": idle.data["cursor"]})
+        self.assertEqual([(o["id"], o["status"]) for o in changed.data["results"]], [(ids[1], "PREPARING")])
+        self.assertEqual(len(ctx.captured_queries), 3)  # access check, orders, items
+
+    def test_limit_pages_through_ties_on_updated_at(self):
+        Order.objects.update(updated_at=timezone.now())  # every order shares one timestamp
+        seen, cursor, more = [], None, True
+        while more:
+            params = {"limit": 2, **({"since": cursor} if cursor else {})}
+            page = self.client.get(self.url, params).data
+            seen += [o["id"] for o in page["results"]]
+            cursor, more = page["cursor"], page["has_more"]
+        self.assertEqual(seen, sorted(Order.objects.values_list("id", flat=True)))
+
+    @override_settings(ORDER_FEED_SETTLE_SECONDS=2)
+    def test_cursor_does_not_pass_a_change_that_commits_late(self):
+        first, second = Order.objects.order_by("id")[:2]
+        Order.objects.update(updated_at=timezone.now() - timedelta(seconds=10))
+        cursor = self.client.get(self.url).data["cursor"]
+
+        Order.objects.filter(pk=first.pk).update(updated_at=timezone.now() - timedelta(seconds=1))
+        poll = self.client.get(self.url, {"since": cursor}).data
+        self.assertEqual((poll["results"], poll["cursor"]), ([], cursor))  # not settled yet
+
+        # A transaction that stamped its change earlier commits only now.
+        Order.objects.filter(pk=second.pk).update(updated_at=timezone.now() - timedelta(seconds=1.5))
+        Order.objects.update(updated_at=F("updated_at") - timedelta(seconds=5))  # time passes
+        poll = self.client.get(self.url, {"since": cursor}).data
+        self.assertEqual([o["id"] for o in poll["results"]], [second.pk, first.pk])
+
+    def test_feed_is_limited_to_restaurant_managers_and_validates_cursor(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get(self.url, {"since": "not-a-cursor"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"limit": 0}).status_code, 400)
+
+
+class OrderExportTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for count in (1, 2, 3):
+            self.place(self.cart(count))
+        self.client.force_authenticate(self.owner)
+        today = timezone.localdate().isoformat()
+        self.range = {"from": today, "to": today}
+        self.url = f"/api/orders/export/restaurant/{self.restaurant.pk}/orders."
+
+    def download(self, file_format, **params):
+        response = self.client.get(self.url + file_format, {**self.range, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    @override_settings(ORDER_EXPORT_CHUNK_SIZE=2)
+    def test_csv_has_a_row_per_line_item_across_keyset_pages(self):
+        Order.objects.update(placed_at=timezone.now())  # ties on placed_at across pages
+        rows = list(csv.DictReader(StringIO(self.download("csv"))))
+        self.assertEqual(len(rows), 1 + 2 + 3)
+        orders = sorted(Order.objects.values_list("id", flat=True))
+        self.assertEqual(sorted({int(r["order_id"]) for r in rows}), orders)
+        self.assertEqual(rows[0]["item_name"], "Dish 0")
+        self.assertEqual(rows[0]["quantity"], "2")
+
+    def test_jsonl_nests_items_and_respects_the_date_range(self):
+        lines = self.download("jsonl").splitlines()
+        self.assertEqual([len(json.loads(line)["items"]) for line in lines], [1, 2, 3])
+
+        Order.objects.filter(pk=json.loads(lines[0])["id"]).update(placed_at=timezone.now() - timedelta(days=3))
+        self.assertEqual(len(self.download("jsonl").splitlines()), 2)
+
+    def test_export_is_limited_to_restaurant_managers_and_validates_input(self):
+        self.assertEqual(self.client.get(self.url + "csv").status_code, 400)
+        self.assertEqual(self.client.get(self.url + "xml", self.range).status_code, 404)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url + "csv", self.range).status_code, 403)
+
+
+class SalesRollupTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for count in (1, 2, 3):
+            self.place(self.cart(count))
+        self.first, self.second, self.third = Order.objects.order_by("id")
+        for to_status in (Order.Status.PREPARING, Order.Status.READY_FOR_PICKUP, Order.Status.PICKED_UP):
+            transition_orders([self.first.pk, self.second.pk], to_status)
+        self.third.status = Order.Status.CANCELLED  # through save() and the post_save receiver
+        self.third.save()
+        self.client.force_authenticate(self.owner)
+        today = timezone.localdate().isoformat()
+        self.url = f"/api/orders/analytics/restaurant/{self.restaurant.pk}/?from={today}&to={today}"
+
+    def snapshot(self):
+        hourly = list(RestaurantHourlySales.objects.values_list(
+            "restaurant_id", "hour", "orders", "cancelled", "revenue", "prepared"))
+        daily = sorted(MenuItemDailySales.objects.values_list("menu_item_id", "day", "quantity", "revenue"))
+        return hourly, daily
+
+    def test_finished_orders_are_rolled_up_once(self):
+        hourly, daily = self.snapshot()
+        revenue = self.first.total_amount + self.second.total_amount
+        self.assertEqual([row[2:] for row in hourly], [(2, 1, revenue, 2)])
+        # Dish 0 is in both picked-up orders, Dish 1 only in the second.
+        self.assertEqual([(row[0], row[2]) for row in daily], [(self.menu[0].pk, 4), (self.menu[1].pk, 2)])
+
+        transition_orders([self.first.pk, self.third.pk], Order.Status.CANCELLED)  # not legal: no change
+        self.assertEqual(self.snapshot(), (hourly, daily))
+
+    def test_order_that_re_enters_a_finished_state_is_not_counted_again(self):
+        before = self.snapshot()
+        order = Order.objects.get(pk=self.first.pk)
+        for status in (Order.Status.PENDING, Order.Status.PICKED_UP, Order.Status.PENDING, Order.Status.PICKED_UP):
+            order.status = status  # e.g. edited back and forth in the admin
+            order.save()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_backfill_rebuilds_the_same_rows(self):
+        before = self.snapshot()
+        RestaurantHourlySales.objects.all().delete()
+        MenuItemDailySales.objects.update(quantity=0)
+        call_command("backfill_sales_rollups", "--workers", "1", stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_analytics_api_reads_the_rollups(self):
+        with self.assertNumQueries(4):  # access check, series, totals, top items
+            data = self.client.get(self.url).data
+        self.assertEqual(data["totals"]["orders"], 2)
+        self.assertEqual(data["totals"]["cancelled"], 1)
+        self.assertEqual(len(data["series"]), 1)
+        self.assertIsNotNone(data["series"][0]["avg_prep_seconds"])
+        self.assertEqual([item["name"] for item in data["top_items"]], ["Dish 0", "Dish 1"])
+
+        hourly = self.client.get(self.url + "&granularity=hour&top=1").data
+        self.assertEqual(len(hourly["top_items"]), 1)
+        self.assertEqual(self.client.get(self.url + "&granularity=week").status_code, 400)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_deleting_a_menu_item_keeps_its_sales(self):
+        before = self.client.get(self.url).data["top_items"]
+        self.menu[0].delete()
+
+        row = MenuItemDailySales.objects.get(item_name="Dish 0")
+        self.assertIsNone(row.menu_item_id)
+        self.assertEqual(row.quantity, 4)
+        after = self.client.get(self.url).data["top_items"]
+        self.assertEqual([(i["name"], i["revenue"]) for i in after], [(i["name"], i["revenue"]) for i in before])
+        self.assertIsNone(after[0]["menu_item_id"])
+
+        # A rebuild finds the deleted item's lines by their name snapshot.
+        call_command("backfill_sales_rollups", "--workers", "1", stdout=StringIO())
+        self.assertEqual(self.client.get(self.url).data["top_items"], after)
+
+
+def race_after_select(effect):
+    """Run `effect` (another worker's write) right after a claim's first SELECT of ids."""
+    values_list = QuerySet.values_list
+    fired = []
+
+    def select_then_race(queryset, *args, **kwargs):
+        rows = list(values_list(queryset, *args, **kwargs))
+        if not fired:
+            fired.append(True)
+            effect()
+        return rows
+
+    return patch.object(QuerySet, "values_list", select_then_race)
+
+
+calls = []
+
+
+def record_handler(event):
+    calls.append((event.topic, event.payload["id"]))
+
+
+def flaky_handler(event):
+    if event.attempts == 0:
+        raise ConnectionError("printer offline")
+
+
+@override_settings(OUTBOX_HANDLERS={"*": ["apps.orders.tests.record_handler"],
+                                    "payment.status_changed": ["apps.orders.tests.flaky_handler"]})
+class OutboxTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+        outbox.handlers_for.cache_clear()
+        self.addCleanup(outbox.handlers_for.cache_clear)
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+
+    def drain(self, expect_failures=False):
+        if not expect_failures:
+            return outbox.process_batch("worker-a", self.executor, batch_size=50)
+        with self.assertLogs("apps.orders.outbox", "WARNING"):
+            return outbox.process_batch("worker-a", self.executor, batch_size=50)
+
+    def test_order_and_payment_changes_write_outbox_rows_in_their_transaction(self):
+        self.place(self.cart(2))
+        order = Order.objects.get()
+        transition_orders([order.pk], Order.Status.PREPARING)
+        payment = order.payment
+        payment.status = Payment.Status.PAID
+        payment.save()
+        topics = list(OutboxEvent.objects.order_by("id").values_list("topic", flat=True))
+        self.assertEqual(topics, ["order.placed", "order.status_changed", "payment.status_changed"])
+
+        # A rejected cart rolls its outbox row back with the order.
+        self.place([{"menu_item_id": self.foreign_item.pk, "quantity": 1}])
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+
+    def test_worker_delivers_retries_with_backoff_and_reports_lag(self):
+        self.place(self.cart(1))
+        payment = Payment.objects.get()
+        payment.status = Payment.Status.PAID
+        payment.save()
+
+        result = self.drain(expect_failures=True)
+        self.assertEqual((result["claimed"], result["delivered"], result["failed"]), (2, 1, 1))
+        self.assertEqual(len(result["lags"]), 1)
+        retry = OutboxEvent.objects.get(topic="payment.status_changed")
+        self.assertEqual((retry.status, retry.attempts), (OutboxEvent.Status.PENDING, 1))
+        self.assertGreater(retry.available_at, timezone.now())
+        self.assertIn("printer offline", retry.last_error)
+        self.assertEqual(outbox.claim_batch("worker-a", 10), [])  # not due yet
+
+        OutboxEvent.objects.filter(pk=retry.pk).update(available_at=timezone.now())
+        self.assertEqual(self.drain()["delivered"], 1)
+        # at-least-once: the "*" handler ran for the failed attempt and again on retry
+        self.assertEqual([topic for topic, _ in calls].count("payment.status_changed"), 2)
+        self.assertEqual(outbox.stats()["pending"], 0)
+
+    def test_leased_events_are_not_claimed_twice_until_the_lease_expires(self):
+        self.place(self.cart(1))
+        self.assertEqual(len(outbox.claim_batch("worker-a", 10)), 1)
+        self.assertEqual(outbox.claim_batch("worker-b", 10), [])
+        later = timezone.now() + timedelta(minutes=5)
+        self.assertEqual(len(outbox.claim_batch("worker-b", 10, now=later)), 1)
+
+    def test_rows_finished_by_another_worker_after_the_select_are_not_claimed(self):
+        self.place(self.cart(1))
+        delivered = lambda: OutboxEvent.objects.update(status=OutboxEvent.Status.DELIVERED, locked_until=None)
+        with race_after_select(delivered):
+            self.assertEqual(outbox.claim_batch("worker-a", 10), [])
+
+        OutboxEvent.objects.update(status=OutboxEvent.Status.PENDING)
+        rescheduled = lambda: OutboxEvent.objects.update(available_at=timezone.now() + timedelta(minutes=1))
+        with race_after_select(rescheduled):
+            self.assertEqual(outbox.claim_batch("worker-a", 10), [])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_gives_up_after_max_attempts(self):
+        self.place(self.cart(1))
+        Payment.objects.update(status=Payment.Status.FAILED)  # update() writes no event
+        payment = Payment.objects.get()
+        payment.status = Payment.Status.PAID
+        payment.save()
+        self.drain(expect_failures=True)
+        self.assertEqual(OutboxEvent.objects.get(topic="payment.status_changed").status,
+                         OutboxEvent.Status.FAILED)
+        self.assertEqual(outbox.stats()["failed"], 1)
+
+    def test_worker_command_drains_once(self):
+        self.place(self.cart(1))
+        out = StringIO()
+        call_command("run_outbox_worker", "--once", "--threads", "2", stdout=out)
+        self.assertIn("delivered 1 events", out.getvalue())
+        self.assertEqual(calls, [("order.placed", Order.objects.get().pk)])
+
+
+class ScriptedProvider:
+    """Declines/fails chosen payment ids and tracks peak concurrency."""
+    lock = threading.Lock()
+    in_flight = peak = 0
+    decline, flaky = set(), set()
+
+    def create_intent(self, payment, idempotency_key):
+        cls = ScriptedProvider
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        try:
+            time.sleep(0.01)
+            if payment.pk in cls.decline:
+                raise ProviderError("card_declined", retryable=False)
+            if payment.pk in cls.flaky:
+                raise ProviderError("timeout")
+            return Intent(f"pi_{idempotency_key}")
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+class PaymentWorkerTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        ScriptedProvider.peak = 0
+        ScriptedProvider.decline, ScriptedProvider.flaky = set(), set()
+        self.pool = ProviderPool({"STRIPE": {"BACKEND": "apps.orders.tests.ScriptedProvider",
+                                             "CONCURRENCY": 2}})
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        self.addCleanup(self.executor.shutdown)
+
+    def run_batch(self):
+        return process_payment_batch(self.pool, self.executor, "worker-a", batch_size=50)
+
+    def test_creates_intents_off_the_request_path_within_the_concurrency_limit(self):
+        for _ in range(6):
+            self.place(self.cart(1))
+        self.assertFalse(Payment.objects.exclude(transaction_id=""))  # checkout made no provider call
+
+        result = self.run_batch()
+        self.assertEqual((result["claimed"], result["created"]), (6, 6))
+        self.assertLessEqual(ScriptedProvider.peak, 2)
+        ids = list(Payment.objects.order_by("id").values_list("transaction_id", flat=True))
+        self.assertTrue(all(t.startswith("pi_payment-intent-") for t in ids))
+        self.assertEqual(OutboxEvent.objects.filter(topic="payment.intent_created").count(), 6)
+        self.assertEqual(self.run_batch()["claimed"], 0)
+
+    def test_declines_fail_the_order_and_transient_errors_back_off(self):
+        declined = Order.objects.get(pk=self.place(self.cart(1)).data["id"])
+        flaky = Order.objects.get(pk=self.place(self.cart(1)).data["id"])
+        ScriptedProvider.decline.add(declined.payment.pk)
+        ScriptedProvider.flaky.add(flaky.payment.pk)
+
+        result = self.run_batch()
+        self.assertEqual((result["failed"], result["retrying"]), (1, 1))
+        declined.refresh_from_db()
+        declined.payment.refresh_from_db()
+        self.assertEqual((declined.status, declined.payment.status), ("FAILED", "FAILED"))
+        retry = Payment.objects.get(order=flaky)
+        self.assertEqual((retry.status, retry.intent_attempts, retry.transaction_id), ("PENDING", 1, ""))
+        self.assertGreater(retry.next_attempt_at, timezone.now())
+        self.assertEqual(claim_payments("worker-b", 10), [])
+        self.assertTrue(OutboxEvent.objects.filter(topic="payment.status_changed").exists())
+
+    def test_decline_for_a_payment_a_webhook_already_settled_is_not_recorded(self):
+        order = Order.objects.get(pk=self.place(self.cart(1)).data["id"])
+        payment = claim_payments("worker-a", 10)[0]
+        Payment.objects.filter(pk=payment.pk).update(status=Payment.Status.PAID)
+
+        created, retrying, failed = record_intents([(payment, ProviderError("card_declined", retryable=False))])
+        self.assertEqual((created, retrying, failed), (0, 0, 0))
+        order.refresh_from_db()
+        payment.refresh_from_db()
+        self.assertEqual((order.status, payment.status), ("PENDING", "PAID"))
+        self.assertFalse(OutboxEvent.objects.filter(topic="payment.status_changed"))
+
+    def test_payment_whose_intent_was_just_recorded_is_not_claimed_again(self):
+        self.place(self.cart(1))
+        recorded = lambda: Payment.objects.update(transaction_id="pi_other_worker", locked_until=None)
+        with race_after_select(recorded):
+            self.assertEqual(claim_payments("worker-a", 10), [])
+
+    def test_fake_provider_is_deterministic_per_payment(self):
+        provider = FakeProvider(latency_ms=0, jitter_ms=0)
+        payment = Payment(pk=42, amount=Decimal("10.00"))
+        self.assertEqual(provider.create_intent(payment, "payment-intent-42"),
+                         provider.create_intent(payment, "payment-intent-42"))
+        with self.assertRaises(ProviderError):
+            FakeProvider(latency_ms=0, jitter_ms=0, decline_rate=1.0).create_intent(payment, "k")
+
+
+@override_settings(PAYMENT_WEBHOOK_SECRETS={"STRIPE": "whsec_test"})
+class PaymentWebhookTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.place(self.cart(1))
+        self.payment = Payment.objects.get()
+        Payment.objects.filter(pk=self.payment.pk).update(transaction_id="pi_123")
+        self.clock = int(time.time())
+
+    def event(self, event_id, kind, offset=0, intent="pi_123"):
+        obj = ({"object": "charge", "id": "ch_1", "payment_intent": intent} if kind == "charge.refunded"
+               else {"object": "payment_intent", "id": intent, "metadata": {"payment_id": self.payment.pk}})
+        return {"id": event_id, "type": kind, "created": self.clock + offset, "data": {"object": obj}}
+
+    def deliver(self, event, secret="whsec_test"):
+        body = json.dumps(event).encode()
+        return APIClient().post("/api/orders/payments/webhook/stripe/", body, content_type="application/json",
+                                headers={"Stripe-Signature": webhooks.sign(body, secret)})
+
+    def consume(self):
+        return webhooks.apply_webhook_events()
+
+    def test_receiver_verifies_signature_and_dedups_by_event_id(self):
+        self.assertEqual(self.deliver(self.event("evt_1", "payment_intent.succeeded"), secret="wrong").status_code, 400)
+        for _ in range(3):
+            self.assertEqual(self.deliver(self.event("evt_1", "payment_intent.succeeded")).status_code, 200)
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "PENDING")  # applied later, off the request path
+
+        self.assertEqual(self.consume()["updated"], 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "PAID")
+        self.assertEqual(OutboxEvent.objects.filter(topic="payment.status_changed").count(), 1)
+
+    def test_out_of_order_and_replayed_events_settle_on_the_newest_state(self):
+        self.deliver(self.event("evt_refund", "charge.refunded", offset=20))
+        self.consume()
+        self.deliver(self.event("evt_fail", "payment_intent.payment_failed", offset=0))
+        self.deliver(self.event("evt_paid", "payment_intent.succeeded", offset=10))
+        self.consume()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "REFUNDED")
+
+        PaymentWebhookEvent.objects.update(applied_at=None)  # replay everything
+        self.assertEqual(self.consume()["events"], 3)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "REFUNDED")
+        self.assertEqual(Order.objects.get().status, "PENDING")  # the stale failure never applied
+
+    def test_event_committed_after_a_higher_id_was_applied_is_not_skipped(self):
+        self.deliver(self.event("evt_paid", "payment_intent.succeeded", offset=0))
+        PaymentWebhookEvent.objects.update(id=F("id") + 100)  # room below it
+        self.consume()
+        # The refund's INSERT took a lower id but only commits after that batch.
+        self.deliver(self.event("evt_refund", "charge.refunded", offset=10))
+        paid = PaymentWebhookEvent.objects.get(event_id="evt_paid")
+        PaymentWebhookEvent.objects.filter(event_id="evt_refund").update(id=paid.pk - 1)
+        self.assertEqual(self.consume()["events"], 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "REFUNDED")
+
+    def test_events_of_unknown_payments_are_retried_then_given_up(self):
+        self.deliver(self.event("evt_1", "payment_intent.succeeded", intent="pi_other"))
+        self.assertEqual(self.consume(), {"events": 0, "updated": 0, "unmatched": 1})
+        self.assertEqual(self.consume()["unmatched"], 0)  # waits for its retry time
+
+        Payment.objects.filter(pk=self.payment.pk).update(transaction_id="pi_other")  # intent recorded
+        PaymentWebhookEvent.objects.update(retry_at=timezone.now())
+        self.assertEqual(self.consume(), {"events": 1, "updated": 1, "unmatched": 0})
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "PAID")
+
+        self.deliver(self.event("evt_2", "payment_intent.succeeded", intent="pi_never"))
+        PaymentWebhookEvent.objects.filter(event_id="evt_2").update(
+            received_at=timezone.now() - timedelta(hours=25))
+        self.assertEqual(self.consume(), {"events": 1, "updated": 0, "unmatched": 0})
+        self.assertIsNotNone(PaymentWebhookEvent.objects.get(event_id="evt_2").applied_at)
+
+    def test_failed_attempt_then_success_in_separate_batches_keeps_the_order(self):
+        self.deliver(self.event("evt_fail", "payment_intent.payment_failed", offset=0))
+        self.consume()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, Order.objects.get().status), ("FAILED", "PENDING"))
+
+        self.deliver(self.event("evt_paid", "payment_intent.succeeded", offset=10))
+        self.consume()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, Order.objects.get().status), ("PAID", "PENDING"))
+
+    def test_canceled_intent_fails_the_order(self):
+        self.deliver(self.event("evt_fail", "payment_intent.payment_failed", offset=0))
+        self.consume()
+        self.deliver(self.event("evt_cancel", "payment_intent.canceled", offset=10))
+        self.consume()
+        self.assertEqual(Order.objects.get().status, "FAILED")
+
+    def test_events_that_beat_the_intent_write_match_by_metadata(self):
+        Payment.objects.filter(pk=self.payment.pk).update(transaction_id="")  # intent not recorded yet
+        self.deliver(self.event("evt_1", "payment_intent.succeeded", intent="pi_late"))
+        self.consume()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.transaction_id), ("PAID", "pi_late"))
+
+    def test_unknown_provider_and_malformed_events_are_rejected(self):
+        body = b'{"id": "evt_1"}'
+        headers = {"Stripe-Signature": webhooks.sign(body, "whsec_test")}
+        self.assertEqual(APIClient().post("/api/orders/payments/webhook/paypal/", body,
+                                          content_type="application/json", headers=headers).status_code, 404)
+        self.assertEqual(APIClient().post("/api/orders/payments/webhook/stripe/", body,
+                                          content_type="application/json", headers=headers).status_code, 400)
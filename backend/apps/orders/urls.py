@@ -1,12 +1,31 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import OrderViewSet, OrderItemViewSet, PaymentViewSet
+from .views import (
+    OrderViewSet, OrderItemViewSet, PaymentViewSet, RestaurantOrderFeedAPIView, RestaurantOrderExportAPIView,
+    RestaurantSalesAPIView,
+)
+from .streams import user_order_stream, restaurant_order_stream
+from .webhooks import payment_webhook
 
 router = DefaultRouter()
-router.register(r'', OrderViewSet, basename='orders')                 # /api/orders/
+# Prefixed routes first: the empty-prefix detail route would otherwise
+# capture "items"/"payments" as an order pk.
 router.register(r'items', OrderItemViewSet, basename='order-items')   # /api/orders/items/
-router.register(r'payments', PaymentViewSet, basename='payments') 
+router.register(r'payments', PaymentViewSet, basename='payments')     # /api/orders/payments/
+router.register(r'', OrderViewSet, basename='orders')                 # /api/orders/
 
 urlpatterns = [
+    # Server-Sent Events of order status changes (serve via backend/asgi.py)
+    path('stream/', user_order_stream, name='order-stream'),
+    path('stream/restaurant/<int:restaurant_id>/', restaurant_order_stream, name='restaurant-order-stream'),
+    # Incremental feed of a restaurant's orders for staff dashboards
+    path('feed/restaurant/<int:restaurant_id>/', RestaurantOrderFeedAPIView.as_view(), name='restaurant-order-feed'),
+    # Streaming CSV/JSONL order history export for restaurant reporting
+    path('export/restaurant/<int:restaurant_id>/orders.<str:file_format>', RestaurantOrderExportAPIView.as_view(),
+         name='restaurant-order-export'),
+    # Sales analytics for dashboards, served from the rollup tables
+    path('analytics/restaurant/<int:restaurant_id>/', RestaurantSalesAPIView.as_view(), name='restaurant-sales'),
+    # Provider webhooks (signature-verified, stored raw, applied by consume_payment_webhooks)
+    path('payments/webhook/<str:provider>/', payment_webhook, name='payment-webhook'),
     path('', include(router.urls)),
 ]
@@ -1,23 +1,55 @@
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Case, F, Max, Sum, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db import transaction
-from decimal import Decimal
-from .models import Order, OrderItem, Payment
+from rest_framework.views import APIView
+from .models import Order, OrderItem, Payment, RestaurantHourlySales, MenuItemDailySales
 from .serializers import OrderSerializer, OrderItemSerializer, PaymentSerializer
+from .services import (
+    place_order, OrderPlacementError, transition_orders, OrderTransitionError,
+    is_order_admin, can_manage_restaurant,
+)
+from .pagination import OrderCursorPagination, encode_feed_cursor, decode_feed_cursor, orders_changed_since
+from .idempotency import idempotent
+from . import exports
+from apps.accounts.models import User
+from apps.menu.serializers import requested_fields
+from backend.db_router import ReplicaReadMixin
+from backend.throttling import TokenBucketThrottle
+
+MAX_TRANSITION_BATCH = 500
+FEED_PAGE_SIZE = 100
+MAX_FEED_PAGE_SIZE = 500
+# Longest date range the analytics API serves per granularity
+MAX_SALES_DAYS = {"hour": 31, "day": 366}
+MAX_TOP_ITEMS = 50
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
+    throttle_scope = None  # set per action
 
     def get_queryset(self):
         # Only show the current user's orders
-        return Order.objects.filter(user=self.request.user).select_related("restaurant").prefetch_related("items")
+        queryset = Order.objects.filter(user=self.request.user).select_related("restaurant")
+        wanted = requested_fields(self.request)
+        if wanted is None or "items" in wanted:
+            queryset = queryset.prefetch_related("items")
+        return queryset
     
-    @action(detail=False, methods=["post"])
-    @transaction.atomic
+    @action(detail=False, methods=["post"], throttle_classes=[TokenBucketThrottle], throttle_scope="orders.place")
     def place(self, request):
+        # Retries carrying the same Idempotency-Key replay the first response.
+        return idempotent(request, "orders.place", lambda: self._place(request))
 
+    def _place(self, request):
         data = request.data
         restaurant_id = data.get("restaurant_id")
         items = data.get("items", [])
@@ -28,37 +60,55 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({"detail": "restaurant_id and items are required."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # 1) Create order
-        order = Order.objects.create(
-            user=request.user,
-            restaurant_id=restaurant_id,
-            pickup_name=pickup_name,
-            pickup_instructions=pickup_instructions,
-        )
-
-        # 2) Create order items (snapshot name + unit_price)
-        for it in items:
-            OrderItem.objects.create(
-                order=order,
-                menu_item_id=it.get("menu_item_id"),
-                item_name=it["name"],
-                unit_price=Decimal(it["unit_price"]),
-                quantity=it.get("quantity", 1),
-                line_total="0.00",  # will be computed in model.save()
-                image_url=it.get("image", ""),
+        # Order, lines and pending payment in one transaction (see services.place_order)
+        try:
+            order = place_order(
+                request.user,
+                restaurant_id,
+                items,
+                pickup_name=pickup_name,
+                pickup_instructions=pickup_instructions,
             )
+        except OrderPlacementError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 3) Recalc totals, create pending payment matching total
-        order.recalc_totals()  # currently uses 0% tax in your model
-        order.save(update_fields=["subtotal", "tax", "total_amount"])
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
-        Payment.objects.create(
-            order=order,
-            amount=order.total_amount,
-            status=Payment.Status.PENDING,
-        )
+    @action(detail=False, methods=["post"])
+    def transition(self, request):
+        """
+        POST /api/orders/transition/ {"order_ids": [...], "status": "READY_FOR_PICKUP"}
+        Restaurant staff move many of their restaurants' orders at once; only
+        legal moves are applied and the ids actually moved are returned.
+        """
+        user = request.user
+        if not (user.is_staff or user.role in (User.STAFF, User.ADMIN)):
+            return Response({"detail": "Only restaurant staff can change order status."},
+                            status=status.HTTP_403_FORBIDDEN)
 
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        order_ids = request.data.get("order_ids")
+        to_status = request.data.get("status")
+        try:
+            if not isinstance(order_ids, list):
+                raise TypeError
+            order_ids = [int(pk) for pk in order_ids]
+        except (TypeError, ValueError):
+            return Response({"detail": "order_ids must be a list of order ids."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not order_ids or len(order_ids) > MAX_TRANSITION_BATCH:
+            return Response({"detail": f"Send between 1 and {MAX_TRANSITION_BATCH} order_ids."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        scope = Order.objects.all()
+        if not is_order_admin(user):
+            scope = scope.filter(restaurant__owner_user=user)
+        try:
+            moved = transition_orders(order_ids, to_status, queryset=scope)
+        except OrderTransitionError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        skipped = sorted(set(order_ids).difference(moved))
+        return Response({"status": to_status, "moved": moved, "skipped": skipped})
 
 class OrderItemViewSet(viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
@@ -69,3 +119,155 @@ class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+
+class RestaurantOrderFeedAPIView(APIView):
+    """
+    GET /api/orders/feed/restaurant/<id>/?since=<cursor>&limit=<n>
+    Orders of one restaurant created or changed after `since`, oldest change
+    first. Dashboards poll with the returned `cursor`; without `since` the feed
+    starts at today's first order. `has_more` means another page is ready now.
+    Changes appear ORDER_FEED_SETTLE_SECONDS late (see orders_changed_since);
+    the SSE streams are the real-time path.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, restaurant_id):
+        if not can_manage_restaurant(request.user, restaurant_id):
+            return Response({"detail": "You do not have access to this restaurant."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        since = request.query_params.get("since")
+        try:
+            limit = min(int(request.query_params.get("limit", FEED_PAGE_SIZE)), MAX_FEED_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+            cursor = decode_feed_cursor(since) if since else None
+        except ValueError:
+            return Response({"detail": "Invalid since cursor or limit."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if cursor is None:
+            start_of_day = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+            cursor = (start_of_day, 0)
+
+        queryset = (
+            Order.objects.filter(restaurant_id=restaurant_id)
+            .select_related("restaurant").prefetch_related("items")
+        )
+        # One extra row tells whether the client should fetch again right away.
+        settle = timedelta(seconds=getattr(settings, "ORDER_FEED_SETTLE_SECONDS", 2))
+        orders = orders_changed_since(queryset, cursor, limit + 1, settled_before=timezone.now() - settle)
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        if orders:
+            cursor = (orders[-1].updated_at, orders[-1].pk)
+
+        return Response({
+            "results": OrderSerializer(orders, many=True, context={"request": request}).data,
+            "cursor": encode_feed_cursor(*cursor),
+            "has_more": has_more,
+        })
+
+
+class RestaurantOrderExportAPIView(APIView):
+    """
+    GET /api/orders/export/restaurant/<id>/orders.<csv|jsonl>?from=YYYY-MM-DD&to=YYYY-MM-DD
+    Every order of one restaurant placed between the two dates (inclusive,
+    in TIME_ZONE) with its line items, streamed as a download. See exports.py.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, restaurant_id, file_format):
+        if file_format not in exports.CONTENT_TYPES:
+            return Response({"detail": "Export format must be csv or jsonl."},
+                            status=status.HTTP_404_NOT_FOUND)
+        if not can_manage_restaurant(request.user, restaurant_id):
+            return Response({"detail": "You do not have access to this restaurant."},
+                            status=status.HTTP_403_FORBIDDEN)
+        try:
+            first = date.fromisoformat(request.query_params["from"])
+            last = date.fromisoformat(request.query_params["to"])
+        except (KeyError, ValueError):
+            return Response({"detail": "from and to are required dates (YYYY-MM-DD)."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if last < first:
+            return Response({"detail": "to must not be before from."}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = timezone.make_aware(datetime.combine(first, time.min))
+        end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min))
+        response = StreamingHttpResponse(
+            exports.export_rows(file_format, restaurant_id, start, end),
+            content_type=exports.CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="restaurant-{restaurant_id}-orders-{first}-{last}.{file_format}"'
+        )
+        return response
+
+
+def _sales_figures(row):
+    return {
+        "orders": row["orders"],
+        "cancelled": row["cancelled"],
+        "revenue": row["revenue"],
+        "avg_prep_seconds": round(row["prep_seconds"] / row["prepared"], 1) if row["prepared"] else None,
+    }
+
+
+class RestaurantSalesAPIView(APIView):
+    """
+    GET /api/orders/analytics/restaurant/<id>/?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|hour&top=10
+    Revenue, picked-up and cancelled orders and average prep time per period,
+    plus the best-selling menu items, read from the sales rollups (rollups.py)
+    rather than the order tables.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, restaurant_id):
+        if not can_manage_restaurant(request.user, restaurant_id):
+            return Response({"detail": "You do not have access to this restaurant."},
+                            status=status.HTTP_403_FORBIDDEN)
+        granularity = request.query_params.get("granularity", "day")
+        try:
+            first = date.fromisoformat(request.query_params["from"])
+            last = date.fromisoformat(request.query_params["to"])
+            top = int(request.query_params.get("top", 10))
+            if granularity not in MAX_SALES_DAYS or not 0 <= top <= MAX_TOP_ITEMS:
+                raise ValueError
+        except (KeyError, ValueError):
+            return Response({"detail": "from and to are required dates (YYYY-MM-DD); granularity is day or "
+                                       f"hour and top at most {MAX_TOP_ITEMS}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= (last - first).days < MAX_SALES_DAYS[granularity]:
+            return Response({"detail": f"At most {MAX_SALES_DAYS[granularity]} days by {granularity}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        start = timezone.make_aware(datetime.combine(first, time.min))
+        end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min))
+        hours = RestaurantHourlySales.objects.filter(restaurant_id=restaurant_id, hour__gte=start, hour__lt=end)
+        sums = {f: Sum(f) for f in ("orders", "cancelled", "revenue", "prepared", "prep_seconds")}
+        if granularity == "day":
+            series = hours.annotate(period=TruncDate("hour")).values("period").annotate(**sums).order_by("period")
+        else:
+            series = hours.annotate(period=F("hour")).values("period", *sums).order_by("period")
+        totals = hours.aggregate(**sums)
+
+        items = (
+            MenuItemDailySales.objects.filter(restaurant_id=restaurant_id, day__gte=first, day__lte=last)
+            # Deleted items (menu_item NULL) are told apart by their name snapshot.
+            .annotate(deleted_name=Case(When(menu_item__isnull=True, then=F("item_name"))))
+            .values("menu_item_id", "deleted_name")
+            .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"),
+                      name=Coalesce(Max("menu_item__name"), Max("item_name")))
+            .order_by("-revenue", "menu_item_id", "deleted_name")[:top]
+        )
+        return Response({
+            "granularity": granularity,
+            "totals": _sales_figures({k: v or 0 for k, v in totals.items()}),
+            "series": [{"period": row["period"], **_sales_figures(row)} for row in series],
+            "top_items": [
+                {"menu_item_id": row["menu_item_id"], "name": row["name"],
+                 "quantity": row["quantity"], "revenue": row["revenue"]}
+                for row in items
+            ],
+        })
@@ -0,0 +1,222 @@
+"""
+Payment provider webhooks.
+
+The receiver only verifies the signature and appends the raw event to
+PaymentWebhookEvent (redeliveries hit the unique (provider, event_id)
+constraint and are dropped), so providers get their 200 without waiting on
+any payment logic. `manage.py consume_payment_webhooks` then applies the
+events not applied yet, in id order and in batches, and stamps each with
+applied_at. Selecting by that flag rather than by a checkpoint id means an
+event whose INSERT commits after higher ids were applied is still picked
+up. An event naming a payment we do not know yet (the intent worker has not
+recorded it) is retried every PAYMENT_WEBHOOK_RETRY_SECONDS for
+PAYMENT_WEBHOOK_MATCH_HOURS before it is given up.
+
+Per payment only the newest event (by provider time) can win, and a payment
+never moves back to a state older than the event that set it. That makes
+redelivered, replayed and out-of-order events harmless.
+
+Signatures follow Stripe's scheme (header `Stripe-Signature: t=<ts>,v1=<hex>`,
+HMAC-SHA256 of "<ts>.<body>"), which the fake provider uses as well.
+"""
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .models import Order, OutboxEvent, Payment, PaymentWebhookEvent
+from .services import transition_orders
+
+SIGNATURE_HEADER = "Stripe-Signature"
+
+# Provider event type -> Payment.Status it reports.
+STATUS_BY_EVENT = {
+    "payment_intent.succeeded": Payment.Status.PAID,
+    "payment_intent.payment_failed": Payment.Status.FAILED,
+    "payment_intent.canceled": Payment.Status.FAILED,
+    "charge.refunded": Payment.Status.REFUNDED,
+}
+# Events after which the provider will never collect the payment. A
+# payment_failed attempt can still be followed by a success (the customer
+# retries the card), so it marks the payment FAILED but leaves the order open.
+ORDER_FAILING_EVENTS = {"payment_intent.canceled"}
+# Breaks ties between events stamped with the same provider second.
+STATUS_RANK = {
+    Payment.Status.PENDING: 0,
+    Payment.Status.FAILED: 1,
+    Payment.Status.PAID: 2,
+    Payment.Status.REFUNDED: 3,
+}
+
+
+class WebhookSignatureError(Exception):
+    pass
+
+
+def sign(body, secret, timestamp=None):
+    """Build a signature header for `body` (used by the fake provider and tests)."""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(body, header, secret, tolerance=300, now=None):
+    timestamp, signatures = None, []
+    for part in (header or "").split(","):
+        key, _, value = part.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        raise WebhookSignatureError("Missing signature timestamp.")
+    if abs((now or time.time()) - timestamp) > tolerance:
+        raise WebhookSignatureError("Signature timestamp outside the tolerance window.")
+    expected = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, sig) for sig in signatures):
+        raise WebhookSignatureError("Signature mismatch.")
+
+
+def _event_object(payload):
+    return (payload.get("data") or {}).get("object") or {}
+
+
+def _transaction_id(payload):
+    obj = _event_object(payload)
+    if obj.get("object") == "charge":
+        return obj.get("payment_intent") or ""
+    return obj.get("id") or ""
+
+
+def _payment_ref(payload):
+    """Our payment id from the intent metadata, for events that beat the intent write."""
+    try:
+        return int(_event_object(payload).get("metadata", {}).get("payment_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+@csrf_exempt
+@require_POST
+def payment_webhook(request, provider):
+    """POST /api/orders/payments/webhook/<provider>/ - verify, append, acknowledge."""
+    provider = provider.upper()
+    secret = getattr(settings, "PAYMENT_WEBHOOK_SECRETS", {}).get(provider)
+    if not secret:
+        return JsonResponse({"detail": "Unknown payment provider."}, status=404)
+    try:
+        verify_signature(request.body, request.headers.get(SIGNATURE_HEADER), secret,
+                         tolerance=getattr(settings, "PAYMENT_WEBHOOK_TOLERANCE_SECONDS", 300))
+    except WebhookSignatureError as exc:
+        return JsonResponse({"detail": str(exc)}, status=400)
+
+    try:
+        payload = json.loads(request.body)
+        event = PaymentWebhookEvent(
+            provider=provider,
+            event_id=str(payload["id"]),
+            event_type=str(payload["type"])[:64],
+            transaction_id=_transaction_id(payload)[:255],
+            occurred_at=datetime.fromtimestamp(int(payload["created"]), tz=dt_timezone.utc),
+            payload=payload,
+        )
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({"detail": "Malformed event."}, status=400)
+
+    # A redelivery conflicts on (provider, event_id) and is silently dropped.
+    PaymentWebhookEvent.objects.bulk_create([event], ignore_conflicts=True)
+    return JsonResponse({"received": True})
+
+
+def _newer(candidate, payment):
+    """Is (occurred_at, status) newer than what `payment` already reflects?"""
+    if payment.status == Payment.Status.REFUNDED:
+        return False  # terminal
+    if payment.status_event_at is None:
+        return True
+    return (candidate[0], STATUS_RANK[candidate[1]]) > (payment.status_event_at, STATUS_RANK[payment.status])
+
+
+@transaction.atomic
+def apply_webhook_events(batch_size=500):
+    """
+    Apply the next batch of unapplied events that are not waiting for a
+    retry: one SELECT of events (locked, so concurrent consumers take turns),
+    one SELECT of the payments they name, an UPDATE per resulting status,
+    then the events are stamped in the same transaction. Returns counts.
+    """
+    now = timezone.now()
+    events = list(
+        PaymentWebhookEvent.objects.select_for_update()
+        .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now), applied_at__isnull=True)
+        .order_by("id")[:batch_size]
+    )
+    if not events:
+        return {"events": 0, "updated": 0, "unmatched": 0}
+
+    # Newest reported state per transaction within the batch.
+    latest = {}
+    for event in events:
+        status = STATUS_BY_EVENT.get(event.event_type)
+        if status is None or not event.transaction_id:
+            continue
+        candidate = (event.occurred_at, status, _payment_ref(event.payload), event.event_type)
+        current = latest.get(event.transaction_id)
+        if current is None or (candidate[0], STATUS_RANK[status]) > (current[0], STATUS_RANK[current[1]]):
+            latest[event.transaction_id] = candidate
+
+    payments = {p.transaction_id: p for p in Payment.objects.filter(transaction_id__in=latest)}
+    missing = {latest[tx][2]: tx for tx in latest.keys() - payments.keys() if latest[tx][2]}
+    for payment in Payment.objects.filter(pk__in=missing, transaction_id=""):
+        payment.transaction_id = missing[payment.pk]  # the intent worker hasn't written it yet
+        payments[payment.transaction_id] = payment
+
+    changed, by_status, adopted, outbox_events, failed_orders = [], {}, [], [], []
+    for tx, (occurred_at, status, _, event_type) in latest.items():
+        payment = payments.get(tx)
+        if payment is None or not _newer((occurred_at, status), payment):
+            continue
+        if payment.status != status:
+            outbox_events.append(OutboxEvent(topic="payment.status_changed", payload={
+                "id": payment.pk, "order_id": payment.order_id, "status": status,
+                "amount": payment.amount, "currency": payment.currency, "transaction_id": tx,
+            }))
+        if event_type in ORDER_FAILING_EVENTS:
+            failed_orders.append(payment.order_id)
+        if payment.pk in missing:
+            adopted.append(payment)
+        payment.status, payment.status_event_at = status, occurred_at
+        by_status.setdefault(status, []).append(payment.pk)
+        changed.append(payment)
+
+    # One UPDATE per target status, plus a single-column CASE for the event
+    # times: much cheaper to build than a multi-column bulk_update.
+    for status, ids in by_status.items():
+        Payment.objects.filter(pk__in=ids).update(status=status, updated_at=now)
+    if changed:
+        Payment.objects.bulk_update(changed, ["status_event_at"])
+    if adopted:
+        Payment.objects.bulk_update(adopted, ["transaction_id"])
+    OutboxEvent.objects.bulk_create(outbox_events)
+    if failed_orders:
+        transition_orders(failed_orders, Order.Status.FAILED)
+
+    # Events of unknown payments wait for the intent worker, up to the match window.
+    unmatched = latest.keys() - payments.keys()
+    give_up = now - timedelta(hours=getattr(settings, "PAYMENT_WEBHOOK_MATCH_HOURS", 24))
+    retry = [e.pk for e in events if e.transaction_id in unmatched and e.received_at > give_up]
+    PaymentWebhookEvent.objects.filter(pk__in=retry).update(
+        retry_at=now + timedelta(seconds=getattr(settings, "PAYMENT_WEBHOOK_RETRY_SECONDS", 30)))
+    PaymentWebhookEvent.objects.filter(pk__in=[e.pk for e in events]).exclude(pk__in=retry).update(applied_at=now)
+    return {"events": len(events) - len(retry), "updated": len(changed), "unmatched": len(retry)}
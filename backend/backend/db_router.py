@@ -0,0 +1,192 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+settings.DATABASE_REPLICAS names database aliases that replicate "default".
+ReplicaRouter sends a read to one of them (round robin) only when all of
+these hold, and to default otherwise:
+
+- the request is a GET/HEAD/OPTIONS to a view that opted in with
+  ReplicaReadMixin (restaurant and menu listings, the user's orders);
+- no transaction is open on default, so place() and anything else inside
+  transaction.atomic() reads what it is about to write;
+- the request has not written anything yet;
+- the user has not written anything in the last REPLICA_STICKY_SECONDS.
+
+The last rule gives read-your-writes: after a request that wrote,
+ReplicaRoutingMiddleware pins its user to default for the sticky window,
+so a just-placed order shows up in the next GET /api/orders/. Keep the
+window above the usual replication lag. The pins live in the
+REPLICA_STICKY_CACHE cache, which must be shared by every worker that
+serves the user: the next request may land on any of them. The default is
+a file cache shared by the workers of one host; a process-local cache is
+refused (ImproperlyConfigured) once replicas are configured.
+Anonymous readers are not pinned and may see a change up to one
+replication lag late, but never for longer: whatever outlives the request
+(the menu cache's stored responses and validators, apps/menu/cache.py) is
+built inside primary_reads(), and responses read from a replica carry no
+ETag/Last-Modified.
+
+Background workers, management commands and async views run outside a
+routed request, so they always use default.
+"""
+import contextvars
+import itertools
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+class RoutingState:
+    """What the router knows about the current request."""
+
+    def __init__(self):
+        self.replica_reads = False  # set by ReplicaReadMixin
+        self.wrote = False  # set by the router on the first write
+
+
+_state = contextvars.ContextVar("db_routing", default=None)
+
+
+@contextmanager
+def routed_request():
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Read from default inside the block, e.g. to build data cached past this request."""
+    state = _state.get()
+    if state is None or not state.replica_reads:
+        yield
+        return
+    state.replica_reads = False
+    try:
+        yield
+    finally:
+        state.replica_reads = True
+
+
+def reads_replica():
+    """True when reads of the current request (outside primary_reads()) may go to a replica."""
+    state = _state.get()
+    return state is not None and state.replica_reads
+
+
+def _replicas():
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+def _sticky_cache():
+    cache = caches[getattr(settings, "REPLICA_STICKY_CACHE", "default")]
+    if isinstance(cache, LocMemCache):
+        raise ImproperlyConfigured(
+            "REPLICA_STICKY_CACHE is a process-local cache, so a user's next request on another worker would "
+            "not see the pin and could miss their own write on a replica. Use a cache all workers share."
+        )
+    return cache
+
+
+def _sticky_key(user_id):
+    return f"db:primary:{user_id}"
+
+
+def pin_to_primary(user_id):
+    _sticky_cache().set(_sticky_key(user_id), True, timeout=getattr(settings, "REPLICA_STICKY_SECONDS", 5))
+
+
+def is_pinned(user_id):
+    return bool(_sticky_cache().get(_sticky_key(user_id)))
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self._turn = itertools.count()
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = _replicas()
+        if (
+            not replicas
+            or state is None
+            or not state.replica_reads
+            or state.wrote
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replicas[next(self._turn) % len(replicas)]
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as default.
+        databases = {DEFAULT_DB_ALIAS, *_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema through replication.
+        return False if db in _replicas() else None
+
+
+class ReplicaRoutingMiddleware:
+    """Scopes routing to the request and pins users who wrote to default for the sticky window."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with routed_request() as state:
+            response = self.get_response(request)
+        if state.wrote and _replicas():
+            # DRF hands the user it authenticated down to the HttpRequest.
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        # Async views (the SSE streams) are not routed: they read from default.
+        return await self.get_response(request)
+
+
+class ReplicaReadMixin:
+    """
+    Opt a DRF view into replica reads for safe methods. On viewsets only the
+    actions in `replica_actions` qualify.
+    """
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _state.get()
+        if state is None or not _replicas() or request.method not in SAFE_METHODS:
+            return
+        action = getattr(self, "action", None)
+        if action is not None and action not in self.replica_actions:
+            return
+        if request.user.is_authenticated and is_pinned(request.user.pk):
+            return
+        state.replica_reads = True
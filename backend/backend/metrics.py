@@ -0,0 +1,286 @@
+"""
+Per-view request metrics: in-process histograms exposed at /metrics.
+
+RequestMetricsMiddleware opens a RequestMetrics for each request and wraps
+every database connection to count queries and SQL time. DRF hooks add the
+rest of the breakdown: TimedAuthenticationMixin (auth), TimedJSONRenderer
+(render) and TimedSerializerMixin (serializer time, which includes any SQL
+the serializer triggers lazily). At the end of the request the numbers go
+into histograms labelled by URL name (e.g. orders-list), an optional Server-Timing header is
+added in DEBUG, and requests slower than SLOW_REQUEST_MS are logged with
+their most repeated SQL statements, which is how N+1 patterns show up.
+
+Histograms are per process: with several workers, scrape each one (or
+aggregate in Prometheus).
+"""
+import hmac
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+slow_logger = logging.getLogger("backend.metrics.slow")
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with labels, safe across threads."""
+
+    def __init__(self, name, documentation, labelnames, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in sorted(self.snapshot().items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+LABELS = ("view", "method")
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Total request time.", (*LABELS, "status"))
+DB_QUERIES = Histogram("http_request_db_queries", "SQL queries per request.", LABELS, QUERY_BUCKETS)
+DB_SECONDS = Histogram("http_request_db_seconds", "Time spent executing SQL.", LABELS)
+SERIALIZER_SECONDS = Histogram("http_request_serializer_seconds", "Time spent in DRF serializers.", LABELS)
+RENDER_SECONDS = Histogram("http_request_render_seconds", "Time spent rendering the response body.", LABELS)
+AUTH_SECONDS = Histogram("http_request_auth_seconds", "Time spent authenticating the request.", LABELS)
+HISTOGRAMS = (REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, SERIALIZER_SECONDS, RENDER_SECONDS, AUTH_SECONDS)
+
+
+class RequestMetrics:
+    __slots__ = ("started", "queries", "db_seconds", "serializer_seconds", "render_seconds",
+                 "auth_seconds", "statements", "serializer_depth")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = self.serializer_seconds = self.render_seconds = self.auth_seconds = 0.0
+        self.statements = {}  # parametrized SQL -> [count, seconds]
+        self.serializer_depth = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.queries += 1
+            self.db_seconds += elapsed
+            entry = self.statements.get(sql)
+            if entry is None:
+                self.statements[sql] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def repeated_statements(self, limit=5):
+        """Most repeated statements, IN (...) lists collapsed so batches group together."""
+        grouped = {}
+        for sql, (count, seconds) in self.statements.items():
+            key = _IN_LIST.sub("IN (...)", sql)
+            entry = grouped.setdefault(key, [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+        ranked = sorted(grouped.items(), key=lambda kv: (-kv[1][0], -kv[1][1]))
+        return [(sql, count, seconds) for sql, (count, seconds) in ranked[:limit] if count > 1]
+
+
+_IN_LIST = re.compile(r"IN \((?:%s(?:, )?)+\)")
+_current = ContextVar("request_metrics", default=None)
+
+
+def current():
+    """The RequestMetrics of the request being handled, or None."""
+    return _current.get()
+
+
+def _view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """Outermost middleware: times the whole request and every SQL statement in it."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        # Async views (the SSE streams) run their SQL in worker threads, so
+        # only the total time is recorded for them.
+        metrics = RequestMetrics()
+        response = await self.get_response(request)
+        self.record(request, response, metrics)
+        return response
+
+    def record(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        labels = (_view_label(request), request.method)
+        REQUEST_SECONDS.observe(total, *labels, str(response.status_code))
+        DB_QUERIES.observe(metrics.queries, *labels)
+        DB_SECONDS.observe(metrics.db_seconds, *labels)
+        SERIALIZER_SECONDS.observe(metrics.serializer_seconds, *labels)
+        RENDER_SECONDS.observe(metrics.render_seconds, *labels)
+        AUTH_SECONDS.observe(metrics.auth_seconds, *labels)
+
+        if settings.DEBUG and getattr(settings, "METRICS_DEBUG_HEADER", True):
+            response["Server-Timing"] = (
+                f'db;dur={metrics.db_seconds * 1000:.2f};desc="{metrics.queries} queries", '
+                f"serializer;dur={metrics.serializer_seconds * 1000:.2f}, "
+                f"render;dur={metrics.render_seconds * 1000:.2f}, "
+                f"auth;dur={metrics.auth_seconds * 1000:.2f}, "
+                f"total;dur={total * 1000:.2f}"
+            )
+
+        threshold = getattr(settings, "SLOW_REQUEST_MS", None)
+        if threshold is not None and total * 1000 >= threshold:
+            repeated = "".join(
+                f"\n  {count}x {seconds * 1000:.1f} ms  {sql[:300]}"
+                for sql, count, seconds in metrics.repeated_statements()
+            )
+            slow_logger.warning(
+                "slow request %s %s (%s) %.1f ms: %d queries %.1f ms, serializer %.1f ms, "
+                "render %.1f ms, auth %.1f ms%s",
+                request.method, request.get_full_path(), labels[0], total * 1000, metrics.queries,
+                metrics.db_seconds * 1000, metrics.serializer_seconds * 1000,
+                metrics.render_seconds * 1000, metrics.auth_seconds * 1000,
+                f"; repeated SQL:{repeated}" if repeated else "",
+            )
+
+
+# ---- DRF hooks ----
+
+class TimedAuthenticationMixin:
+    def authenticate(self, request):
+        metrics = current()
+        if metrics is None:
+            return super().authenticate(request)
+        t0 = time.perf_counter()
+        try:
+            return super().authenticate(request)
+        finally:
+            metrics.auth_seconds += time.perf_counter() - t0
+
+
+class TimedJWTAuthentication(TimedAuthenticationMixin, JWTAuthentication):
+    pass
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        metrics = current()
+        if metrics is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        t0 = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.render_seconds += time.perf_counter() - t0
+
+
+class TimedSerializerMixin:
+    """Adds the outermost to_representation call of a request to serializer time."""
+
+    def to_representation(self, instance):
+        metrics = current()
+        if metrics is None or metrics.serializer_depth:
+            return super().to_representation(instance)
+        metrics.serializer_depth += 1
+        t0 = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_depth -= 1
+            metrics.serializer_seconds += time.perf_counter() - t0
+
+
+# ---- /metrics ----
+
+def render_metrics():
+    return "\n".join(h.render() for h in HISTOGRAMS) + "\n"
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition. Requires `Authorization: Bearer <METRICS_TOKEN>`;
+    with no token configured it is only served in DEBUG.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    allowed = (
+        hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+        if token else settings.DEBUG
+    )
+    if not allowed:
+        return HttpResponse("Forbidden\n", status=403, content_type="text/plain")
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
@@ -31,15 +32,19 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # React dev server
     "http://127.0.0.1:5173",
 ]
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware (backend/metrics.py)
+    "backend.metrics.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    "backend.db_router.ReplicaRoutingMiddleware",
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,6 +79,66 @@ else:  # fallback to SQLite for local testing
         }
     }
 
+# Read replicas (backend/db_router.py): safe reads of the menu and order list
+# views go to these aliases, everything else to default. DB_REPLICA_HOSTS
+# (MySQL) or SQLITE_REPLICAS (file paths), comma-separated, add replica1,
+# replica2, ... After a write a user reads from default for
+# REPLICA_STICKY_SECONDS, tracked in the REPLICA_STICKY_CACHE cache, which
+# every worker must share: a file cache shared by the workers of one host by
+# default; with several hosts point REPLICA_STICKY_LOCATION at shared storage.
+_replica_sources = [
+    source.strip()
+    for source in os.getenv("DB_REPLICA_HOSTS" if DB_ENGINE == "mysql" else "SQLITE_REPLICAS", "").split(",")
+    if source.strip()
+]
+DATABASE_REPLICAS = []
+for _number, _source in enumerate(_replica_sources, 1):
+    _alias = f"replica{_number}"
+    DATABASES[_alias] = {
+        **DATABASES["default"],
+        "HOST" if DB_ENGINE == "mysql" else "NAME": _source,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(_alias)
+DATABASE_ROUTERS = ["backend.db_router.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_STICKY_CACHE = "replica_pins"
+
+# Caches
+# The "menu" alias backs the restaurant/menu response cache (apps/menu/cache.py).
+# Entries are keyed on Restaurant.updated_at, so a per-worker locmem cache
+# never serves another worker's stale copy; MENU_CACHE_BACKEND=file shares
+# the entries (and the hit rate) across workers.
+MENU_CACHE_ALIAS = "menu"
+MENU_CACHE_BACKEND = os.getenv("MENU_CACHE_BACKEND", "locmem")
+MENU_CACHE_TIMEOUT = int(os.getenv("MENU_CACHE_TIMEOUT", "600"))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "menu": (
+        {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("MENU_CACHE_LOCATION", str(BASE_DIR / ".cache" / "menu")),
+            "TIMEOUT": MENU_CACHE_TIMEOUT,
+        }
+        if MENU_CACHE_BACKEND == "file"
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "menu",
+            "TIMEOUT": MENU_CACHE_TIMEOUT,
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    ),
+    "replica_pins": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("REPLICA_STICKY_LOCATION", str(BASE_DIR / ".cache" / "replica_pins")),
+        "TIMEOUT": REPLICA_STICKY_SECONDS,
+        "OPTIONS": {"MAX_ENTRIES": 10_000},
+    },
+}
+
 # Templates / WSGI
 ROOT_URLCONF = 'backend.urls'
 WSGI_APPLICATION = 'backend.wsgi.application'
@@ -101,11 +166,104 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticatedOrReadOnly"],
+    # "claims" trusts the role/is_active claims of tokens issued at login and
+    # skips the user query (apps/accounts/tokens.py); "database" loads the
+    # user on every request. Both are timed for /metrics.
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.accounts.authentication.ClaimsJWTAuthentication'
+        if os.getenv("JWT_AUTH_MODE", "claims") == "claims"
+        else 'backend.metrics.TimedJWTAuthentication',
     ),
+    "DEFAULT_RENDERER_CLASSES": [
+        "backend.metrics.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Every list endpoint is keyset-paginated; see backend/pagination.py
+    "DEFAULT_PAGINATION_CLASS": "backend.pagination.IdCursorPagination",
+    # Proxies in front of the app that append to X-Forwarded-For; the "ip"
+    # throttle buckets trust only that many hops (backend/throttling.py).
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
 }
 
+# Claims-based JWT authentication: how long a user's token version/is_active
+# is trusted before it is re-read, and how many users are kept.
+JWT_CLAIMS_CACHE_TTL = int(os.getenv("JWT_CLAIMS_CACHE_TTL", "30"))
+JWT_CLAIMS_CACHE_SIZE = 10_000
+
+# Token-bucket throttling (backend/throttling.py). Per scope, "user", "ip" and
+# "endpoint" buckets of "N/period": bursts of N, refilled at N per period.
+# THROTTLE_BACKEND=sqlite shares the buckets between all workers on a host.
+THROTTLE_RATES = {
+    "login": {"ip": "10/min", "endpoint": "600/min"},
+    "register": {"ip": "5/min", "endpoint": "120/min"},
+    "orders.place": {"user": "30/min", "ip": "120/min", "endpoint": "3000/min"},
+}
+THROTTLE_BACKEND = (
+    {
+        "BACKEND": "backend.throttling.SQLiteBuckets",
+        "OPTIONS": {"path": os.getenv("THROTTLE_LOCATION", str(BASE_DIR / ".cache" / "throttle.sqlite3"))},
+    }
+    if os.getenv("THROTTLE_BACKEND") == "sqlite"
+    else {"BACKEND": "backend.throttling.InProcessBuckets"}
+)
+
+# Idempotency-Key support for POST /api/orders/place/ (apps/orders/idempotency.py)
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = 10
+
+# Transactional outbox for order/payment side effects (apps/orders/outbox.py),
+# drained by `manage.py run_outbox_worker`. Topics: order.placed,
+# order.status_changed, payment.status_changed; "*" runs for every topic.
+OUTBOX_HANDLERS = {
+    "*": ["apps.orders.outbox.log_event"],
+}
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_RETRY_BASE_SECONDS = 2
+OUTBOX_RETRY_MAX_SECONDS = 600
+
+# Payment intents are created by `manage.py run_payment_worker`
+# (apps/orders/payments.py). The fake provider needs no network; set
+# STRIPE_BACKEND=apps.orders.payments.StripeProvider and STRIPE_SECRET_KEY in production.
+PAYMENT_PROVIDERS = {
+    "STRIPE": {
+        "BACKEND": os.getenv("STRIPE_BACKEND", "apps.orders.payments.FakeProvider"),
+        "CONCURRENCY": int(os.getenv("STRIPE_CONCURRENCY", "8")),
+        "OPTIONS": (
+            {"api_key": os.getenv("STRIPE_SECRET_KEY", "")}
+            if os.getenv("STRIPE_BACKEND", "").endswith("StripeProvider")
+            else {}
+        ),
+    },
+}
+PAYMENT_MAX_ATTEMPTS = 5
+
+# Webhook signing secrets per provider; events are applied by
+# `manage.py consume_payment_webhooks` (apps/orders/webhooks.py).
+PAYMENT_WEBHOOK_SECRETS = {
+    "STRIPE": os.getenv("STRIPE_WEBHOOK_SECRET", ""),
+}
+PAYMENT_WEBHOOK_TOLERANCE_SECONDS = 300
+# Events naming a payment whose intent is not recorded yet are retried this
+# often, for this long.
+PAYMENT_WEBHOOK_RETRY_SECONDS = 30
+PAYMENT_WEBHOOK_MATCH_HOURS = 24
+
+# Orders per keyset page of the streaming order export (apps/orders/exports.py)
+ORDER_EXPORT_CHUNK_SIZE = 1000
+# The restaurant order feed holds back changes younger than this, so its
+# cursor never passes a change whose transaction has not committed yet.
+ORDER_FEED_SETTLE_SECONDS = 2
+
+# Request metrics (backend/metrics.py): Prometheus text at /metrics, which
+# needs `Authorization: Bearer <METRICS_TOKEN>`; without a token it is only
+# served in DEBUG. In DEBUG every response also carries a Server-Timing
+# header with the db/serializer/render/auth split. Requests slower than
+# SLOW_REQUEST_MS are logged with their most repeated SQL (logger
+# "backend.metrics.slow"); None disables the slow log.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_DEBUG_HEADER = True
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "500"))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
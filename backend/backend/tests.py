@@ -0,0 +1,226 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.menu.models import Restaurant
+from apps.orders.models import Order
+from apps.orders.tests import OrderTestMixin
+from . import db_router, metrics
+
+
+class RequestMetricsTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset_metrics()
+        for i in range(3):
+            self.place(self.cart(1 + i))
+        # Real bearer auth so the JWT hook is exercised too.
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def series(self, histogram, view):
+        return next(v for k, v in histogram.snapshot().items() if k[0] == view)
+
+    def test_breakdown_is_recorded_per_view_and_exposed(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/orders/")
+        self.assertEqual(response.status_code, 200)
+        executed = len(ctx.captured_queries)
+
+        queries = self.series(metrics.DB_QUERIES, "orders-list")
+        self.assertEqual(sum(queries[:-1]), 1)
+        self.assertEqual(queries[-1], executed)
+        self.assertGreater(self.series(metrics.SERIALIZER_SECONDS, "orders-list")[-1], 0)
+        self.assertGreater(self.series(metrics.RENDER_SECONDS, "orders-list")[-1], 0)
+        self.assertGreater(self.series(metrics.AUTH_SECONDS, "orders-list")[-1], 0)
+
+        with self.settings(DEBUG=True):
+            body = self.client.get("/metrics").content.decode()
+        self.assertIn("# TYPE http_request_db_queries histogram", body)
+        self.assertIn('http_request_duration_seconds_count{view="orders-list",method="GET",status="200"} 1', body)
+        self.assertIn(f'http_request_db_queries_sum{{view="orders-list",method="GET"}} {executed}', body)
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_metrics_token(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-me")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_without_token_are_private_outside_debug(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_header_in_debug(self):
+        header = self.client.get("/api/orders/")["Server-Timing"]
+        for part in ("db;dur=", "serializer;dur=", "render;dur=", "auth;dur=", "total;dur="):
+            self.assertIn(part, header)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_log_names_repeated_sql(self):
+        # An N+1: one query per order, parameters differ but the SQL is the same.
+        def n_plus_one(request):
+            for order in Order.objects.all():
+                list(order.items.all())
+            return HttpResponse("ok")
+
+        middleware = metrics.RequestMetricsMiddleware(n_plus_one)
+        request = RequestFactory().get("/api/orders/")
+        with self.assertLogs("backend.metrics.slow", "WARNING") as logs:
+            middleware(request)
+        self.assertIn("repeated SQL", logs.output[0])
+        self.assertIn("3x", logs.output[0])
+        self.assertIn("orders_orderitem", logs.output[0])
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_api_reports_every_endpoint_and_rolls_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = Path(tmp, "a.json"), Path(tmp, "b.json")
+            scale = ["--restaurants", "3", "--items", "3", "--users", "3", "--orders", "10",
+                     "--requests", "3", "--warmup", "0"]
+            call_command("benchmark_api", *scale, "--output", str(first), stdout=StringIO())
+            out = StringIO()
+            call_command("benchmark_api", *scale, "--output", str(second), "--compare", str(first), stdout=out)
+            results = json.loads(second.read_text())
+
+        self.assertIn("orders.place", results["endpoints"])
+        self.assertIn("menu.restaurants.list", results["endpoints"])
+        for name, result in results["endpoints"].items():
+            self.assertEqual(sum(result["status_codes"].values()), 3, name)
+            self.assertTrue(set(result["status_codes"]) <= {"200", "201"}, (name, result["status_codes"]))
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertIn("p50", out.getvalue())
+        self.assertFalse(Restaurant.objects.exists())
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], DATABASE_ROUTERS=["backend.db_router.ReplicaRouter"])
+class ReplicaRoutingTests(OrderTestMixin, TransactionTestCase):
+    """
+    default is the in-memory test database; "replica" is a second in-memory
+    SQLite alias in this process that replicate() refreshes from default.
+    The alias exists only while these tests run, so the test runner never
+    sees it in `databases`.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connections.settings["replica"] = {**connections.settings["default"], "NAME": ":memory:"}
+        cls.databases = {"default", "replica"}
+        pins_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(pins_dir.cleanup)
+        cls.enterClassContext(override_settings(CACHES={**settings.CACHES, settings.REPLICA_STICKY_CACHE: {
+            **settings.CACHES[settings.REPLICA_STICKY_CACHE], "LOCATION": pins_dir.name,
+        }}))
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.databases
+        del connections["replica"]
+        del connections.settings["replica"]
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        caches[settings.REPLICA_STICKY_CACHE].clear()  # sticky windows
+        self.replicate()
+
+    def replicate(self):
+        """Copy default into the replica, as if replication caught up."""
+        for alias in ("default", "replica"):
+            connections[alias].ensure_connection()
+        connections["default"].connection.backup(connections["replica"].connection)
+
+    def order_ids(self):
+        return [order["id"] for order in self.client.get("/api/orders/").json()["results"]]
+
+    def restaurant_names(self):
+        res = self.client.get("/api/menu/restaurants/")
+        return [r["name"] for r in res.json()["results"]], res
+
+    def test_menu_cache_is_filled_from_default_and_uncached_reads_use_the_replica(self):
+        self.client.force_authenticate(None)
+        self.restaurant_names()  # cached under the current listing version
+        Restaurant.objects.create(owner_user=self.owner, name="Noodle Bar")  # bumps it, not replicated yet
+
+        names, res = self.restaurant_names()  # cache miss: built and stored from default
+        self.assertIn("Noodle Bar", names)
+        self.assertIn("ETag", res)
+        with self.assertNumQueries(1, using="default"), self.assertNumQueries(0, using="replica"):
+            self.assertIn("Noodle Bar", self.restaurant_names()[0])
+
+        self.client.force_authenticate(self.user)  # not cached: may read the lagging replica
+        names, res = self.restaurant_names()
+        self.assertIn("Pho House", names)
+        self.assertNotIn("Noodle Bar", names)
+        self.assertNotIn("ETag", res)
+
+        self.replicate()
+        self.assertIn("Noodle Bar", self.restaurant_names()[0])
+
+    def test_search_runs_on_the_replica(self):
+        self.client.force_authenticate(self.user)  # not cached: searches the replica
+        Restaurant.objects.create(owner_user=self.owner, name="Noodle Bar")  # not replicated yet
+        search = lambda: self.client.get("/api/menu/search/", {"q": "noodle"}).json()["results"]
+        with CaptureQueriesContext(connection) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                self.assertEqual(search(), [])
+        matches = lambda ctx: sum("MATCH" in query["sql"] for query in ctx.captured_queries)
+        self.assertEqual((matches(primary), matches(replica)), (0, 1))
+
+        self.replicate()
+        self.assertEqual([r["name"] for r in search()], ["Noodle Bar"])
+
+    def test_users_read_their_own_writes_from_default(self):
+        self.assertEqual(self.order_ids(), [])
+        placed = self.place(self.cart(1)).json()["id"]  # reads inside place() see default
+
+        self.assertEqual(self.order_ids(), [placed])
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.order_ids(), [])  # other users are not pinned
+
+        self.client.force_authenticate(self.user)
+        caches[settings.REPLICA_STICKY_CACHE].clear()  # sticky window over, replica still behind
+        self.assertEqual(self.order_ids(), [])
+
+    def test_pin_set_by_another_worker_is_honoured(self):
+        placed = Order.objects.create(user=self.user, restaurant=self.restaurant).pk  # not replicated yet
+        self.assertEqual(self.order_ids(), [])
+
+        # The write was served by another worker, which pinned the user through its own cache instance.
+        other_worker = caches.create_connection(settings.REPLICA_STICKY_CACHE)
+        with patch.object(db_router, "caches", {settings.REPLICA_STICKY_CACHE: other_worker}):
+            db_router.pin_to_primary(self.user.pk)
+        self.assertEqual(self.order_ids(), [placed])
+
+    def test_process_local_pins_are_refused(self):
+        with override_settings(REPLICA_STICKY_CACHE="default"), self.assertRaises(ImproperlyConfigured):
+            db_router.pin_to_primary(self.user.pk)
+
+    def test_transactions_and_writes_switch_reads_to_default(self):
+        with db_router.routed_request() as state:
+            self.assertEqual(router.db_for_read(Order), "default")  # view did not opt in
+            state.replica_reads = True
+            self.assertEqual(router.db_for_read(Order), "replica")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Order), "default")
+            Order.objects.filter(pk=0).update(pickup_name="")
+            self.assertEqual(router.db_for_read(Order), "default")
+        self.assertEqual(router.db_for_read(Order), "default")
@@ -0,0 +1,223 @@
+"""
+Token-bucket rate limiting for expensive endpoints.
+
+A view opts in with `throttle_classes = [TokenBucketThrottle]` and a
+`throttle_scope`; settings.THROTTLE_RATES maps each scope to the buckets it
+draws from, keyed by kind:
+
+    "orders.place": {"user": "30/min", "ip": "120/min", "endpoint": "3000/min"}
+
+"user" is one bucket per authenticated user (anonymous requests skip it),
+"ip" one per client address and "endpoint" one shared by everybody.
+
+The client address is DRF's get_ident: REMOTE_ADDR, unless
+REST_FRAMEWORK["NUM_PROXIES"] (env NUM_PROXIES, default 0) says how many
+trusted proxies append to X-Forwarded-For. Never leave it unset: DRF would
+then take X-Forwarded-For as the client sends it, and any client could
+pick its own bucket.
+
+"N/period" holds N tokens and refills N per period, so a client may burst
+N requests and then sustain the rate.
+A request takes one token from every bucket or, if any of them is empty,
+from none, and is rejected with 429 and a Retry-After header.
+
+DRF checks throttles after authentication (no query on the claims fast
+path) and permissions, but before the handler runs: a rejected login never
+reaches the password hasher, a rejected order never opens a transaction.
+
+Buckets live in settings.THROTTLE_BACKEND: InProcessBuckets is per worker,
+SQLiteBuckets keeps them in one SQLite file shared by every worker on the
+host.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+class Bucket(NamedTuple):
+    key: str
+    capacity: float
+    refill: float  # tokens per second
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """"10/min" -> (capacity 10, refill 10/60 tokens per second)."""
+    count, _, period = rate.partition("/")
+    count = int(count)
+    if count < 1 or period not in PERIODS:
+        raise ValueError(f"Bad throttle rate {rate!r}; expected e.g. '10/min'.")
+    return float(count), count / PERIODS[period]
+
+
+def take(buckets, levels, now):
+    """
+    Take one token from each of `buckets`, given their stored
+    `levels` (key -> (tokens, updated at); missing means full). Returns
+    (new levels, 0.0), or (None, seconds until all have a token) if any
+    bucket is empty, in which case nothing is taken.
+    """
+    wait = 0.0
+    refilled = {}
+    for bucket in buckets:
+        tokens, updated = levels.get(bucket.key) or (bucket.capacity, now)
+        tokens = min(bucket.capacity, tokens + max(0.0, now - updated) * bucket.refill)
+        if tokens < 1:
+            wait = max(wait, (1 - tokens) / bucket.refill)
+        refilled[bucket.key] = tokens
+    if wait:
+        return None, wait
+    return {key: (tokens - 1, now) for key, tokens in refilled.items()}, 0.0
+
+
+def full_at(bucket, tokens, now):
+    """When a bucket left with `tokens` is full again, i.e. its row can be dropped."""
+    return now + (bucket.capacity - tokens) / bucket.refill
+
+
+class InProcessBuckets:
+    """Buckets in this process's memory; each worker enforces the rates on its own."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._levels = OrderedDict()  # key -> (tokens, updated at)
+
+    def consume(self, buckets, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            levels, wait = take(buckets, self._levels, now)
+            if levels:
+                for key, level in levels.items():
+                    self._levels[key] = level
+                    self._levels.move_to_end(key)
+                # Forgetting the least recently used bucket refills it early; bounded memory wins.
+                while len(self._levels) > self.max_keys:
+                    self._levels.popitem(last=False)
+        return wait
+
+    def reset(self):
+        with self._lock:
+            self._levels.clear()
+
+
+class SQLiteBuckets:
+    """
+    Buckets in a SQLite file, so every worker process on the host draws from
+    the same ones. Each consume() is one short BEGIN IMMEDIATE transaction
+    on a per-thread connection; rows of buckets that have refilled are
+    pruned every `prune_every` writes.
+    """
+
+    def __init__(self, path, prune_every=1000):
+        self.path = str(path)
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing buckets in a crash only refills them
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def consume(self, buckets, now=None):
+        now = time.time() if now is None else now
+        conn = self._connection()
+        by_key = {bucket.key: bucket for bucket in buckets}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stored = conn.execute(
+                f"SELECT key, tokens, updated FROM buckets WHERE key IN ({','.join('?' * len(by_key))})",
+                list(by_key),
+            )
+            levels, wait = take(buckets, {key: (tokens, updated) for key, tokens, updated in stored}, now)
+            if levels:
+                conn.executemany(
+                    "INSERT INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, "
+                    "full_at = excluded.full_at",
+                    [(key, tokens, updated, full_at(by_key[key], tokens, now))
+                     for key, (tokens, updated) in levels.items()],
+                )
+                self._writes += 1
+                if self._writes % self.prune_every == 0:
+                    conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def reset(self):
+        self._connection().execute("DELETE FROM buckets")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                entry = getattr(settings, "THROTTLE_BACKEND", {"BACKEND": "backend.throttling.InProcessBuckets"})
+                _backend = import_string(entry["BACKEND"])(**entry.get("OPTIONS", {}))
+    return _backend
+
+
+def reset_throttles():
+    get_backend().reset()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Draws from the buckets settings.THROTTLE_RATES lists for the view's throttle_scope."""
+
+    def allow_request(self, request, view):
+        self._wait = 0.0
+        scope = getattr(view, "throttle_scope", None)
+        rates = getattr(settings, "THROTTLE_RATES", {}).get(scope)
+        if not rates:
+            return True
+        buckets = []
+        for kind, rate in rates.items():
+            ident = self.identify(kind, request)
+            if ident is not None:
+                buckets.append(Bucket(f"{scope}:{kind}:{ident}", *parse_rate(rate)))
+        if buckets:
+            self._wait = get_backend().consume(buckets)
+        return not self._wait
+
+    def identify(self, kind, request):
+        if kind == "user":
+            user = request.user
+            return user.pk if user and user.is_authenticated else None
+        if kind == "ip":
+            return self.get_ident(request)
+        if kind == "endpoint":
+            return "*"
+        raise ValueError(f"Unknown throttle bucket kind {kind!r}; use user, ip or endpoint.")
+
+    def wait(self):
+        # DRF rounds this up into the Retry-After header
+        return math.ceil(self._wait) if self._wait else None
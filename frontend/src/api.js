@@ -2,11 +2,24 @@
 
 const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000/api";
 
+/* List endpoints are cursor-paginated: { next, previous, results } */
+async function fetchAllPages(url, options, errorMessage) {
+  const all = [];
+  let next = url;
+  while (next) {
+    const res = await fetch(next, options);
+    if (!res.ok) throw new Error(errorMessage);
+    const page = await res.json();
+    if (!Array.isArray(page.results)) return page;
+    all.push(...page.results);
+    next = page.next;
+  }
+  return all;
+}
+
 /* -------------------- Public: Restaurants -------------------- */
 export async function getRestaurants() {
-  const res = await fetch(`${API_URL}/menu/restaurants/`);
-  if (!res.ok) throw new Error("Failed to fetch restaurants");
-  return res.json();
+  return fetchAllPages(`${API_URL}/menu/restaurants/`, {}, "Failed to fetch restaurants");
 }
 
 export async function getRestaurant(id) {
@@ -15,6 +28,16 @@ export async function getRestaurant(id) {
   return res.json();
 }
 
+export async function searchMenu(q, { category, type, page } = {}) {
+  const params = new URLSearchParams({ q });
+  if (category) params.set("category", category);
+  if (type) params.set("type", type);
+  if (page) params.set("page", page);
+  const res = await fetch(`${API_URL}/menu/search/?${params}`);
+  if (!res.ok) throw new Error("Search failed");
+  return res.json(); // { next, previous, results }
+}
+
 /* -------------------- Auth -------------------- */
 export async function loginUser(credentials) {
   const res = await fetch(`${API_URL}/accounts/login/`, {
@@ -33,20 +56,34 @@ export async function loginUser(credentials) {
 /* -------------------- Protected: Orders -------------------- */
 export async function fetchOrders() {
   const token = localStorage.getItem("access_token");
-  const res = await fetch(`${API_URL}/orders/`, {
-    headers: { Authorization: token ? `Bearer ${token}` : "" },
-  });
-  if (!res.ok) throw new Error("Failed to fetch orders");
-  return res.json();
+  return fetchAllPages(
+    `${API_URL}/orders/`,
+    { headers: { Authorization: token ? `Bearer ${token}` : "" } },
+    "Failed to fetch orders"
+  );
+}
+
+// Live order status deltas ({ id, status, ready_at, picked_up_at, ... }) over
+// Server-Sent Events. EventSource can't send headers, so the JWT goes in the
+// query string. Returns an unsubscribe function.
+export function subscribeOrderStatus(onChange) {
+  const token = localStorage.getItem("access_token");
+  if (!token || typeof EventSource === "undefined") return () => {};
+  const source = new EventSource(`${API_URL}/orders/stream/?token=${encodeURIComponent(token)}`);
+  source.addEventListener("order.status", (e) => onChange(JSON.parse(e.data)));
+  return () => source.close();
 }
 
-export async function placeOrder(payload) {
+// Pass the same idempotencyKey when retrying the same cart: the server
+// replays the first result instead of placing a duplicate order.
+export async function placeOrder(payload, idempotencyKey) {
   const token = localStorage.getItem("access_token");
   const res = await fetch(`${API_URL}/orders/place/`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
       Authorization: token ? `Bearer ${token}` : "",
+      ...(idempotencyKey ? { "Idempotency-Key": idempotencyKey } : {}),
     },
     body: JSON.stringify(payload),
   });
@@ -62,8 +99,10 @@ const api = {
   API_URL,
   getRestaurants,
   getRestaurant,
+  searchMenu,
   loginUser,
   fetchOrders,
+  subscribeOrderStatus,
   placeOrder,
 };
 
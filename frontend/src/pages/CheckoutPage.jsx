@@ -16,6 +16,8 @@ import { ui } from "../utils/ui";
 export default function CheckoutPage() {
   const navigate = useNavigate();
   const { cart, inc, dec, remove, clear } = useCart();
+  // One key per cart contents, so retries of the same checkout are deduplicated.
+  const idempotencyKey = useMemo(() => crypto.randomUUID(), [cart]);
 
   // state
   const [addressId, setAddressId] = useState("");
@@ -84,7 +86,7 @@ export default function CheckoutPage() {
         quantity: it.qty,
         image: it.image || "",
       }));
-      const placed = await placeOrder({ restaurant_id: restaurantId, items });
+      const placed = await placeOrder({ restaurant_id: restaurantId, items }, idempotencyKey);
       clear();
       navigate(`/order/${placed.id}`);
     } catch (e) {
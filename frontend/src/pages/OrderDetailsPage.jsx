@@ -17,7 +17,7 @@ import {
   Alert,
 } from "@mui/material";
 import { useParams, Link } from "react-router-dom";
-import { fetchOrders } from "../api";
+import { fetchOrders, subscribeOrderStatus } from "../api";
 
 const ui = {
   pageBg: "#fafbfc",
@@ -69,6 +69,9 @@ export default function OrderDetailsPage() {
         setError("Failed to load order details.");
       })
       .finally(() => setLoading(false));
+    return subscribeOrderStatus((delta) => {
+      if (String(delta.id) === id) setOrder((prev) => prev && { ...prev, ...delta });
+    });
   }, [id]);
 
   const itemSubtotal = useMemo(() => {
@@ -13,7 +13,7 @@ import {
   Divider,
 } from "@mui/material";
 import { Link } from "react-router-dom";
-import { fetchOrders } from "../api";
+import { fetchOrders, subscribeOrderStatus } from "../api";
 
 const ui = {
   pageBg: "#fafbfc",
@@ -44,7 +44,11 @@ export default function OrdersPage() {
       .then((data) => mounted && setOrders(data))
       .catch(() => mounted && setOrders([]))
       .finally(() => mounted && setLoading(false));
-    return () => { mounted = false; };
+    // Status changes are pushed; no need to refetch the whole list.
+    const unsubscribe = subscribeOrderStatus((delta) =>
+      setOrders((prev) => prev.map((o) => (o.id === delta.id ? { ...o, ...delta } : o)))
+    );
+    return () => { mounted = false; unsubscribe(); };
   }, []);
 
   const active = useMemo(